@@ -0,0 +1,31 @@
+"""add city_id to product_offers
+
+Revision ID: 3f9a1c2d7e41
+Revises: 810ee4d87216
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9a1c2d7e41'
+down_revision: Union[str, Sequence[str], None] = '810ee4d87216'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Существующие офферы собирались для Алматы (город по умолчанию)
+    op.add_column('product_offers', sa.Column('city_id', sa.String(), server_default='750000000', nullable=False))
+    op.create_index('ix_product_offers_product_id_city_id', 'product_offers', ['product_id', 'city_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_product_offers_product_id_city_id', table_name='product_offers')
+    op.drop_column('product_offers', 'city_id')
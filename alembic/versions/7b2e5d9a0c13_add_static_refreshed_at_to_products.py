@@ -0,0 +1,30 @@
+"""add static_refreshed_at to products
+
+Revision ID: 7b2e5d9a0c13
+Revises: 3f9a1c2d7e41
+Create Date: 2026-10-16 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b2e5d9a0c13'
+down_revision: Union[str, Sequence[str], None] = '3f9a1c2d7e41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('products', sa.Column('static_refreshed_at', sa.DateTime(timezone=True), nullable=True))
+    # До этой миграции каждый скрап был полным
+    op.execute("UPDATE products SET static_refreshed_at = COALESCE(updated_at, created_at)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('products', 'static_refreshed_at')
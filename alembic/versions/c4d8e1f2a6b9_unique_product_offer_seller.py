@@ -0,0 +1,46 @@
+"""unique offer per product, city and seller
+
+Revision ID: c4d8e1f2a6b9
+Revises: 7b2e5d9a0c13
+Create Date: 2026-10-16 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d8e1f2a6b9'
+down_revision: Union[str, Sequence[str], None] = '7b2e5d9a0c13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Оставляем последний оффер продавца в городе, более ранние повторы удаляем
+    op.execute(
+        """
+        DELETE FROM product_offers AS duplicate
+        USING product_offers AS newer
+        WHERE duplicate.product_id = newer.product_id
+          AND duplicate.city_id = newer.city_id
+          AND duplicate.seller_name = newer.seller_name
+          AND duplicate.id < newer.id
+        """
+    )
+    op.create_unique_constraint(
+        'uq_product_offers_product_city_seller',
+        'product_offers',
+        ['product_id', 'city_id', 'seller_name'],
+    )
+    # Индекс уникального ключа покрывает поиск по (product_id, city_id)
+    op.drop_index('ix_product_offers_product_id_city_id', table_name='product_offers')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_product_offers_product_id_city_id', 'product_offers', ['product_id', 'city_id'])
+    op.drop_constraint('uq_product_offers_product_city_seller', 'product_offers', type_='unique')
@@ -0,0 +1,234 @@
+"""
+Микро-бенчмарк remove_general_if_duplicate: индексированный поиск ключей против прежней версии.
+
+Запуск (из корня репозитория):
+    python -m benchmarks.bench_dedupe [--repeat N] [--keys N] [--groups N]
+
+Прежняя реализация (попарное сравнение ключей с группами) скопирована ниже без
+изменений. Перед замером проверяется, что обе версии дают одинаковый результат
+на атрибутах из export/products и на случайных синтетических наборах.
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import random
+import time
+
+from src.utils import remove_general_if_duplicate
+
+logger = logging.getLogger(__name__)
+
+PRODUCTS_DIR = os.path.join(os.path.dirname(__file__), os.pardir, "export", "products")
+
+WORDS = [
+    "экран", "диагональ", "разрешение", "камера", "основная", "фронтальная", "память",
+    "оперативная", "встроенная", "процессор", "ядер", "частота", "аккумулятор", "ёмкость",
+    "беспроводная", "зарядка", "bluetooth", "wi-fi", "nfc", "gps", "вес", "цвет", "тип", "общие",
+]
+
+
+# --- Прежняя реализация -------------------------------------------------------
+
+def legacy_remove_general_if_duplicate(attributes: dict) -> dict:
+    """
+    Убирает дублирующиеся данные из словаря атрибутов.
+    
+    Удаляет ключи-группы (например, "Фотокамера и мультимедиа"), если их содержимое
+    дублируется в отдельных детализированных ключах.
+    
+    Args:
+        attributes: Словарь атрибутов товара
+    
+    Returns:
+        Очищенный от дублей словарь
+    """
+    if not isinstance(attributes, dict) or not attributes:
+        return attributes
+
+    logger.info(f"Начинаем очистку от дубликатов. Исходное количество ключей: {len(attributes)}")
+    
+    # Создаем копию для безопасной работы
+    cleaned_attributes = attributes.copy()
+    
+    # Собираем отдельные ключи (не групповые)
+    individual_keys = set()
+    group_keys = []
+    
+    for key, value in attributes.items():
+        if isinstance(value, str) and len(value) > 100:
+            # Длинные строки скорее всего группы со сводной информацией
+            group_keys.append(key)
+        elif key and key.strip().endswith(':'):
+            # Ключи с двоеточием обычно отдельные параметры
+            individual_keys.add(key.strip(':').strip())
+        else:
+            # Обычные отдельные ключи
+            individual_keys.add(key)
+    
+    logger.info(f"Найдено отдельных ключей: {len(individual_keys)}")
+    logger.info(f"Найдено групповых ключей: {len(group_keys)}")
+    
+    # Проверяем каждую группу на дубликаты
+    keys_to_remove = set()
+    
+    for group_key in group_keys:
+        group_value = str(attributes[group_key])
+        logger.info(f"\nАнализируем группу: '{group_key}'")
+        
+        # Подсчитываем сколько отдельных ключей содержится в тексте группы
+        found_keys = []
+        
+        for individual_key in individual_keys:
+            if not individual_key or individual_key == group_key:
+                continue
+                
+            # Очищаем ключ от лишних символов для поиска
+            clean_key = individual_key.strip().rstrip(':')
+            
+            # Ищем ключ в тексте группы различными способами
+            if _key_found_in_text(clean_key, group_value):
+                found_keys.append(individual_key)
+        
+        # Если в группе найдено много отдельных ключей - это дубликат
+        if len(found_keys) >= 3:  # Порог: если 3+ ключа найдены в тексте группы
+            logger.info(f"  ✗ Группа '{group_key}' содержит {len(found_keys)} отдельных ключей: {found_keys[:5]}...")
+            keys_to_remove.add(group_key)
+        else:
+            logger.info(f"  ✓ Группа '{group_key}' уникальна (найдено ключей: {len(found_keys)})")
+    
+    # Также удаляем ключи "Общие" и похожие
+    general_keys = [k for k in attributes.keys() if k and 'общ' in k.lower()]
+    keys_to_remove.update(general_keys)
+    
+    if general_keys:
+        logger.info(f"\nУдаляем общие ключи: {general_keys}")
+    
+    # Удаляем найденные дубликаты
+    for key in keys_to_remove:
+        cleaned_attributes.pop(key, None)
+    
+    logger.info(f"\nРезультат: удалено {len(keys_to_remove)} ключей, осталось {len(cleaned_attributes)}")
+    if keys_to_remove:
+        logger.info(f"Удаленные ключи: {list(keys_to_remove)}")
+    
+    return cleaned_attributes
+
+
+def _key_found_in_text(key: str, text: str) -> bool:
+    """
+    Проверяет, содержится ли ключ в тексте различными способами.
+    
+    Args:
+        key: Ключ для поиска
+        text: Текст для поиска
+        
+    Returns:
+        True если ключ найден
+    """
+    if not key or not text:
+        return False
+    
+    key_lower = key.lower()
+    text_lower = text.lower()
+    
+    # Точное совпадение
+    if key_lower in text_lower:
+        return True
+    
+    # Поиск как отдельное слово
+    words_in_text = text_lower.split()
+    key_words = key_lower.split()
+    
+    # Если ключ состоит из одного слова
+    if len(key_words) == 1:
+        return key_lower in words_in_text
+    
+    # Если ключ состоит из нескольких слов - ищем последовательность
+    key_phrase = ' '.join(key_words)
+    return key_phrase in text_lower
+
+
+# --- Данные ------------------------------------------------------------------
+
+def _random_key(rng: random.Random) -> str:
+    key = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+    key = key.capitalize() if rng.random() < 0.5 else key
+    if rng.random() < 0.15:
+        key = key.replace(" ", "  ")
+    if rng.random() < 0.15:
+        key += ":"
+    return key
+
+
+def synthetic_attributes(rng: random.Random, keys: int, groups: int) -> dict:
+    """Набор атрибутов в духе электроники: много отдельных ключей и сводные группы."""
+    attributes = {_random_key(rng): str(rng.randint(1, 9999)) for _ in range(keys)}
+    names = list(attributes)
+    for index in range(groups):
+        parts = [f"{rng.choice(names).upper() if rng.random() < 0.3 else rng.choice(names)} "
+                 f"{rng.randint(1, 999)}" for _ in range(rng.randint(2, 12))]
+        text = "; ".join(parts)
+        if len(text) <= 100:
+            text += " " + " ".join(rng.choice(WORDS) for _ in range(20))
+        attributes[f"Группа {index}" if rng.random() < 0.8 else rng.choice(names)] = text
+    return attributes
+
+
+def _export_attributes() -> list:
+    items = []
+    for path in sorted(glob.glob(os.path.join(PRODUCTS_DIR, "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            items.append(json.load(f).get("attributes", {}))
+    return items
+
+
+def _timed(fn, items, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for attributes in items:
+            fn(attributes)
+        best = min(best, time.perf_counter() - started)
+    return best / len(items) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--keys", type=int, default=150, help="Отдельных ключей в синтетическом наборе")
+    parser.add_argument("--groups", type=int, default=20, help="Групп в синтетическом наборе")
+    parser.add_argument("--samples", type=int, default=200, help="Наборов для проверки совпадения")
+    args = parser.parse_args()
+
+    # Прежняя версия пишет INFO-строку на каждую группу — в замере это часть её стоимости
+    logging.disable(logging.CRITICAL)
+
+    rng = random.Random(42)
+    checks = _export_attributes() + [
+        synthetic_attributes(rng, rng.randint(1, args.keys), rng.randint(0, args.groups))
+        for _ in range(args.samples)
+    ]
+    for attributes in checks:
+        if remove_general_if_duplicate(dict(attributes)) != legacy_remove_general_if_duplicate(dict(attributes)):
+            raise SystemExit(f"Результаты различаются на наборе с ключами: {list(attributes)[:10]}...")
+    print(f"Результаты совпадают на {len(checks)} наборах")
+
+    datasets = {
+        "export": _export_attributes(),
+        f"synthetic {args.keys}x{args.groups}": [
+            synthetic_attributes(rng, args.keys, args.groups) for _ in range(20)
+        ],
+    }
+    print(f"{'dataset':<24} {'legacy ms':>10} {'indexed ms':>11} {'speedup':>8}")
+    for name, items in datasets.items():
+        if not items:
+            continue
+        legacy_ms = _timed(legacy_remove_general_if_duplicate, items, args.repeat)
+        indexed_ms = _timed(remove_general_if_duplicate, items, args.repeat)
+        print(f"{name:<24} {legacy_ms:>10.3f} {indexed_ms:>11.3f} {legacy_ms / indexed_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Сравнение бэкендов разбора HTML: CPU-время и пиковая память на страницу.
+
+Запуск (из корня репозитория):
+    python -m benchmarks.bench_html_backends [pages_dir] [--repeat N]
+
+По умолчанию берутся страницы из benchmarks/fixtures/pages. Для каждой страницы
+проверяется, что все бэкенды извлекают одинаковые поля.
+
+product_118366664.html — синтетическая страница, собранная по данным
+export/products/product_118366664.json с разметкой карточки Kaspi.
+"""
+import argparse
+import glob
+import logging
+import os
+import time
+import tracemalloc
+
+from src.services.html_parsing import HTML_BACKENDS, parse_product_html
+from src.services.kaspi_parser import _extract_product_fields
+
+DEFAULT_PAGES_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "pages")
+
+
+def _measure(html: str, backend: str, repeat: int):
+    started = time.process_time()
+    for _ in range(repeat):
+        fields = _extract_product_fields(parse_product_html(html, backend))
+    cpu_ms = (time.process_time() - started) / repeat * 1000
+
+    tracemalloc.start()
+    _extract_product_fields(parse_product_html(html, backend))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return fields, cpu_ms, peak / 1024 / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pages_dir", nargs="?", default=DEFAULT_PAGES_DIR)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # Экстракторы подробно логируют каждый селектор — в замерах это только шум
+    logging.disable(logging.CRITICAL)
+
+    pages = sorted(glob.glob(os.path.join(args.pages_dir, "*.html")))
+    if not pages:
+        raise SystemExit(f"Нет HTML страниц в {args.pages_dir}")
+
+    print(f"{'page':<32} {'backend':<14} {'cpu ms/page':>12} {'peak MiB':>10}  fields")
+    for path in pages:
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+
+        reference = None
+        for backend in HTML_BACKENDS:
+            fields, cpu_ms, peak_mib = _measure(html, backend, args.repeat)
+            if reference is None:
+                reference = fields
+            same = "same" if fields == reference else "DIFF"
+            print(f"{os.path.basename(path):<32} {backend:<14} {cpu_ms:>12.1f} {peak_mib:>10.2f}  {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Офлайн-бенчмарк этапов извлечения данных по записанному корпусу.
+
+Запуск (из корня репозитория):
+    python -m benchmarks.bench_parser [--repeat N] [--baseline FILE] [--threshold 0.25]
+    python -m benchmarks.bench_parser --baseline benchmarks/baseline.json
+    python -m benchmarks.bench_parser --save-baseline benchmarks/baseline.json
+
+Этапы:
+- extract  — разбор страницы товара и извлечение полей (как в parse_kaspi_product_with_bs);
+- rating   — извлечение рейтинга из отрисованной страницы (parse_kaspi_rating_playwright);
+- category — разбор страницы и хлебные крошки (get_category_path);
+- dedupe   — remove_general_if_duplicate по атрибутам из export/products;
+- offers   — разбор JSON страницы API офферов и нормализация офферов.
+
+Для каждого этапа выводится время на элемент (медиана по повторам), пик
+выделенной памяти (tracemalloc) и пиковый RSS процесса. Сеть не используется:
+все данные берутся из benchmarks/fixtures и export/. С --baseline скрипт
+завершается с кодом 1, если время или память этапа выросли больше, чем на
+--threshold относительно сохранённого замера. benchmarks/baseline.json — замер
+на корпусе из репозитория; на другой машине его стоит пересохранить перед
+сравнением изменений.
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from src.services.html_parsing import parse_product_html
+from src.services.kaspi_parser import (
+    _extract_from_html,
+    _extract_rating_from_html,
+    _extract_category,
+    _process_offer,
+)
+from src.utils import remove_general_if_duplicate
+
+BENCH_DIR = os.path.dirname(__file__)
+DEFAULT_PAGES_DIR = os.path.join(BENCH_DIR, "fixtures", "pages")
+DEFAULT_OFFERS_DIR = os.path.join(BENCH_DIR, "fixtures", "offers")
+DEFAULT_PRODUCTS_DIR = os.path.join(BENCH_DIR, os.pardir, "export", "products")
+
+STAGES = ("extract", "rating", "category", "dedupe", "offers")
+
+
+def _read_all(directory: str, pattern: str) -> List[str]:
+    items = []
+    for path in sorted(glob.glob(os.path.join(directory, pattern))):
+        with open(path, encoding="utf-8") as f:
+            items.append(f.read())
+    return items
+
+
+def _offers_stage(raw: str) -> Any:
+    offers = [_process_offer(offer) for offer in json.loads(raw).get("offers", [])]
+    prices = [offer["price"] for offer in offers if offer["price"] is not None]
+    return len(offers), min(prices, default=None), max(prices, default=None)
+
+
+def build_stages(pages: List[str], offers: List[str], products: List[str]) -> Dict[str, tuple]:
+    """Этап -> (функция над одним элементом, список элементов)."""
+    attributes = [json.loads(raw).get("attributes", {}) for raw in products]
+    return {
+        "extract": (_extract_from_html, pages),
+        "rating": (_extract_rating_from_html, pages),
+        "category": (lambda html: _extract_category(parse_product_html(html)), pages),
+        "dedupe": (lambda attrs: remove_general_if_duplicate(dict(attrs)), attributes),
+        "offers": (_offers_stage, offers),
+    }
+
+
+def _peak_rss_mib() -> float:
+    # ru_maxrss в Linux — КиБ, в macOS — байты
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 1024 / 1024 if sys.platform == "darwin" else maxrss / 1024
+
+
+def measure(fn: Callable[[Any], Any], items: List[Any], repeat: int) -> Dict[str, float]:
+    """Замеряет этап: медиана времени на элемент, пик tracemalloc и пиковый RSS."""
+    fn(items[0])  # прогрев: импорты и кэши парсеров не должны попадать в замер
+
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for item in items:
+            fn(item)
+        runs.append((time.perf_counter() - started) / len(items))
+
+    tracemalloc.start()
+    for item in items:
+        fn(item)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "ms_per_item": round(statistics.median(runs) * 1000, 3),
+        "peak_alloc_mib": round(peak / 1024 / 1024, 3),
+        "peak_rss_mib": round(_peak_rss_mib(), 1),
+    }
+
+
+# Абсолютный прирост, ниже которого разница считается шумом (для быстрых этапов)
+_NOISE_FLOOR = {"ms_per_item": 0.05, "peak_alloc_mib": 0.01}
+
+
+def find_regressions(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    threshold: float,
+) -> List[str]:
+    """Сравнивает замеры с базовыми; RSS не сравнивается — он общий для процесса."""
+    regressions = []
+    for stage, metrics in results.items():
+        base = baseline.get(stage)
+        if not base:
+            continue
+        for metric, noise in _NOISE_FLOOR.items():
+            old, new = base.get(metric), metrics[metric]
+            if old and new > old * (1 + threshold) and new - old > noise:
+                regressions.append(f"{stage}.{metric}: {old} -> {new} (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages-dir", default=DEFAULT_PAGES_DIR)
+    parser.add_argument("--offers-dir", default=DEFAULT_OFFERS_DIR)
+    parser.add_argument("--products-dir", default=DEFAULT_PRODUCTS_DIR)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--stage", action="append", choices=STAGES, help="Запустить только указанные этапы")
+    parser.add_argument("--baseline", help="JSON с базовыми замерами для проверки регрессий")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Допустимый рост (0.25 = +25%%)")
+    parser.add_argument("--save-baseline", help="Сохранить замеры в JSON")
+    args = parser.parse_args()
+
+    # Экстракторы подробно логируют каждый селектор — в замерах это только шум
+    logging.disable(logging.CRITICAL)
+
+    pages = _read_all(args.pages_dir, "*.html")
+    offers = _read_all(args.offers_dir, "*.json")
+    products = _read_all(args.products_dir, "*.json")
+    if not pages:
+        raise SystemExit(f"Нет HTML страниц в {args.pages_dir}")
+
+    stages = build_stages(pages, offers, products)
+    selected = args.stage or list(STAGES)
+
+    results: Dict[str, Dict[str, float]] = {}
+    print(f"{'stage':<10} {'items':>6} {'ms/item':>10} {'peak alloc MiB':>15} {'peak RSS MiB':>13}")
+    for name in selected:
+        fn, items = stages[name]
+        if not items:
+            print(f"{name:<10} {'-':>6}  нет данных, пропускаем")
+            continue
+        metrics = measure(fn, items, args.repeat)
+        results[name] = metrics
+        print(
+            f"{name:<10} {len(items):>6} {metrics['ms_per_item']:>10.3f} "
+            f"{metrics['peak_alloc_mib']:>15.3f} {metrics['peak_rss_mib']:>13.1f}"
+        )
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Замеры сохранены в {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.threshold)
+        if regressions:
+            print("Регрессии:")
+            for line in regressions:
+                print(f"  {line}")
+            raise SystemExit(1)
+        print(f"Регрессий нет (порог +{args.threshold * 100:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Сравнение рендера страницы товара с лёгким профилем браузера и без него.
+
+Запуск (из корня репозитория, нужны сеть и Chromium Playwright):
+    python -m benchmarks.bench_render URL [URL ...] [--repeat N]
+
+Каждая ссылка рендерится через пул браузеров сначала без профиля (как при
+BROWSER_LEAN_PROFILE=false), затем с ним. Для каждого режима выводятся медиана
+времени до готовности страницы, загруженный объём и число заблокированных
+запросов, а для лёгкого профиля — оценка заблокированного объёма: размеры
+берутся из ответов тех же URL, загруженных в рендере без профиля. Кэш рендеров
+не используется — задайте HTTP_CACHE_MODE=off.
+"""
+import argparse
+import logging
+import statistics
+from typing import Any, Dict, List
+
+from src.core.config import settings
+from src.services.browser_pool import browser_pool
+from src.services.http_cache import http_cache
+from src.services.kaspi_parser import _render_product_page
+
+PROFILES = (("full", False), ("lean", True))
+
+
+def _render_all(url: str, lean: bool, repeat: int, wait_seconds: int) -> List[Dict[str, Any]]:
+    settings.browser_lean_profile = lean
+    return [_render_product_page(url, wait_seconds)[1] for _ in range(repeat)]
+
+
+def _summary(runs: List[Dict[str, Any]]) -> Dict[str, float]:
+    return {
+        "ready_seconds": round(statistics.median(run["ready_seconds"] for run in runs), 3),
+        "loaded_kb": round(statistics.median(run["loaded_kb"] for run in runs), 1),
+        "blocked_requests": round(statistics.median(run["blocked_requests"] for run in runs)),
+        "blocked_kb": round(statistics.median(run["blocked_kb"] for run in runs), 1),
+        "blocked_unsized": round(statistics.median(run["blocked_unsized"] for run in runs)),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("urls", nargs="+")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--wait-seconds", type=int, default=5)
+    args = parser.parse_args()
+
+    if http_cache.mode != "off":
+        raise SystemExit(f"HTTP_CACHE_MODE={http_cache.mode}: рендеры возьмутся из кэша, задайте off")
+
+    # Парсер подробно логирует каждый рендер — в замерах это только шум
+    logging.disable(logging.CRITICAL)
+
+    print(
+        f"{'url':<40} {'profile':<8} {'ready s':>8} {'loaded KB':>10} "
+        f"{'blocked':>8} {'blocked KB':>11} {'unsized':>8} {'speedup':>8}"
+    )
+    try:
+        for url in args.urls:
+            full_ready = None
+            for profile, lean in PROFILES:
+                summary = _summary(_render_all(url, lean, args.repeat, args.wait_seconds))
+                if full_ready is None:
+                    full_ready = summary["ready_seconds"]
+                speedup = full_ready / summary["ready_seconds"] if summary["ready_seconds"] else 0
+                print(
+                    f"{url[-40:]:<40} {profile:<8} {summary['ready_seconds']:>8.3f} {summary['loaded_kb']:>10.1f} "
+                    f"{summary['blocked_requests']:>8} {summary['blocked_kb']:>11.1f} "
+                    f"{summary['blocked_unsized']:>8} {speedup:>7.2f}x"
+                )
+    finally:
+        browser_pool.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,166 @@
+"""
+Настройка логирования приложения.
+
+Записи не пишутся на диск в потоке, который логирует: корневой логгер кладёт их
+в ограниченную очередь (QueueHandler), а форматирование в JSON и запись в файл
+выполняет фоновый QueueListener. При переполнении очереди записи отбрасываются,
+а не блокируют скрап. Частые записи ниже WARNING логгеров из LOG_RATE_LIMIT_LOGGERS
+(те, что пишут на каждый товар и селектор) ограничиваются по месту вызова: не больше
+LOG_RATE_LIMIT записей за LOG_RATE_LIMIT_WINDOW секунд с одной строки кода.
+Уровни задаются LOG_LEVEL и LOG_LEVELS (уровни отдельных логгеров).
+"""
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
-from pythonjsonlogger import jsonlogger
 import os
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional, Sequence, Tuple
+
+from pythonjsonlogger import jsonlogger
+
+from src.core.config import settings
+from src.core.metrics import logs_dropped
 
 # создаём директорию для логов, если нет
 os.makedirs("logs/logs", exist_ok=True)
 
+_listener: Optional[QueueListener] = None
+_setup_lock = threading.Lock()
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler, который не ждёт места в очереди, а отбрасывает запись."""
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            logs_dropped.inc("queue_full")
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Только подставляем аргументы; JSON-форматирование — в потоке слушателя
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class CallSiteRateLimitFilter(logging.Filter):
+    """
+    Пропускает не больше `limit` записей ниже WARNING за окно с одного места вызова.
+
+    Ограничиваются только логгеры из `loggers` (и их дочерние): разовые записи
+    о запуске и остановке сервисов проходят всегда.
+    """
+
+    def __init__(self, limit: int, window: float, loggers: Sequence[str] = ()):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self.loggers = tuple(loggers)
+        # (путь, строка) -> [начало окна, записей в окне, отброшено]
+        self._sites: Dict[Tuple[str, int], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.limit <= 0 or record.levelno >= logging.WARNING or not self._limited(record.name):
+            return True
+
+        now = time.monotonic()
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= self.window:
+                suppressed = site[2] if site is not None else 0
+                self._sites[key] = [now, 1, 0]
+                if suppressed:
+                    record.msg = f"{record.msg} [пропущено похожих записей: {suppressed}]"
+                return True
+            if site[1] < self.limit:
+                site[1] += 1
+                return True
+            site[2] += 1
+
+        logs_dropped.inc("rate_limited")
+        return False
+
+    def _limited(self, name: str) -> bool:
+        return any(name == logger_name or name.startswith(logger_name + ".") for logger_name in self.loggers)
+
+
+def _json_formatter() -> logging.Formatter:
+    return jsonlogger.JsonFormatter(
+        "%(asctime)s %(levelname)s %(name)s %(message)s",
+        rename_fields={
+            "asctime": "timestamp",
+            "levelname": "level",
+            "name": "source",
+            "message": "msg"
+        },
+        json_ensure_ascii=False  # Позволяет использовать Unicode символы
+    )
+
+
 def setup_logging():
-    root_logger = logging.getLogger()
-    root_logger.setLevel(logging.INFO)
+    global _listener
+    if _listener is not None:
+        return
+
+    with _setup_lock:
+        if _listener is not None:
+            return
 
-    # проверяем, чтобы не добавлять второй handler
-    if not any(isinstance(h, RotatingFileHandler) for h in root_logger.handlers):
-        handler = RotatingFileHandler(
+        file_handler = RotatingFileHandler(
             "logs/logs/app.log",     # правильный путь в logs/logs
             maxBytes=5_000_000,      # ~5MB
             backupCount=5,           # храним до 5 файлов
             encoding="utf-8"
         )
+        file_handler.setFormatter(_json_formatter())
+        handlers = [file_handler]
 
-        # JSON formatter для файла с поддержкой Unicode
-        json_formatter = jsonlogger.JsonFormatter(
-            "%(asctime)s %(levelname)s %(name)s %(message)s",
-            rename_fields={
-                "asctime": "timestamp",
-                "levelname": "level", 
-                "name": "source",
-                "message": "msg"
-            },
-            json_ensure_ascii=False  # Позволяет использовать Unicode символы
-        )
-
-        handler.setFormatter(json_formatter)
-        root_logger.addHandler(handler)
-        
-        # Добавляем консольный handler для отладки (обычный текстовый формат)
-        if not any(isinstance(h, logging.StreamHandler) for h in root_logger.handlers):
+        if settings.log_console:
+            # Консольный handler для отладки (обычный текстовый формат)
             console_handler = logging.StreamHandler()
-            console_formatter = logging.Formatter(
+            console_handler.setFormatter(logging.Formatter(
                 "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-            )
-            console_handler.setFormatter(console_formatter)
-            root_logger.addHandler(console_handler)
-
-        # убираем лишние логи от httpx/httpcore
-        logging.getLogger("httpx").setLevel(logging.WARNING)
-        logging.getLogger("httpcore").setLevel(logging.WARNING)
-        
+            ))
+            handlers.append(console_handler)
+
+        log_queue = queue.Queue(maxsize=settings.log_queue_size)
+        queue_handler = DroppingQueueHandler(log_queue)
+        queue_handler.addFilter(CallSiteRateLimitFilter(
+            settings.log_rate_limit, settings.log_rate_limit_window, settings.log_rate_limit_loggers
+        ))
+
+        root_logger = logging.getLogger()
+        root_logger.setLevel(settings.log_level.upper())
+        for handler in list(root_logger.handlers):
+            # После shutdown_logging остаётся handler старой очереди
+            if isinstance(handler, DroppingQueueHandler):
+                root_logger.removeHandler(handler)
+        root_logger.addHandler(queue_handler)
+
+        # httpx/httpcore по умолчанию тише; LOG_LEVELS может переопределить
+        levels = {"httpx": "WARNING", "httpcore": "WARNING", **settings.log_levels}
+        for name, level in levels.items():
+            logging.getLogger(name).setLevel(level.upper())
+
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
         print("Logging setup complete. Log file: logs/logs/app.log")
+
+
+def shutdown_logging() -> None:
+    """Дописывает записи из очереди и останавливает фоновый поток логирования."""
+    global _listener
+    with _setup_lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
@@ -1,3 +1,5 @@
+from typing import Dict, List, Optional
+from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from dotenv import load_dotenv
 
@@ -14,13 +16,88 @@ class Settings(BaseSettings):
     db_host: str
     db_port: int
     database_url: str
-    
-    # Redis
-    # REDIS_URL: str
-    
-    # # Celery
-    # CELERY_BROKER_URL: str
-    # CELERY_RESULT_BACKEND: str
+
+    # Browser pool (Playwright)
+    browser_headless: bool = True
+    browser_pool_size: int = 2             # количество браузеров
+    browser_pool_contexts: int = 2         # контекстов на браузер
+    browser_pool_max_pages: int = 50       # страниц на контекст до пересоздания
+    browser_pool_warmup: bool = True       # прогревать пул при старте приложения
+    browser_lean_profile: bool = True      # блокировать ненужные ресурсы и не ждать networkidle
+    browser_blocked_resource_types: List[str] = ["image", "media", "font", "stylesheet"]
+    browser_allowed_hosts: List[str] = ["kaspi.kz", "cdn-kaspi.kz"]
+    browser_ready_selectors: List[str] = [".item__rating", ".specifications"]  # ждём после h1
+
+    # Extraction
+    extraction_mode: str = "http_first"    # http_first | browser
+    http_required_fields: List[str] = ["name", "category", "attributes"]  # без них — фоллбек на браузер
+    html_parser_backend: str = "lxml-targeted"  # html.parser | lxml | lxml-targeted
+    http_pool_connections: int = 10
+    http_pool_maxsize: int = 20
+
+    # Offers API
+    offers_page_limit: int = 50            # офферов на страницу API
+    offers_concurrency: int = 4            # одновременных запросов страниц
+    offers_cookie_ttl: int = 1800          # время жизни cookies для API, секунды
+    offers_cookie_file: str = "cache/cookies.json"
+
+    # HTTP cache (off | cache | record | replay)
+    http_cache_mode: str = "off"
+    http_cache_dir: str = "cache/http"
+    http_cache_ttl: Dict[str, int] = {"page": 6 * 3600, "render": 6 * 3600, "offers": 300}
+
+    # Rate limiting (общие token bucket на класс эндпоинтов)
+    rate_limit_pages_rps: float = 2.0      # страницы товаров / категорий
+    rate_limit_offers_rps: float = 5.0     # API офферов
+    rate_limit_burst: int = 5
+    rate_limit_min_rps: float = 0.2
+    rate_limit_max_rps: float = 20.0       # потолок, до которого растёт скорость
+    rate_limit_increase_step: float = 0.1  # прибавка rps за каждый успешный ответ
+
+    # Batch scraping
+    batch_scrape_concurrency: int = 4      # товаров одновременно по умолчанию
+    batch_scrape_max_concurrency: int = 16 # верхняя граница, задаваемая клиентом
+    batch_save_group_size: int = 20        # результатов на одну транзакцию БД
+    batch_max_urls: int = 500              # максимум ссылок в одном запросе
+
+    # Write-behind buffer (групповая запись результатов одиночных скрапов)
+    write_buffer_enabled: bool = True
+    write_buffer_flush_size: int = 20      # результатов на одну запись группы
+    write_buffer_flush_interval: float = 1.0  # секунд ожидания неполной группы
+    write_buffer_max_pending: int = 200    # результатов в очереди, дальше submit ждёт
+    write_buffer_result_timeout: float = 60.0  # сколько ждать записи своей группы
+
+    # Refresh policy
+    static_refresh_interval_hours: int = 168  # полный скрап (категория, атрибуты, фото) раз в неделю
+
+    # Category discovery
+    discovery_max_pages: int = 100         # страниц листинга на один обход категории
+
+    # Recrawl scheduler
+    scheduler_enabled: bool = False        # запускать планировщик вместе с приложением
+    scheduler_requests_per_minute: float = Field(30.0, gt=0)  # общий бюджет исходящих запросов обновлений
+    scheduler_workers: int = 2             # одновременных обновлений
+    scheduler_reload_seconds: int = 600    # как часто пересчитывать волатильность
+    scheduler_volatility_window_days: int = 14
+    scheduler_min_interval_hours: float = 0.5
+    scheduler_max_interval_hours: float = 72.0
+
+    # Celery (Redis). Без брокера задачи выполняются локальным пулом потоков
+    celery_broker_url: Optional[str] = None
+    celery_result_backend: Optional[str] = None
+
+    # Logging
+    log_level: str = "INFO"
+    log_levels: Dict[str, str] = {}        # уровни отдельных логгеров, напр. {"src.services.kaspi_parser": "WARNING"}
+    log_queue_size: int = 10000            # записей в очереди до отбрасывания
+    log_rate_limit: int = 20               # записей ниже WARNING с одного места вызова за окно (0 — без лимита)
+    log_rate_limit_window: float = 60.0
+    log_rate_limit_loggers: List[str] = ["src.services.kaspi_parser", "src.utils"]  # логгеры, пишущие на каждый товар
+    log_console: bool = True               # дублировать логи в консоль (stdout контейнера)
+
+    # Scrape jobs
+    job_workers: int = 4                   # потоков локального исполнителя задач
+    job_result_ttl: int = 3600             # сколько хранить результат задачи, сек
     
     model_config = SettingsConfigDict(
         env_file=".env",
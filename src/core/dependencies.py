@@ -1,19 +1,48 @@
 """
 Dependency injection module for FastAPI.
-Provides HTTP client instances for API endpoints.
+Provides database sessions for API endpoints.
+
+Синхронный движок (psycopg2) используют Alembic и сервисы скрапа, которые
+работают в потоках. Эндпоинты чтения работают через асинхронный движок
+(asyncpg) и не занимают потоки пула FastAPI, пока ждут ответа БД.
 """
+from typing import AsyncIterator
+
 from src.core.config import settings
+from src.core.metrics import instrument_engine
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 # Используем URL как есть, теперь он содержит psycopg2
 engine = create_engine(settings.database_url, echo=False)
+instrument_engine(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def async_database_url(database_url: str) -> str:
+    """URL для асинхронного движка: драйвер PostgreSQL заменяется на asyncpg."""
+    url = make_url(database_url)
+    if url.get_backend_name() == "postgresql":
+        url = url.set(drivername="postgresql+asyncpg")
+    return url.render_as_string(hide_password=False)
+
+
+async_engine = create_async_engine(async_database_url(settings.database_url), echo=False)
+instrument_engine(async_engine.sync_engine)
+# expire_on_commit=False: объекты сериализуются в ответ уже после закрытия сессии
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
 def get_session():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
-        
+
+
+async def get_async_session() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as db:
+        yield db
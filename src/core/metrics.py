@@ -0,0 +1,179 @@
+"""
+Метрики приложения в текстовом формате Prometheus.
+
+Небольшая собственная реализация счётчиков и гистограмм (без prometheus_client):
+значения хранятся в памяти процесса и отдаются эндпоинтом /metrics.
+
+- scrape_stage_duration_seconds{stage}       — этапы скрапа (stage_timer);
+- scrape_retries_total{operation}            — повторные попытки запросов;
+- scrape_fallbacks_total{kind}               — переходы на запасной путь;
+- kaspi_responses_total{endpoint,status}     — ответы Kaspi (в т.ч. 403/429);
+- http_request_duration_seconds{method,route,status} — запросы к API;
+- db_query_duration_seconds{operation}       — запросы к БД;
+- db_rows_written_total{table,operation}     — строки, изменённые при сохранении;
+- logs_dropped_total{reason}                 — отброшенные записи логов;
+- write_buffer_flush_duration_seconds        — запись группы буфером write-behind;
+- write_buffer_batch_size                    — результатов в одной записи буфера.
+"""
+import threading
+import time
+from typing import Dict, List, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Этапы скрапа длятся от миллисекунд (разбор HTML) до минуты (рендер)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Монотонный счётчик с метками."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        key = tuple(str(label) for label in labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Гистограмма с накопительными бакетами, суммой и количеством."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        key = tuple(str(label) for label in labels)
+        with self._lock:
+            # [счётчики бакетов..., сумма, количество]
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {_format_value(cumulative)}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(series[-1])}")
+        return lines
+
+
+scrape_stage_duration = Histogram(
+    "scrape_stage_duration_seconds", "Duration of scrape pipeline stages.", ("stage",), STAGE_BUCKETS
+)
+scrape_retries = Counter("scrape_retries_total", "Retried upstream requests.", ("operation",))
+scrape_fallbacks = Counter("scrape_fallbacks_total", "Fallbacks to a slower extraction path.", ("kind",))
+kaspi_responses = Counter("kaspi_responses_total", "Responses received from Kaspi.", ("endpoint", "status"))
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Duration of API requests.", ("method", "route", "status")
+)
+db_query_duration = Histogram("db_query_duration_seconds", "Duration of database queries.", ("operation",))
+db_rows_written = Counter(
+    "db_rows_written_total", "Rows inserted, updated or deleted when saving products.", ("table", "operation")
+)
+logs_dropped = Counter("logs_dropped_total", "Log records dropped before writing.", ("reason",))
+write_buffer_flush_duration = Histogram(
+    "write_buffer_flush_duration_seconds", "Duration of write-behind buffer flushes.", (), STAGE_BUCKETS
+)
+write_buffer_batch_size = Histogram(
+    "write_buffer_batch_size", "Scrape results written per write-behind flush.", (), BATCH_SIZE_BUCKETS
+)
+
+REGISTRY = (
+    scrape_stage_duration,
+    scrape_retries,
+    scrape_fallbacks,
+    kaspi_responses,
+    http_request_duration,
+    db_query_duration,
+    db_rows_written,
+    logs_dropped,
+    write_buffer_flush_duration,
+    write_buffer_batch_size,
+)
+
+
+def render_metrics() -> str:
+    """Все метрики в текстовом формате Prometheus 0.0.4."""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Замеряет длительность запросов движка SQLAlchemy по типу операции."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+        db_query_duration.observe(time.perf_counter() - started, operation)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        # Упавший запрос не дойдёт до after_cursor_execute — убираем его отметку
+        if context.connection is not None and context.connection.info.get("query_started"):
+            context.connection.info["query_started"].pop()
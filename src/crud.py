@@ -1,12 +1,21 @@
 from typing import List, Optional
-from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from sqlalchemy import select, desc, func
 
 from src.models import Product, ProductOffer, ProductAttribute, ProductImage, ProductPriceHistory, ProductOfferHistory
+from src.utils import DEFAULT_CITY_ID
 
 
 # Product CRUD operations
-def get_product_by_id(db: Session, product_id: int) -> Optional[Product]:
+async def product_exists(db: AsyncSession, product_id: int) -> bool:
+    """Проверить, что продукт существует (без загрузки связанных данных)."""
+    stmt = select(Product.id).where(Product.id == product_id)
+    result = await db.execute(stmt)
+    return result.scalar_one_or_none() is not None
+
+
+async def get_product_by_id(db: AsyncSession, product_id: int) -> Optional[Product]:
     """Получить продукт по ID с загрузкой связанных данных."""
     stmt = (
         select(Product)
@@ -18,11 +27,11 @@ def get_product_by_id(db: Session, product_id: int) -> Optional[Product]:
         )
         .where(Product.id == product_id)
     )
-    result = db.execute(stmt)
+    result = await db.execute(stmt)
     return result.scalar_one_or_none()
 
 
-def get_product_by_kaspi_id(db: Session, kaspi_id: str) -> Optional[Product]:
+async def get_product_by_kaspi_id(db: AsyncSession, kaspi_id: str) -> Optional[Product]:
     """Получить продукт по Kaspi ID с загрузкой связанных данных."""
     stmt = (
         select(Product)
@@ -34,12 +43,12 @@ def get_product_by_kaspi_id(db: Session, kaspi_id: str) -> Optional[Product]:
         )
         .where(Product.kaspi_id == kaspi_id)
     )
-    result = db.execute(stmt)
+    result = await db.execute(stmt)
     return result.scalar_one_or_none()
 
 
-def get_products(
-    db: Session, 
+async def get_products(
+    db: AsyncSession, 
     skip: int = 0, 
     limit: int = 100,
     category: Optional[str] = None
@@ -51,12 +60,12 @@ def get_products(
         stmt = stmt.where(Product.category.ilike(f"%{category}%"))
     
     stmt = stmt.order_by(desc(Product.created_at))
-    result = db.execute(stmt)
+    result = await db.execute(stmt)
     return result.scalars().all()
 
 
-def get_products_with_relations(
-    db: Session, 
+async def get_products_with_relations(
+    db: AsyncSession, 
     skip: int = 0, 
     limit: int = 100,
     category: Optional[str] = None
@@ -78,37 +87,33 @@ def get_products_with_relations(
         stmt = stmt.where(Product.category.ilike(f"%{category}%"))
     
     stmt = stmt.order_by(desc(Product.created_at))
-    result = db.execute(stmt)
+    result = await db.execute(stmt)
     return result.scalars().all()
 
 
 # Product Offers CRUD operations
-def get_product_offers(db: Session, product_id: int) -> List[ProductOffer]:
-    """Получить все предложения для продукта."""
+async def get_product_offers(db: AsyncSession, product_id: int, city_id: Optional[str] = None) -> List[ProductOffer]:
+    """Получить все предложения для продукта (опционально только в одном городе)."""
     stmt = (
         select(ProductOffer)
         .where(ProductOffer.product_id == product_id)
         .order_by(ProductOffer.price)
     )
-    result = db.execute(stmt)
+    
+    if city_id:
+        stmt = stmt.where(ProductOffer.city_id == city_id)
+    result = await db.execute(stmt)
     return result.scalars().all()
 
 
-def get_product_offers_history(
-    db: Session, 
+async def get_product_offers_history(
+    db: AsyncSession, 
     product_id: int,
     limit: int = 100
 ) -> List[ProductOfferHistory]:
     """Получить историю изменения предложений для продукта."""
-    # Сначала получаем все offer_id для данного продукта
-    offers_stmt = select(ProductOffer.id).where(ProductOffer.product_id == product_id)
-    offers_result = db.execute(offers_stmt)
-    offer_ids = [row[0] for row in offers_result.fetchall()]
-    
-    if not offer_ids:
-        return []
-    
-    # Затем получаем историю для этих предложений
+    # offer_id продукта выбираются подзапросом — один запрос к БД вместо двух
+    offer_ids = select(ProductOffer.id).where(ProductOffer.product_id == product_id)
     stmt = (
         select(ProductOfferHistory)
         .options(selectinload(ProductOfferHistory.offer))
@@ -116,13 +121,13 @@ def get_product_offers_history(
         .order_by(desc(ProductOfferHistory.changed_at))
         .limit(limit)
     )
-    result = db.execute(stmt)
+    result = await db.execute(stmt)
     return result.scalars().all()
 
 
 # Product Price History CRUD operations
-def get_product_price_history(
-    db: Session, 
+async def get_product_price_history(
+    db: AsyncSession, 
     product_id: int,
     limit: int = 100
 ) -> List[ProductPriceHistory]:
@@ -133,67 +138,73 @@ def get_product_price_history(
         .order_by(desc(ProductPriceHistory.recorded_at))
         .limit(limit)
     )
-    result = db.execute(stmt)
+    result = await db.execute(stmt)
     return result.scalars().all()
 
 
 # Product Attributes CRUD operations
-def get_product_attributes(db: Session, product_id: int) -> List[ProductAttribute]:
+async def get_product_attributes(db: AsyncSession, product_id: int) -> List[ProductAttribute]:
     """Получить все атрибуты продукта."""
     stmt = (
         select(ProductAttribute)
         .where(ProductAttribute.product_id == product_id)
         .order_by(ProductAttribute.attribute_name)
     )
-    result = db.execute(stmt)
+    result = await db.execute(stmt)
     return result.scalars().all()
 
 
 # Product Images CRUD operations
-def get_product_images(db: Session, product_id: int) -> List[ProductImage]:
+async def get_product_images(db: AsyncSession, product_id: int) -> List[ProductImage]:
     """Получить все изображения продукта."""
     stmt = (
         select(ProductImage)
         .where(ProductImage.product_id == product_id)
         .order_by(ProductImage.created_at)
     )
-    result = db.execute(stmt)
+    result = await db.execute(stmt)
     return result.scalars().all()
 
 
 # Statistics and aggregation functions
-def get_products_count(db: Session, category: Optional[str] = None) -> int:
+async def get_products_count(db: AsyncSession, category: Optional[str] = None) -> int:
     """Получить количество продуктов."""
     stmt = select(func.count(Product.id))
     
     if category:
         stmt = stmt.where(Product.category.ilike(f"%{category}%"))
     
-    result = db.execute(stmt)
+    result = await db.execute(stmt)
     return result.scalar() or 0
 
 
-def get_cheapest_offer_for_product(db: Session, product_id: int) -> Optional[ProductOffer]:
-    """Получить самое дешевое предложение для продукта."""
+async def get_cheapest_offer_for_product(
+    db: AsyncSession, product_id: int, city_id: str = DEFAULT_CITY_ID
+) -> Optional[ProductOffer]:
+    """Получить самое дешевое предложение для продукта в городе."""
     stmt = (
         select(ProductOffer)
         .where(ProductOffer.product_id == product_id)
+        .where(ProductOffer.city_id == city_id)
         .where(ProductOffer.price.isnot(None))
         .order_by(ProductOffer.price)
         .limit(1)
     )
-    result = db.execute(stmt)
+    result = await db.execute(stmt)
     return result.scalar_one_or_none()
 
 
-def get_most_expensive_offer_for_product(db: Session, product_id: int) -> Optional[ProductOffer]:
-    """Получить самое дорогое предложение для продукта."""
+async def get_most_expensive_offer_for_product(
+    db: AsyncSession, product_id: int, city_id: str = DEFAULT_CITY_ID
+) -> Optional[ProductOffer]:
+    """Получить самое дорогое предложение для продукта в городе."""
     stmt = (
         select(ProductOffer)
         .where(ProductOffer.product_id == product_id)
+        .where(ProductOffer.city_id == city_id)
         .where(ProductOffer.price.isnot(None))
         .order_by(desc(ProductOffer.price))
         .limit(1)
     )
-    result = db.execute(stmt)
+    result = await db.execute(stmt)
     return result.scalar_one_or_none()
@@ -1,16 +1,48 @@
 import logging
-from fastapi import FastAPI
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 
+from src.core.config import settings
+from src.core.dependencies import async_engine
+from src.core.metrics import http_request_duration, render_metrics
 from src.routers import health, api_v1, products
-from logs.config_logs import setup_logging
+from src.services.browser_pool import browser_pool
+from src.services.scheduler import recrawl_scheduler
+from src.services.write_buffer import write_buffer
+from src.tasks import shutdown_jobs
+from logs.config_logs import setup_logging, shutdown_logging
 
 setup_logging()
 
+logger = logging.getLogger(__name__)
 
 
-app = FastAPI()
-logger = logging.getLogger(__name__)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Прогревает пул браузеров и запускает планировщик при старте, останавливает всё при остановке."""
+    if settings.browser_pool_warmup:
+        try:
+            await run_in_threadpool(browser_pool.start)
+        except Exception as e:
+            # Без браузеров API чтения продолжает работать, пул поднимется при первом скрапе
+            logger.error(f"Не удалось прогреть пул браузеров: {e}")
+    if settings.scheduler_enabled:
+        recrawl_scheduler.start()
+    yield
+    await run_in_threadpool(recrawl_scheduler.stop)
+    shutdown_jobs()
+    await run_in_threadpool(browser_pool.stop)
+    # После задач: дописываем результаты, которые ещё ждут в буфере
+    await run_in_threadpool(write_buffer.stop)
+    await async_engine.dispose()
+    shutdown_logging()
+
+
+app = FastAPI(lifespan=lifespan)
 
 origins = ['*']
 
@@ -22,11 +54,33 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def observe_request_duration(request: Request, call_next):
+    """Замеряет длительность запросов к API по шаблону маршрута."""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        http_request_duration.observe(time.perf_counter() - started, request.method, path, status)
+
+
 app.include_router(health.router)
 app.include_router(api_v1.router)
 app.include_router(products.router)
 
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    """Метрики в текстовом формате Prometheus."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.get("/")
 def root():
     """Root endpoint - redirects to health check."""
@@ -1,5 +1,5 @@
 from sqlalchemy import (
-    Column, Integer, String, Float, ForeignKey, DateTime, Boolean, Text
+    Column, Integer, String, Float, ForeignKey, DateTime, Boolean, Text, UniqueConstraint
 )
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.sql import func
@@ -18,6 +18,7 @@ class Product(Base):
     rating = Column(Float)
     offers_count = Column(Integer)
     reviews_count = Column(Integer)
+    static_refreshed_at = Column(DateTime(timezone=True))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
@@ -28,9 +29,13 @@ class Product(Base):
 
 class ProductOffer(Base):
     __tablename__ = "product_offers"
+    __table_args__ = (
+        UniqueConstraint("product_id", "city_id", "seller_name", name="uq_product_offers_product_city_seller"),
+    )
     id = Column(Integer, primary_key=True)
     product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"))
     seller_name = Column(String)
+    city_id = Column(String, nullable=False, server_default="750000000")
     price = Column(Float)
     last_seen = Column(DateTime(timezone=True), server_default=func.now())
     product = relationship("Product", back_populates="offers")
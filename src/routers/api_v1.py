@@ -1,9 +1,36 @@
-from fastapi import APIRouter, HTTPException
+import json
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Iterator
 
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from src.core.config import settings
 from src.services.kaspi_parser import parse_kaspi_product_with_bs
-from src.services.file_service import save_scraped_data
+from src.services.write_buffer import write_buffer
+from src.services.scrape_service import scrape_batch, scrape_offers_multi_city, refresh_products
+from src.services.rate_limiter import rate_limiters_snapshot
+from src.services.scheduler import recrawl_scheduler
+from src.services.category_crawler import (
+    discover_category_products,
+    is_valid_kaspi_category_url
+)
+from src.tasks import submit_scrape_job, get_job_status, JOB_QUEUED
 from src.utils import is_valid_kaspi_url, extract_product_id_from_url
-from src.schemas import SeedRequest
+from src.schemas import (
+    SeedRequest,
+    DiscoverRequest,
+    BatchScrapeRequest,
+    BatchScrapeResponse,
+    MultiCityOffersRequest,
+    RefreshOffersRequest,
+    MultiCityOffersResponse,
+    JobSubmitResponse,
+    JobStatusResponse,
+    RateLimiterStateResponse,
+    SchedulerStateResponse
+)
 
 from logs.config_logs import setup_logging
 import logging
@@ -14,6 +41,7 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/parser", tags=["parser"])
 
+
 @router.post("/scrape-props")
 def scrape_props(data: SeedRequest):
     logger.info(f"Starting scrape for URL: {data.product_url}")
@@ -31,11 +59,157 @@ def scrape_props(data: SeedRequest):
         raise HTTPException(status_code=400, detail=f"Cannot extract product ID from URL / Internet problems: {e}")
     
     logger.info(f"Starting parsing for product {product_id}")
-    scraped_data = parse_kaspi_product_with_bs(url, headless=True)
+    scraped_data = parse_kaspi_product_with_bs(url)
     
-    # Сохраняем данные в файлы через сервис
-    logger.info(f"Saving scraped data for product {product_id}")
-    save_scraped_data(scraped_data, product_id)
+    # Сохраняем данные через буфер записи и ждём запись своей группы,
+    # чтобы клиент узнал об ошибке сохранения
+    logger.info(f"Queueing scraped data for product {product_id}")
+    try:
+        error = write_buffer.submit(scraped_data, product_id).result(
+            timeout=settings.write_buffer_result_timeout
+        )
+    except FutureTimeoutError:
+        error = f"not written within {settings.write_buffer_result_timeout} s"
+    if error:
+        logger.error(f"Failed to save product {product_id}: {error}")
+        raise HTTPException(status_code=500, detail=f"Save failed: {error}")
     
     logger.info(f"Successfully completed scraping for product {product_id}")
-    return scraped_data
\ No newline at end of file
+    return scraped_data
+
+
+@router.post("/scrape-batch", response_model=BatchScrapeResponse)
+def scrape_batch_props(data: BatchScrapeRequest):
+    """Скрапит пакет ссылок с ограниченной конкурентностью и групповой записью в БД."""
+    if len(data.product_urls) > settings.batch_max_urls:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many URLs: {len(data.product_urls)} > {settings.batch_max_urls}"
+        )
+
+    logger.info(f"Starting batch scrape for {len(data.product_urls)} URLs")
+    started = time.perf_counter()
+    results = scrape_batch(data.product_urls, concurrency=data.concurrency)
+    elapsed = round(time.perf_counter() - started, 3)
+
+    succeeded = sum(1 for r in results if r["status"] == "ok")
+    logger.info(f"Batch scrape finished: {succeeded}/{len(results)} succeeded in {elapsed}s")
+    return BatchScrapeResponse(
+        total=len(results),
+        succeeded=succeeded,
+        failed=len(results) - succeeded,
+        elapsed=elapsed,
+        results=results
+    )
+
+
+@router.post("/refresh-offers", response_model=BatchScrapeResponse)
+def refresh_offers(data: RefreshOffersRequest):
+    """
+    Быстро обновляет цены товаров только через API офферов.
+
+    Товары, которых нет в БД или у которых устарели статичные поля, проходят полный скрап.
+    """
+    if len(data.product_urls) > settings.batch_max_urls:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many URLs: {len(data.product_urls)} > {settings.batch_max_urls}"
+        )
+
+    logger.info(f"Starting offers refresh for {len(data.product_urls)} URLs")
+    started = time.perf_counter()
+    results = refresh_products(data.product_urls, force_static=data.force_static, concurrency=data.concurrency)
+    elapsed = round(time.perf_counter() - started, 3)
+
+    succeeded = sum(1 for r in results if r["status"] == "ok")
+    logger.info(f"Offers refresh finished: {succeeded}/{len(results)} succeeded in {elapsed}s")
+    return BatchScrapeResponse(
+        total=len(results),
+        succeeded=succeeded,
+        failed=len(results) - succeeded,
+        elapsed=elapsed,
+        results=results
+    )
+
+
+@router.post("/offers/multi-city", response_model=MultiCityOffersResponse)
+def scrape_offers_multi_city_props(data: MultiCityOffersRequest):
+    """Собирает офферы товара по нескольким городам одним вызовом и сохраняет их по городам."""
+    if not is_valid_kaspi_url(data.product_url):
+        logger.warning(f"Invalid Kaspi URL provided: {data.product_url}")
+        raise HTTPException(status_code=400, detail="Invalid Kaspi URL")
+    if not all(city_id.isdigit() for city_id in data.city_ids):
+        raise HTTPException(status_code=400, detail="City ids must be numeric")
+
+    logger.info(f"Fetching offers for {len(data.city_ids)} cities: {data.product_url}")
+    started = time.perf_counter()
+    result = scrape_offers_multi_city(data.product_url, data.city_ids)
+    elapsed = round(time.perf_counter() - started, 3)
+
+    logger.info(f"Multi-city offers for product {result['product_id']} fetched in {elapsed}s")
+    return MultiCityOffersResponse(elapsed=elapsed, **result)
+
+
+@router.post("/discover")
+def discover_category(data: DiscoverRequest):
+    """
+    Обходит категорию и построчно (NDJSON) отдаёт найденные товары.
+
+    При scrape=true каждый товар сразу ставится в очередь скрапа, поэтому скрап
+    идёт параллельно с обходом. Последняя строка — итог с "done": true.
+    """
+    if not is_valid_kaspi_category_url(data.category_url):
+        logger.warning(f"Invalid Kaspi category URL provided: {data.category_url}")
+        raise HTTPException(status_code=400, detail="Invalid Kaspi category URL")
+
+    logger.info(f"Starting discovery for {data.category_url} (skip known: {data.skip_known})")
+
+    def _stream() -> Iterator[str]:
+        discovered = 0
+        products = discover_category_products(
+            data.category_url, max_pages=data.max_pages, skip_known=data.skip_known
+        )
+        for url in products:
+            discovered += 1
+            item = {"url": url, "product_id": extract_product_id_from_url(url), "job_id": None}
+            if data.scrape:
+                item["job_id"] = submit_scrape_job(url)
+            yield json.dumps(item, ensure_ascii=False) + "\n"
+
+        logger.info(f"Discovery finished for {data.category_url}: {discovered} products")
+        yield json.dumps({"done": True, "discovered": discovered}) + "\n"
+
+    return StreamingResponse(_stream(), media_type="application/x-ndjson")
+
+
+@router.post("/jobs", response_model=JobSubmitResponse, status_code=202)
+def submit_scrape(data: SeedRequest):
+    """Ставит скрап товара в очередь и сразу возвращает id задачи."""
+    if not is_valid_kaspi_url(data.product_url):
+        logger.warning(f"Invalid Kaspi URL provided: {data.product_url}")
+        raise HTTPException(status_code=400, detail="Invalid Kaspi URL")
+
+    job_id = submit_scrape_job(data.product_url)
+    logger.info(f"Scrape job {job_id} submitted for URL: {data.product_url}")
+    return JobSubmitResponse(job_id=job_id, status=JOB_QUEUED)
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+def get_scrape_job(job_id: str):
+    """Возвращает прогресс или результат задачи скрапа."""
+    job = get_job_status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/scheduler", response_model=SchedulerStateResponse)
+def get_scheduler_state(limit: int = Query(50, ge=1, le=1000, description="Сколько ближайших товаров показать")):
+    """Очередь планировщика обновлений: интервалы и ближайшие сроки по товарам."""
+    return recrawl_scheduler.snapshot(limit=limit)
+
+
+@router.get("/rate-limits", response_model=list[RateLimiterStateResponse])
+def get_rate_limits():
+    """Текущая скорость и глубина очереди общих ограничителей запросов."""
+    return rate_limiters_snapshot()
@@ -2,12 +2,13 @@ import json
 import os
 from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from math import ceil
 import logging
 
-from src.core.dependencies import get_session
+from src.core.dependencies import get_async_session
 from src import crud
+from src.utils import DEFAULT_CITY_ID
 from src.schemas import (
     ProductResponse, 
     ProductBaseResponse,
@@ -31,21 +32,21 @@ router = APIRouter(prefix="/products", tags=["products"])
 
 
 @router.get("/", response_model=ProductListResponse)
-def get_products(
+async def get_products(
     skip: int = Query(0, ge=0, description="Количество продуктов для пропуска"),
     limit: int = Query(20, ge=1, le=100, description="Количество продуктов на странице"),
     category: Optional[str] = Query(None, description="Фильтр по категории"),
-    db: Session = Depends(get_session)
+    db: AsyncSession = Depends(get_async_session)
 ):
     """Получить список продуктов с пагинацией и фильтрацией."""
     
     logger.info(f"Getting products list: skip={skip}, limit={limit}, category={category}")
     
     # Получаем продукты
-    products = crud.get_products(db, skip=skip, limit=limit, category=category)
+    products = await crud.get_products(db, skip=skip, limit=limit, category=category)
     
     # Получаем общее количество
-    total = crud.get_products_count(db, category=category)
+    total = await crud.get_products_count(db, category=category)
     
     # Рассчитываем пагинацию
     page = (skip // limit) + 1
@@ -61,19 +62,19 @@ def get_products(
 
 
 @router.get("/detailed", response_model=ProductDetailedListResponse)
-def get_products_detailed(
+async def get_products_detailed(
     skip: int = Query(0, ge=0, description="Количество продуктов для пропуска"),
     limit: int = Query(10, ge=1, le=50, description="Количество продуктов на странице"),
     category: Optional[str] = Query(None, description="Фильтр по категории"),
-    db: Session = Depends(get_session)
+    db: AsyncSession = Depends(get_async_session)
 ):
     """Получить список продуктов со всеми связанными данными."""
     
     # Получаем продукты с полными данными
-    products = crud.get_products_with_relations(db, skip=skip, limit=limit, category=category)
+    products = await crud.get_products_with_relations(db, skip=skip, limit=limit, category=category)
     
     # Получаем общее количество
-    total = crud.get_products_count(db, category=category)
+    total = await crud.get_products_count(db, category=category)
     
     # Рассчитываем пагинацию
     page = (skip // limit) + 1
@@ -89,15 +90,15 @@ def get_products_detailed(
 
 
 @router.get("/{product_id}", response_model=ProductResponse)
-def get_product(
+async def get_product(
     product_id: int,
-    db: Session = Depends(get_session)
+    db: AsyncSession = Depends(get_async_session)
 ):
     """Получить продукт по ID со всеми связанными данными."""
     
     logger.info(f"Getting product by ID: {product_id}")
     
-    product = crud.get_product_by_id(db, product_id)
+    product = await crud.get_product_by_id(db, product_id)
     if not product:
         logger.warning(f"Product not found: {product_id}")
         raise HTTPException(status_code=404, detail="Product not found")
@@ -107,73 +108,71 @@ def get_product(
 
 
 @router.get("/{product_id}/prices", response_model=list[ProductPriceHistoryResponse])
-def get_product_prices(
+async def get_product_prices(
     product_id: int,
     limit: int = Query(50, ge=1, le=200, description="Количество записей истории"),
-    db: Session = Depends(get_session)
+    db: AsyncSession = Depends(get_async_session)
 ):
     """Получить историю цен продукта."""
     
     # Проверяем, что продукт существует
-    product = crud.get_product_by_id(db, product_id)
-    if not product:
+    if not await crud.product_exists(db, product_id):
         raise HTTPException(status_code=404, detail="Product not found")
     
-    price_history = crud.get_product_price_history(db, product_id, limit=limit)
+    price_history = await crud.get_product_price_history(db, product_id, limit=limit)
     return price_history
 
 
 @router.get("/{product_id}/offers", response_model=list[ProductOfferResponse])
-def get_product_offers(
+async def get_product_offers(
     product_id: int,
-    db: Session = Depends(get_session)
+    city_id: Optional[str] = Query(None, description="Фильтр по городу (id города Kaspi)"),
+    db: AsyncSession = Depends(get_async_session)
 ):
     """Получить все предложения для продукта."""
     
     # Проверяем, что продукт существует
-    product = crud.get_product_by_id(db, product_id)
-    if not product:
+    if not await crud.product_exists(db, product_id):
         raise HTTPException(status_code=404, detail="Product not found")
     
-    offers = crud.get_product_offers(db, product_id)
+    offers = await crud.get_product_offers(db, product_id, city_id=city_id)
     return offers
 
 
 @router.get("/{product_id}/offers/history", response_model=list[ProductOfferHistoryResponse])
-def get_product_offers_history(
+async def get_product_offers_history(
     product_id: int,
     limit: int = Query(100, ge=1, le=500, description="Количество записей истории"),
-    db: Session = Depends(get_session)
+    db: AsyncSession = Depends(get_async_session)
 ):
     """Получить историю изменения предложений продукта."""
     
     # Проверяем, что продукт существует
-    product = crud.get_product_by_id(db, product_id)
-    if not product:
+    if not await crud.product_exists(db, product_id):
         raise HTTPException(status_code=404, detail="Product not found")
     
-    offers_history = crud.get_product_offers_history(db, product_id, limit=limit)
+    offers_history = await crud.get_product_offers_history(db, product_id, limit=limit)
     return offers_history
 
 
 @router.get("/{product_id}/stats", response_model=ProductStatsResponse)
-def get_product_stats(
+async def get_product_stats(
     product_id: int,
-    db: Session = Depends(get_session)
+    city_id: str = Query(DEFAULT_CITY_ID, description="Город, по офферам которого считается статистика"),
+    db: AsyncSession = Depends(get_async_session)
 ):
     """Получить статистику по продукту."""
     
     # Проверяем, что продукт существует
-    product = crud.get_product_by_id(db, product_id)
-    if not product:
+    if not await crud.product_exists(db, product_id):
         raise HTTPException(status_code=404, detail="Product not found")
     
     # Получаем предложения
-    offers = crud.get_product_offers(db, product_id)
+    offers = await crud.get_product_offers(db, product_id, city_id=city_id)
     
     # Получаем самые дешевые и дорогие предложения
-    cheapest = crud.get_cheapest_offer_for_product(db, product_id)
-    most_expensive = crud.get_most_expensive_offer_for_product(db, product_id)
+    cheapest = await crud.get_cheapest_offer_for_product(db, product_id, city_id=city_id)
+    most_expensive = await crud.get_most_expensive_offer_for_product(db, product_id, city_id=city_id)
     
     # Рассчитываем статистику
     prices = [offer.price for offer in offers if offer.price is not None]
@@ -194,13 +193,13 @@ def get_product_stats(
 
 
 @router.get("/kaspi/{kaspi_id}", response_model=ProductResponse)
-def get_product_by_kaspi_id(
+async def get_product_by_kaspi_id(
     kaspi_id: str,
-    db: Session = Depends(get_session)
+    db: AsyncSession = Depends(get_async_session)
 ):
     """Получить продукт по Kaspi ID."""
     
-    product = crud.get_product_by_kaspi_id(db, kaspi_id)
+    product = await crud.get_product_by_kaspi_id(db, kaspi_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
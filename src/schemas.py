@@ -1,12 +1,128 @@
 from datetime import datetime
 from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 
 # API Request/Response models
 class SeedRequest(BaseModel):
     """Seed product URL request."""
     product_url: str
 
+
+class BatchScrapeRequest(BaseModel):
+    """Batch scrape request."""
+    product_urls: List[str] = Field(..., min_length=1)
+    concurrency: Optional[int] = Field(None, ge=1)
+
+
+class RefreshOffersRequest(BaseModel):
+    """Запрос на обновление цен товаров."""
+    product_urls: List[str] = Field(..., min_length=1)
+    force_static: bool = False
+    concurrency: Optional[int] = Field(None, ge=1)
+
+
+class DiscoverRequest(BaseModel):
+    """Запрос обхода категории."""
+    category_url: str
+    max_pages: Optional[int] = Field(None, ge=1)
+    skip_known: bool = True     # не отдавать товары, которые уже есть в БД
+    scrape: bool = True         # сразу ставить найденные товары в очередь скрапа
+
+
+class BatchScrapeItemResponse(BaseModel):
+    """Результат скрапа одной ссылки из пакета."""
+    url: str
+    product_id: Optional[str]
+    status: str
+    error: Optional[str]
+    source: Optional[str] = None
+    timings: Dict[str, float]
+
+
+class BatchScrapeResponse(BaseModel):
+    """Ответ пакетного скрапа."""
+    total: int
+    succeeded: int
+    failed: int
+    elapsed: float
+    results: List[BatchScrapeItemResponse]
+
+class MultiCityOffersRequest(BaseModel):
+    """Запрос офферов товара сразу по нескольким городам."""
+    product_url: str
+    city_ids: List[str] = Field(..., min_length=1)
+
+
+class CityOffersResponse(BaseModel):
+    """Офферы товара в одном городе."""
+    city_id: str
+    offers_amount: int
+    price_min: Optional[float]
+    price_max: Optional[float]
+    offers: List[Dict[str, Any]]
+
+
+class MultiCityOffersResponse(BaseModel):
+    """Ответ на запрос офферов по нескольким городам."""
+    product_id: str
+    saved: bool
+    elapsed: float
+    cities: List[CityOffersResponse]
+
+
+class JobSubmitResponse(BaseModel):
+    """Ответ на постановку задачи скрапа в очередь."""
+    job_id: str
+    status: str
+
+
+class JobStatusResponse(BaseModel):
+    """Статус задачи скрапа."""
+    job_id: str
+    url: Optional[str]
+    status: str
+    stage: Optional[str]
+    result: Optional[Dict[str, Any]]
+    error: Optional[str]
+
+
+class RateLimiterStateResponse(BaseModel):
+    """Состояние ограничителя частоты запросов."""
+    name: str
+    rate: float
+    min_rate: float
+    max_rate: float
+    tokens: float
+    queue_depth: int
+    requests_total: int
+    throttled_total: int
+
+
+class ScheduledProductResponse(BaseModel):
+    """Расписание обновления одного товара."""
+    product_id: int
+    kaspi_id: str
+    price_changes: int
+    interval_hours: float
+    next_due: datetime
+    in_flight: bool
+    last_run_at: Optional[datetime]
+    last_status: Optional[str]
+
+
+class SchedulerStateResponse(BaseModel):
+    """Состояние планировщика обновлений."""
+    running: bool
+    requests_per_minute: float
+    products: int
+    due: int
+    in_flight: int
+    refreshed_total: int
+    failed_total: int
+    loaded_at: Optional[datetime]
+    queue: List[ScheduledProductResponse]
+
+
 class HealthResponse(BaseModel):
     """Health check response."""
     status: str
@@ -36,6 +152,7 @@ class ProductOfferResponse(BaseModel):
     
     id: int
     seller_name: str
+    city_id: str
     price: Optional[float]
     last_seen: datetime
 
@@ -0,0 +1,352 @@
+"""
+Пул браузеров Playwright, переиспользуемый между скрапами.
+
+Пул держит N браузеров Chromium × M контекстов в отдельном потоке со своим
+event loop. Синхронный код заимствует страницу через `BrowserPool.run()`,
+передавая корутину, которая получает готовую `Page`. Контекст пересоздаётся
+после K отданных страниц, браузер перезапускается, если он упал.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+from urllib.parse import urlparse
+
+from playwright.async_api import (
+    async_playwright,
+    Browser,
+    BrowserContext,
+    Page,
+    Playwright,
+    Route,
+    Error as PlaywrightError,
+    TimeoutError as PlaywrightTimeoutError,
+)
+
+from src.core.config import settings
+from src.utils import stage_timer
+from logs.config_logs import setup_logging
+import logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class _ContextSlot:
+    """Контекст браузера, который выдаётся из пула."""
+    browser_index: int
+    browser: Optional[Browser] = None
+    context: Optional[BrowserContext] = None
+    pages_served: int = 0
+    broken: bool = False
+
+
+class BrowserPool:
+    """Долгоживущий пул браузеров и контекстов Playwright."""
+
+    def __init__(
+        self,
+        browsers: int = 2,
+        contexts_per_browser: int = 2,
+        max_pages_per_context: int = 50,
+        headless: bool = True,
+        launch_args: Optional[List[str]] = None,
+    ):
+        self.browsers = max(1, browsers)
+        self.contexts_per_browser = max(1, contexts_per_browser)
+        self.max_pages_per_context = max(1, max_pages_per_context)
+        self.headless = headless
+        self.launch_args = launch_args or ["--disable-gpu", "--no-sandbox"]
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+        # Объекты ниже живут только в потоке пула
+        self._playwright: Optional[Playwright] = None
+        self._browsers: List[Optional[Browser]] = []
+        self._browser_locks: List[asyncio.Lock] = []
+        self._slots: Optional[asyncio.Queue] = None
+
+    @property
+    def started(self) -> bool:
+        return self._loop is not None
+
+    def start(self) -> None:
+        """Запускает поток пула и прогревает все браузеры и контексты."""
+        with self._start_lock:
+            if self._loop is not None:
+                return
+
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="browser-pool", daemon=True)
+            thread.start()
+
+            try:
+                asyncio.run_coroutine_threadsafe(self._start(), loop).result()
+            except Exception:
+                try:
+                    asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result(timeout=30)
+                except Exception as e:
+                    logger.error(f"Ошибка при откате запуска пула браузеров: {e}")
+                loop.call_soon_threadsafe(loop.stop)
+                thread.join()
+                loop.close()
+                raise
+
+            self._loop, self._thread = loop, thread
+            logger.info(
+                f"Пул браузеров запущен: {self.browsers} браузер(ов) × "
+                f"{self.contexts_per_browser} контекст(ов)"
+            )
+
+    def stop(self) -> None:
+        """Закрывает все браузеры и останавливает поток пула."""
+        with self._start_lock:
+            if self._loop is None:
+                return
+
+            try:
+                asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(timeout=30)
+            except Exception as e:
+                logger.error(f"Ошибка при остановке пула браузеров: {e}")
+
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=10)
+            self._loop.close()
+            self._loop, self._thread = None, None
+            logger.info("Пул браузеров остановлен")
+
+    def run(self, fn: Callable[[Page], Awaitable[T]], timeout: Optional[float] = None) -> T:
+        """
+        Выполняет `fn(page)` на странице из пула и возвращает результат.
+
+        Args:
+            fn: Корутина, получающая свежую страницу; страница закрывается после вызова
+            timeout: Максимальное время ожидания результата в секундах
+        """
+        if not self.started:
+            self.start()
+        future = asyncio.run_coroutine_threadsafe(self._run(fn), self._loop)
+        return future.result(timeout)
+
+    async def _start(self) -> None:
+        self._playwright = await async_playwright().start()
+        self._browsers = [None] * self.browsers
+        self._browser_locks = [asyncio.Lock() for _ in range(self.browsers)]
+        self._slots = asyncio.Queue()
+
+        for index in range(self.browsers):
+            for _ in range(self.contexts_per_browser):
+                slot = _ContextSlot(browser_index=index)
+                await self._open_context(slot)
+                self._slots.put_nowait(slot)
+
+    async def _shutdown(self) -> None:
+        for browser in self._browsers:
+            if browser is not None:
+                try:
+                    await browser.close()
+                except PlaywrightError:
+                    pass
+        self._browsers = []
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    async def _ensure_browser(self, index: int) -> Browser:
+        async with self._browser_locks[index]:
+            browser = self._browsers[index]
+            if browser is None or not browser.is_connected():
+                if browser is not None:
+                    logger.warning(f"Браузер #{index} отключился, перезапускаем")
+                with stage_timer(None, "browser_launch"):
+                    browser = await self._playwright.chromium.launch(
+                        headless=self.headless, args=self.launch_args
+                    )
+                self._browsers[index] = browser
+            return browser
+
+    async def _open_context(self, slot: _ContextSlot) -> None:
+        browser = await self._ensure_browser(slot.browser_index)
+        slot.context = await browser.new_context(
+            locale="ru-RU",
+            extra_http_headers={"Accept-Language": "ru-RU,ru;q=0.9"},
+        )
+        slot.browser = browser
+        slot.pages_served = 0
+        slot.broken = False
+
+    async def _recycle_context(self, slot: _ContextSlot) -> None:
+        if slot.context is not None:
+            try:
+                await slot.context.close()
+            except PlaywrightError:
+                pass
+            slot.context = None
+        await self._open_context(slot)
+
+    def _slot_alive(self, slot: _ContextSlot) -> bool:
+        return (
+            slot.context is not None
+            and not slot.broken
+            and slot.browser is self._browsers[slot.browser_index]
+            and slot.browser.is_connected()
+        )
+
+    async def _run(self, fn: Callable[[Page], Awaitable[T]]) -> T:
+        slot = await self._slots.get()
+        try:
+            if not self._slot_alive(slot):
+                await self._recycle_context(slot)
+
+            page = await slot.context.new_page()
+            try:
+                return await fn(page)
+            finally:
+                slot.pages_served += 1
+                try:
+                    await page.close()
+                except PlaywrightError:
+                    pass
+        except PlaywrightTimeoutError:
+            raise
+        except PlaywrightError:
+            # Контекст или браузер упал — слот пересоздадим перед возвратом в пул
+            slot.broken = True
+            raise
+        finally:
+            try:
+                if slot.pages_served >= self.max_pages_per_context or not self._slot_alive(slot):
+                    await self._recycle_context(slot)
+            except Exception as e:
+                logger.error(f"Не удалось пересоздать контекст браузера #{slot.browser_index}: {e}")
+                slot.broken = True
+            self._slots.put_nowait(slot)
+
+
+class _ResponseSizes:
+    """
+    Размеры ответов по URL (content-length), общие для всех рендеров процесса.
+
+    У отменённого запроса ответа нет, поэтому объём заблокированного оценивается
+    по размеру того же URL, загруженного раньше — например, в рендере без
+    лёгкого профиля. Хранятся последние max_entries адресов.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()
+
+    def record(self, url: str, size: int) -> None:
+        self._sizes[url] = size
+        self._sizes.move_to_end(url)
+        if len(self._sizes) > self.max_entries:
+            self._sizes.popitem(last=False)
+
+    def get(self, url: str) -> Optional[int]:
+        return self._sizes.get(url)
+
+
+# Обработчики рендеров выполняются в потоке пула, блокировка не нужна
+response_sizes = _ResponseSizes()
+
+
+@dataclass
+class RenderStats:
+    """Сетевая статистика рендера одной страницы."""
+    lean_profile: bool = False
+    started_at: float = field(default_factory=time.perf_counter)
+    loaded_requests: int = 0
+    loaded_bytes: int = 0
+    blocked_requests: int = 0
+    blocked_by_reason: Dict[str, int] = field(default_factory=dict)
+    blocked_bytes: int = 0        # оценка по ранее загруженным размерам тех же URL
+    blocked_unsized: int = 0      # заблокированные запросы, размер которых неизвестен
+    ready_seconds: Optional[float] = None
+
+    def mark_ready(self) -> None:
+        self.ready_seconds = round(time.perf_counter() - self.started_at, 3)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "lean_profile": self.lean_profile,
+            "ready_seconds": self.ready_seconds,
+            "loaded_requests": self.loaded_requests,
+            "loaded_kb": round(self.loaded_bytes / 1024, 1),
+            "blocked_requests": self.blocked_requests,
+            "blocked_by_reason": dict(self.blocked_by_reason),
+            "blocked_kb": round(self.blocked_bytes / 1024, 1),
+            "blocked_unsized": self.blocked_unsized,
+        }
+
+
+def _host_allowed(host: str, allowed_hosts: List[str]) -> bool:
+    return any(host == allowed or host.endswith("." + allowed) for allowed in allowed_hosts)
+
+
+async def apply_request_profile(page: Page) -> RenderStats:
+    """
+    Включает на странице профиль перехвата запросов и сбор сетевой статистики.
+
+    При BROWSER_LEAN_PROFILE запросы типов из BROWSER_BLOCKED_RESOURCE_TYPES и к
+    хостам вне BROWSER_ALLOWED_HOSTS отменяются — экстракторам они не нужны
+    (адреса картинок читаются из атрибутов, сами файлы не требуются).
+    Без профиля статистика всё равно собирается, чтобы сравнивать режимы, а
+    размеры ответов запоминаются для оценки объёма, сэкономленного блокировкой.
+    """
+    stats = RenderStats(lean_profile=settings.browser_lean_profile)
+
+    def _on_response(response) -> None:
+        stats.loaded_requests += 1
+        length = response.headers.get("content-length")
+        if length and length.isdigit():
+            stats.loaded_bytes += int(length)
+            response_sizes.record(response.url, int(length))
+
+    page.on("response", _on_response)
+
+    if not settings.browser_lean_profile:
+        return stats
+
+    blocked_types = set(settings.browser_blocked_resource_types)
+    allowed_hosts = settings.browser_allowed_hosts
+
+    async def _handle(route: Route) -> None:
+        request = route.request
+        reason = None
+        if request.resource_type in blocked_types:
+            reason = request.resource_type
+        else:
+            host = urlparse(request.url).hostname or ""
+            if host and not _host_allowed(host, allowed_hosts):
+                reason = "third-party"
+
+        if reason is None:
+            await route.continue_()
+            return
+
+        stats.blocked_requests += 1
+        stats.blocked_by_reason[reason] = stats.blocked_by_reason.get(reason, 0) + 1
+        size = response_sizes.get(request.url)
+        if size is None:
+            stats.blocked_unsized += 1
+        else:
+            stats.blocked_bytes += size
+        await route.abort()
+
+    await page.route("**/*", _handle)
+    return stats
+
+
+browser_pool = BrowserPool(
+    browsers=settings.browser_pool_size,
+    contexts_per_browser=settings.browser_pool_contexts,
+    max_pages_per_context=settings.browser_pool_max_pages,
+    headless=settings.browser_headless,
+)
@@ -0,0 +1,130 @@
+"""
+Обход категорий Kaspi.kz: поиск ссылок на товары по страницам листинга.
+
+Генератор discover_category_products постранично загружает листинг категории
+и отдаёт канонические ссылки на товары по мере нахождения, поэтому скрап
+найденных товаров может начинаться, пока обход ещё идёт. Уже встреченные за
+обход товары отсеиваются по множеству числовых id, а сохранённые в БД —
+одним запросом на страницу листинга по её id.
+"""
+import re
+from typing import Collection, Dict, Iterator, Optional, Set
+from urllib.parse import urlencode, urlparse, parse_qs, urlunparse
+
+import requests
+from sqlalchemy import any_, bindparam, cast, select, String
+from sqlalchemy.dialects import postgresql
+
+from src.core.config import settings
+from src.core.dependencies import SessionLocal
+from src.models import Product
+from src.services.http_cache import CacheMissError
+from src.services.kaspi_parser import get_page
+from src.utils import DEFAULT_CITY_ID
+
+from logs.config_logs import setup_logging
+import logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Ссылки на товары встречаются и в разметке, и во встроенном JSON листинга
+PRODUCT_LINK_RE = re.compile(r'/shop/p/([a-z0-9-]+?)-(\d+)/')
+
+
+def is_valid_kaspi_category_url(url: str) -> bool:
+    """Проверяет, что ссылка ведёт на категорию Kaspi.kz (/shop/c/...)."""
+    try:
+        parsed = urlparse(url)
+        return "kaspi.kz" in parsed.netloc.lower() and parsed.path.startswith("/shop/c/")
+    except Exception:
+        return False
+
+
+def known_product_ids(product_ids: Collection[int]) -> Set[int]:
+    """
+    Id из переданных, которые уже сохранены в БД.
+
+    Проверяются только id одной страницы листинга, одним запросом
+    `kaspi_id = ANY(:kaspi_ids)` — таблица товаров целиком не читается.
+    """
+    if not product_ids:
+        return set()
+    kaspi_ids = cast(bindparam("kaspi_ids"), postgresql.ARRAY(String))
+    with SessionLocal() as session:
+        stored = session.execute(
+            select(Product.kaspi_id).where(Product.kaspi_id == any_(kaspi_ids)),
+            {"kaspi_ids": [str(product_id) for product_id in product_ids]},
+        ).scalars()
+        return {int(kaspi_id) for kaspi_id in stored}
+
+
+def discover_category_products(
+    category_url: str,
+    max_pages: Optional[int] = None,
+    seen: Optional[Set[int]] = None,
+    skip_known: bool = False,
+) -> Iterator[str]:
+    """
+    Постранично обходит листинг категории и отдаёт ссылки на новые товары.
+
+    Обход заканчивается, когда страница пуста или повторяет предыдущую, на
+    ошибке загрузки или после `max_pages` страниц.
+
+    Args:
+        category_url: Ссылка на категорию (город берётся из ?c=)
+        max_pages: Максимум страниц листинга; по умолчанию settings.discovery_max_pages
+        seen: Множество id уже встреченных товаров; пополняется по ходу обхода
+        skip_known: Пропускать товары, уже сохранённые в БД
+
+    Yields:
+        Канонические ссылки вида https://kaspi.kz/shop/p/<slug>-<id>/?c=<city>
+    """
+    max_pages = max_pages or settings.discovery_max_pages
+    seen = seen if seen is not None else set()
+    city_id = parse_qs(urlparse(category_url).query).get("c", [DEFAULT_CITY_ID])[0]
+    previous_page_ids: Set[int] = set()
+
+    for page in range(1, max_pages + 1):
+        page_url = _listing_page_url(category_url, page)
+        try:
+            response = get_page(page_url, timeout=10)
+        except (requests.RequestException, CacheMissError) as e:
+            logger.warning(f"Не удалось загрузить страницу {page} категории {category_url}: {e}")
+            return
+        if response.status_code != 200:
+            logger.warning(f"HTTP {response.status_code} на странице {page} категории {category_url}")
+            return
+
+        # id -> slug в порядке появления на странице
+        page_links: Dict[int, str] = {}
+        for match in PRODUCT_LINK_RE.finditer(response.text):
+            page_links.setdefault(int(match.group(2)), match.group(1))
+        page_ids = set(page_links)
+
+        candidates = page_ids - seen
+        if skip_known and candidates:
+            known = known_product_ids(candidates)
+            seen |= known
+            candidates -= known
+
+        new = 0
+        for product_id, slug in page_links.items():
+            if product_id not in candidates:
+                continue
+            seen.add(product_id)
+            new += 1
+            yield f"https://kaspi.kz/shop/p/{slug}-{product_id}/?c={city_id}"
+
+        logger.info(f"Категория {category_url}: страница {page}, товаров {len(page_ids)}, новых {new}")
+        # За последней страницей листинг пустой или повторяет предыдущую страницу
+        if not page_ids or page_ids == previous_page_ids:
+            return
+        previous_page_ids = page_ids
+
+
+def _listing_page_url(category_url: str, page: int) -> str:
+    parsed = urlparse(category_url)
+    query = parse_qs(parsed.query)
+    query["page"] = [str(page)]
+    return urlunparse(parsed._replace(query=urlencode(query, doseq=True)))
@@ -0,0 +1,116 @@
+"""
+Общий набор cookies для API офферов Kaspi.kz.
+
+Без cookies страницы товара API офферов отвечает 403. Раньше каждый вызов
+fetch_offers ради них загружал страницу товара целиком; теперь cookies
+получаются один раз, переиспользуются всеми товарами и городами, обновляются
+по истечении OFFERS_COOKIE_TTL или после 403 и сохраняются в OFFERS_COOKIE_FILE,
+чтобы переживать перезапуск.
+"""
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+
+from src.core.config import settings
+from src.services.http_cache import http_cache, CachedResponse, CACHE_PAGE
+from src.services.http_client import PAGE_HEADERS
+from src.services.rate_limiter import get_rate_limiter, KASPI_PAGES
+
+from logs.config_logs import setup_logging
+import logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# После 403 cookies обновляются не чаще, чем раз в столько секунд:
+# параллельные запросы, получившие 403 одновременно, делят одно обновление
+_MIN_REFRESH_INTERVAL = 30
+
+
+class OffersCookieJar:
+    """Потокобезопасный кэш cookies с TTL и сохранением на диск."""
+
+    def __init__(self, path: str, ttl: int):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._cookies: Optional[Dict[str, str]] = None
+        self._obtained_at = 0.0
+        self._load()
+
+    def get(self, warmup_url: str) -> Dict[str, str]:
+        """
+        Возвращает действующие cookies, при необходимости получая новые.
+
+        Args:
+            warmup_url: Страница, которая загружается, если cookies нет или они истекли
+        """
+        with self._lock:
+            if self._cookies is None or time.time() - self._obtained_at > self.ttl:
+                self._warmup(warmup_url)
+            return dict(self._cookies or {})
+
+    def refresh(self, warmup_url: str) -> Dict[str, str]:
+        """Обновляет cookies после 403 (если их только что не обновил другой запрос)."""
+        with self._lock:
+            if time.time() - self._obtained_at > _MIN_REFRESH_INTERVAL:
+                logger.info("API офферов ответило 403, обновляем cookies")
+                self._warmup(warmup_url)
+            return dict(self._cookies or {})
+
+    def _warmup(self, url: str) -> None:
+        limiter = get_rate_limiter(KASPI_PAGES)
+        limiter.acquire()
+        try:
+            # Отдельная сессия: в общей cookies уже могут быть, и сервер не пришлёт их заново
+            with requests.Session() as session:
+                response = session.get(url, headers=PAGE_HEADERS, timeout=10)
+                cookies = session.cookies.get_dict()
+        except requests.RequestException as e:
+            logger.error(f"Ошибка при получении cookies: {e}")
+            return
+        limiter.record(response.status_code, response.headers.get("Retry-After"))
+        http_cache.store(
+            CACHE_PAGE, "GET", url, None,
+            CachedResponse(response.status_code, response.text, dict(response.headers))
+        )
+
+        if response.status_code != 200:
+            logger.warning(f"HTTP {response.status_code} при получении cookies со страницы {url}")
+            return
+
+        self._cookies = cookies
+        self._obtained_at = time.time()
+        logger.info(f"Получены cookies для API офферов: {len(cookies)} шт.")
+        self._save()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            self._cookies = dict(data["cookies"])
+            self._obtained_at = float(data["obtained_at"])
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Не удалось прочитать cookies из {self.path}: {e}")
+
+    def _save(self) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"obtained_at": self._obtained_at, "cookies": self._cookies}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"Не удалось сохранить cookies в {self.path}: {e}")
+
+
+offers_cookie_jar = OffersCookieJar(
+    path=settings.offers_cookie_file,
+    ttl=settings.offers_cookie_ttl,
+)
@@ -1,20 +1,25 @@
 import json
 import os
-from datetime import datetime
-from typing import Dict, Any
+import tempfile
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import select, delete
+from sqlalchemy import select, delete, insert, update, func, or_, any_, bindparam, cast, column, Integer, String, Float, DateTime
+from sqlalchemy.dialects import postgresql
 
 from src.models import Product, ProductOffer, ProductAttribute, ProductImage, ProductPriceHistory, ProductOfferHistory
+from src.core.config import settings
+from src.core.metrics import db_rows_written
 from src.core.dependencies import SessionLocal
+from src.utils import DEFAULT_CITY_ID, OfferStats, extract_city_id_from_url
 
 from logs.config_logs import setup_logging
 import logging
 
 setup_logging()
 logger = logging.getLogger(__name__)
-logger = logging.getLogger(__name__)
 
 
 def save_scraped_data(scraped_data: Dict[str, Any], product_id: str) -> None:
@@ -23,7 +28,7 @@ def save_scraped_data(scraped_data: Dict[str, Any], product_id: str) -> None:
     
     # Сохраняем данные в JSON файлы
     save_product_data(scraped_data, product_id, current_time, offers_count)
-    save_offers_data(scraped_data, product_id, current_time, offers_count)
+    save_offers_data(scraped_data, product_id, current_time)
     
     # Сохраняем данные в базу данных (синхронно)
     save_to_database(scraped_data, product_id)
@@ -45,22 +50,51 @@ def save_product_data(scraped_data: Dict[str, Any], product_id: str,
         json.dump(product_data, f, ensure_ascii=False, indent=2)
 
 
-def save_offers_data(scraped_data: Dict[str, Any], product_id: str,
-                    fetched_at: str, offers_amount: int) -> None:
-    offers_data = {
-        "fetched_at": fetched_at,
-        "offers_amount": offers_amount,
-        "offers": scraped_data.get("offers", [])
-    }
-    
-    offers_dir = "export/offers"
-    os.makedirs(offers_dir, exist_ok=True)
-    
-    offers_filename = f"offers_{product_id}.json"
-    offers_filepath = os.path.join(offers_dir, offers_filename)
-    
-    with open(offers_filepath, 'w', encoding='utf-8') as f:
-        json.dump(offers_data, f, ensure_ascii=False, indent=2)
+def save_offers_data(scraped_data: Dict[str, Any], product_id: str, fetched_at: str) -> None:
+    with _OffersExport(product_id, fetched_at) as export:
+        export.write(scraped_data.get("offers", []))
+
+
+class _OffersExport:
+    """
+    Потоковая запись export/offers/offers_<id>.json.
+
+    Офферы дописываются по мере поступления страниц, offers_amount пишется
+    в конце файла. Файл собирается во временном файле и заменяет прежний
+    только при успешном выходе из контекста.
+    """
+
+    def __init__(self, product_id: str, fetched_at: str):
+        offers_dir = "export/offers"
+        os.makedirs(offers_dir, exist_ok=True)
+        self.path = os.path.join(offers_dir, f"offers_{product_id}.json")
+        self.count = 0
+        self._discarded = False
+        self._file = tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", dir=offers_dir, suffix=".tmp", delete=False
+        )
+        self._file.write(f'{{\n  "fetched_at": {json.dumps(fetched_at)},\n  "offers": [')
+
+    def write(self, offers: Iterable[Dict[str, Any]]) -> None:
+        for offer in offers:
+            self._file.write(("," if self.count else "") + "\n    " + json.dumps(offer, ensure_ascii=False))
+            self.count += 1
+
+    def discard(self) -> None:
+        """Не заменять прежний файл при выходе из контекста."""
+        self._discarded = True
+
+    def __enter__(self) -> "_OffersExport":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None and not self._discarded:
+            self._file.write(f'\n  ],\n  "offers_amount": {self.count}\n}}\n')
+            self._file.close()
+            os.replace(self._file.name, self.path)
+        else:
+            self._file.close()
+            os.remove(self._file.name)
 
 
 def save_to_database(scraped_data: Dict[str, Any], product_id: str) -> None:
@@ -73,38 +107,7 @@ def save_to_database(scraped_data: Dict[str, Any], product_id: str) -> None:
     """
     try:
         with SessionLocal() as session:
-            # Проверяем, существует ли уже продукт
-            stmt = select(Product).filter_by(kaspi_id=product_id)
-            result = session.execute(stmt)
-            existing_product = result.scalar_one_or_none()
-            
-            if existing_product:
-                # Обновляем существующий продукт
-                product = existing_product
-                _update_product_from_data(product, scraped_data)
-                logger.info(f"Обновляем продукт с kaspi_id: {product_id}")
-                # Принудительно помечаем объект как измененный
-                session.add(product)
-            else:
-                # Создаем новый продукт
-                product = _create_product_from_data(scraped_data, product_id)
-                session.add(product)
-                logger.info(f"Создаем новый продукт с kaspi_id: {product_id}")
-            
-            # Flush чтобы SQLAlchemy понял что объект изменился
-            session.flush()
-            
-            # Коммитим изменения продукта, чтобы получить product.id
-            session.commit()
-            session.refresh(product)
-            
-            # Сохраняем связанные данные
-            _save_product_images(session, product.id, scraped_data.get("images", []))
-            _save_product_attributes(session, product.id, scraped_data.get("attributes", {}))
-            _save_product_offers(session, product.id, scraped_data.get("offers", []))
-            _save_product_price_history(session, product.id, scraped_data)
-            
-            # Финальный коммит
+            _save_products(session, [(scraped_data, product_id)])
             session.commit()
             logger.info(f"Продукт {product_id} успешно сохранен в БД")
             
@@ -114,134 +117,571 @@ def save_to_database(scraped_data: Dict[str, Any], product_id: str) -> None:
         logger.error(f"Ошибка при сохранении продукта {product_id} в БД: {e}")
 
 
-def _create_product_from_data(scraped_data: Dict[str, Any], product_id: str) -> Product:
-    """Создает новый объект Product из данных."""
-    now = datetime.utcnow()
-    return Product(
-        kaspi_id=product_id,
-        url=scraped_data.get("url", ""),
-        name=scraped_data.get("name", ""),
-        category=scraped_data.get("category"),
-        price_min=scraped_data.get("price_min"),
-        price_max=scraped_data.get("price_max"),
-        rating=scraped_data.get("rating"),
-        reviews_count=scraped_data.get("reviews_count", 0),
-        offers_count=scraped_data.get("offers_amount", 0),
-        # Явно устанавливаем created_at и updated_at для новых продуктов
-        created_at=now,
-        updated_at=now
-    )
+def save_scraped_stream(
+    scraped_data: Dict[str, Any],
+    product_id: str,
+    offer_pages: Iterable[List[Dict[str, Any]]],
+) -> Optional[OfferStats]:
+    """
+    Сохраняет продукт, записывая офферы в БД и export/offers по мере загрузки страниц.
 
+    Карточка продукта (поля, изображения, атрибуты) фиксируется первой, затем
+    каждая страница офферов пишется в своей короткой транзакции: пока загружается
+    следующая страница, соединение с БД и блокировки не удерживаются. Все офферы
+    в памяти не держатся, число офферов и диапазон цен считаются на лету. После
+    обхода удаляются пропавшие офферы, а scraped_data дополняется price_min,
+    price_max и offers_amount. Если не получено ни одного оффера, сохранённые
+    офферы и цены не трогаются.
 
-def _update_product_from_data(product: Product, scraped_data: Dict[str, Any]) -> None:
-    """Обновляет существующий продукт данными из scraped_data."""
-    product.name = scraped_data.get("name", product.name)
-    product.category = scraped_data.get("category", product.category)
-    product.price_min = scraped_data.get("price_min")
-    product.price_max = scraped_data.get("price_max")
-    product.rating = scraped_data.get("rating")
-    product.reviews_count = scraped_data.get("reviews_count", product.reviews_count)
-    product.offers_count = scraped_data.get("offers_amount", 0)
-    # Явно обновляем updated_at
-    product.updated_at = datetime.utcnow()
-
-
-def _save_product_images(session, product_id: int, images: list) -> None:
-    """Сохраняет изображения продукта."""
-    # Удаляем старые изображения через DELETE запрос
-    delete_stmt = delete(ProductImage).filter_by(product_id=product_id)
-    session.execute(delete_stmt)
-    
-    # Добавляем новые
-    for image_url in images:
-        if image_url:  # Проверяем, что URL не пустой
-            image = ProductImage(
-                product_id=product_id,
-                image_url=image_url
-            )
-            session.add(image)
-
-
-def _save_product_attributes(session, product_id: int, attributes: dict) -> None:
-    """Сохраняет атрибуты продукта."""
-    # Удаляем старые атрибуты через DELETE запрос
-    delete_stmt = delete(ProductAttribute).filter_by(product_id=product_id)
-    session.execute(delete_stmt)
-    
-    # Добавляем новые атрибуты
-    def _add_attributes_recursive(attrs, prefix=""):
-        for key, value in attrs.items():
-            if isinstance(value, dict):
-                # Если значение - словарь, добавляем атрибуты рекурсивно
-                new_prefix = f"{prefix}{key}." if prefix else f"{key}."
-                _add_attributes_recursive(value, new_prefix)
+    Args:
+        scraped_data: Данные продукта без офферов
+        product_id: ID продукта из Kaspi
+        offer_pages: Страницы офферов (например, kaspi_parser.iter_offer_pages)
+
+    Returns:
+        Статистика записанных офферов; None при ошибке загрузки или записи
+    """
+    current_time = scraped_data.get("fetched_at", datetime.utcnow().isoformat() + "Z")
+    city_id = _offers_city_id(scraped_data)
+    stats = OfferStats()
+
+    try:
+        with SessionLocal() as session:
+            item = [(scraped_data, product_id)]
+            ids = _upsert_products(session, item)
+            _save_product_details(session, ids, item)
+            session.commit()
+
+        # Одна отметка last_seen на все страницы — по ней finish() найдёт пропавшие офферы
+        seen_at = datetime.utcnow()
+        with _OffersExport(product_id, current_time) as export:
+            for page in offer_pages:
+                stats.add(page)
+                export.write(page)
+                with SessionLocal() as session:
+                    _OffersUpsert(session, ids[product_id], city_id, seen_at).add(page)
+                    session.commit()
+
+            if not stats.count:
+                export.discard()
+                logger.warning(f"Офферы продукта {product_id} не получены, сохранённые офферы не тронуты")
             else:
-                # Обычный атрибут
-                full_key = f"{prefix}{key}" if prefix else key
-                attribute = ProductAttribute(
-                    product_id=product_id,
-                    attribute_name=full_key,
-                    attribute_value=str(value) if value is not None else ""
-                )
-                session.add(attribute)
-    
-    _add_attributes_recursive(attributes)
+                scraped_data.update(stats.as_fields())
+                with SessionLocal() as session:
+                    _OffersUpsert(session, ids[product_id], city_id, seen_at).finish()
+                    session.execute(
+                        update(Product)
+                        .where(Product.id == ids[product_id])
+                        .values(price_min=stats.price_min, price_max=stats.price_max, offers_count=stats.count)
+                    )
+                    _save_product_price_history(session, [(ids[product_id], scraped_data)])
+                    session.commit()
+        logger.info(f"Продукт {product_id} успешно сохранен в БД: {stats.count} офферов")
+    except Exception as e:
+        logger.error(f"Ошибка при потоковом сохранении продукта {product_id}: {e}")
+        return None
 
+    save_product_data(scraped_data, product_id, current_time, stats.count)
+    return stats
 
-def _save_product_offers(session, product_id: int, offers: list) -> None:
-    """Сохраняет предложения продукта и историю изменений цен."""
-    # Получаем существующие предложения
-    stmt = select(ProductOffer).filter_by(product_id=product_id)
-    result = session.execute(stmt)
-    existing_offers = {offer.seller_name: offer for offer in result.scalars().all()}
-    
-    # Обрабатываем новые предложения
-    for offer_data in offers:
-        if isinstance(offer_data, dict):
-            seller_name = offer_data.get("merchant_name", "Unknown")
-            new_price = offer_data.get("price")
-            
-            if seller_name in existing_offers:
-                # Предложение существует - проверяем изменение цены
-                existing_offer = existing_offers[seller_name]
-                if existing_offer.price != new_price and new_price is not None:
-                    # Цена изменилась - сохраняем в историю
-                    history = ProductOfferHistory(
-                        offer_id=existing_offer.id,
-                        old_price=existing_offer.price,
-                        new_price=new_price
+
+def save_scraped_batch(items: List[Tuple[Dict[str, Any], str]]) -> Dict[str, Optional[str]]:
+    """
+    Сохраняет группу результатов скрапа: JSON файлы и одна транзакция в БД.
+
+    Группа пишется пакетными запросами в точке сохранения (SAVEPOINT). Если
+    пакетная запись не удалась, продукты пишутся по одному в своих точках
+    сохранения, поэтому ошибка одного продукта не откатывает остальные.
+
+    Args:
+        items: Список пар (scraped_data, product_id)
+
+    Returns:
+        Словарь product_id -> текст ошибки (None, если продукт сохранен)
+    """
+    errors: Dict[str, Optional[str]] = {}
+
+    for scraped_data, product_id in items:
+        current_time = scraped_data.get("fetched_at", datetime.utcnow().isoformat() + "Z")
+        offers_count = scraped_data.get("offers_amount", len(scraped_data.get("offers", [])))
+        save_product_data(scraped_data, product_id, current_time, offers_count)
+        if "offers" in scraped_data:
+            save_offers_data(scraped_data, product_id, current_time)
+
+    try:
+        with SessionLocal() as session:
+            try:
+                with session.begin_nested():
+                    _save_products(session, items)
+                errors = {product_id: None for _, product_id in items}
+            except Exception as e:
+                logger.warning(f"Пакетная запись группы не удалась, сохраняем продукты по одному: {e}")
+                for scraped_data, product_id in items:
+                    try:
+                        with session.begin_nested():
+                            _save_products(session, [(scraped_data, product_id)])
+                        errors[product_id] = None
+                    except Exception as e:
+                        logger.error(f"Ошибка при сохранении продукта {product_id} в БД: {e}")
+                        errors[product_id] = str(e)
+            session.commit()
+            logger.info(f"Группа из {len(items)} продуктов сохранена в БД")
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении группы продуктов в БД: {e}")
+        for _, product_id in items:
+            errors[product_id] = str(e)
+
+    return errors
+
+
+def save_city_offers(product_id: str, offers_by_city: Dict[str, List[Dict[str, Any]]]) -> bool:
+    """
+    Сохраняет офферы уже сохранённого продукта по городам в одной транзакции.
+
+    Args:
+        product_id: ID продукта из Kaspi
+        offers_by_city: Словарь city_id -> список офферов
+
+    Returns:
+        True, если офферы сохранены; False, если продукта нет в БД или произошла ошибка
+    """
+    try:
+        with SessionLocal() as session:
+            product = session.execute(select(Product).filter_by(kaspi_id=product_id)).scalar_one_or_none()
+            if product is None:
+                logger.warning(f"Продукт {product_id} не найден в БД, офферы по городам не сохранены")
+                return False
+
+            for city_id, offers in offers_by_city.items():
+                _save_product_offers(session, product.id, offers, city_id)
+            session.commit()
+            logger.info(f"Офферы продукта {product_id} сохранены для {len(offers_by_city)} городов")
+            return True
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении офферов продукта {product_id} по городам: {e}")
+        return False
+
+
+def is_static_refresh_due(product_id: str) -> bool:
+    """Нужен ли продукту полный скрап (его нет в БД или статичные поля устарели)."""
+    with SessionLocal() as session:
+        stmt = select(Product.static_refreshed_at).filter_by(kaspi_id=product_id)
+        refreshed_at = session.execute(stmt).scalar_one_or_none()
+
+    if refreshed_at is None:
+        return True
+    if refreshed_at.tzinfo is None:
+        refreshed_at = refreshed_at.replace(tzinfo=timezone.utc)
+    age = datetime.now(timezone.utc) - refreshed_at
+    return age > timedelta(hours=settings.static_refresh_interval_hours)
+
+
+def save_offers_refresh(
+    product_id: str,
+    url: str,
+    offer_pages: Iterable[List[Dict[str, Any]]],
+) -> Optional[OfferStats]:
+    """
+    Сохраняет результат обновления только цен: офферы, цены продукта и историю цен.
+
+    Страницы офферов пишутся в БД и export/offers по мере загрузки, каждая в
+    своей короткой транзакции, как в save_scraped_stream: пока загружается
+    следующая страница, соединение с БД и блокировки не удерживаются. Статичные
+    поля (название, категория, атрибуты, изображения) не трогаются. Если не
+    получено ни одного оффера, сохранённые офферы и цены не трогаются.
+
+    Returns:
+        Статистика офферов; None, если продукта нет в БД или произошла ошибка
+    """
+    city_id = _offers_city_id({"url": url})
+    stats = OfferStats()
+    try:
+        with SessionLocal() as session:
+            product_pk = session.execute(select(Product.id).filter_by(kaspi_id=product_id)).scalar_one_or_none()
+        if product_pk is None:
+            logger.warning(f"Продукт {product_id} не найден в БД, цены не сохранены")
+            return None
+
+        # Одна отметка last_seen на все страницы — по ней finish() найдёт пропавшие офферы
+        seen_at = datetime.utcnow()
+        with _OffersExport(product_id, seen_at.isoformat() + "Z") as export:
+            for page in offer_pages:
+                stats.add(page)
+                export.write(page)
+                with SessionLocal() as session:
+                    _OffersUpsert(session, product_pk, city_id, seen_at).add(page)
+                    session.commit()
+
+            if not stats.count:
+                export.discard()
+                logger.warning(f"Офферы продукта {product_id} не получены, цены не обновлены")
+                return stats
+
+            with SessionLocal() as session:
+                _OffersUpsert(session, product_pk, city_id, seen_at).finish()
+                session.execute(
+                    update(Product)
+                    .where(Product.id == product_pk)
+                    .values(
+                        price_min=stats.price_min,
+                        price_max=stats.price_max,
+                        offers_count=stats.count,
+                        updated_at=datetime.utcnow(),
                     )
-                    session.add(history)
-                    # Обновляем цену предложения
-                    existing_offer.price = new_price
-                
-                # Обновляем last_seen (затрагиваем все поля ProductOffer)
-                existing_offer.last_seen = datetime.utcnow()
-                # Удаляем из словаря обработанных
-                del existing_offers[seller_name]
-            else:
-                # Новое предложение
-                offer = ProductOffer(
-                    product_id=product_id,
-                    seller_name=seller_name,
-                    price=new_price
                 )
-                session.add(offer)
-    
-    # Удаляем предложения, которых больше нет в данных
-    for remaining_offer in existing_offers.values():
-        session.delete(remaining_offer)
+                _save_product_price_history(session, [(product_pk, stats.as_fields())])
+                session.commit()
+        logger.info(f"Цены продукта {product_id} обновлены: {stats.count} офферов")
+        return stats
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении цен продукта {product_id}: {e}")
+        return None
 
 
-def _save_product_price_history(session, product_id: int, scraped_data: Dict[str, Any]) -> None:
-    """Сохраняет историю цен продукта."""
-    price_min = scraped_data.get("price_min")
-    price_max = scraped_data.get("price_max")
-    
-    if price_min is not None or price_max is not None:
-        price_history = ProductPriceHistory(
-            product_id=product_id,
-            price_min=price_min,
-            price_max=price_max
+def _save_products(session: Session, items: List[Tuple[Dict[str, Any], str]]) -> Dict[str, int]:
+    """
+    Создаёт или обновляет группу продуктов и их связанные данные в текущей транзакции.
+
+    Продукты пишутся одним INSERT ... ON CONFLICT (kaspi_id) DO UPDATE ... RETURNING,
+    история цен — многострочным INSERT на всю группу. Изображения и атрибуты
+    сравниваются с сохранёнными, и пишутся только отличия.
+
+    Returns:
+        Словарь kaspi_id -> id продукта в БД
+    """
+    # Повтор продукта в одном INSERT ... ON CONFLICT недопустим — берём последний
+    items = list({product_id: (scraped_data, product_id) for scraped_data, product_id in items}.values())
+    ids = _upsert_products(session, items)
+    _save_product_details(session, ids, items)
+    for scraped_data, product_id in items:
+        _save_product_offers(session, ids[product_id], scraped_data.get("offers"), _offers_city_id(scraped_data))
+    _save_product_price_history(session, [(ids[product_id], scraped_data) for scraped_data, product_id in items])
+    return ids
+
+
+def _upsert_products(session: Session, items: List[Tuple[Dict[str, Any], str]]) -> Dict[str, int]:
+    """Создаёт или обновляет строки продуктов одним запросом; возвращает kaspi_id -> id."""
+    if not items:
+        return {}
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            "kaspi_id": product_id,
+            "url": scraped_data.get("url", ""),
+            "name": scraped_data.get("name", ""),
+            "category": scraped_data.get("category"),
+            "price_min": scraped_data.get("price_min"),
+            "price_max": scraped_data.get("price_max"),
+            "rating": scraped_data.get("rating"),
+            "reviews_count": scraped_data.get("reviews_count", 0),
+            # Без загруженных офферов число офферов неизвестно (None)
+            "offers_count": scraped_data.get("offers_amount"),
+            # Полный скрап обновляет и статичные поля
+            "static_refreshed_at": now,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for scraped_data, product_id in items
+    ]
+
+    stmt = postgresql.insert(Product.__table__)
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Product.kaspi_id],
+        set_={
+            # Не извлечённые поля не затирают сохранённые значения
+            "name": excluded.name,
+            "category": func.coalesce(excluded.category, Product.category),
+            "reviews_count": func.coalesce(excluded.reviews_count, Product.reviews_count),
+            "price_min": func.coalesce(excluded.price_min, Product.price_min),
+            "price_max": func.coalesce(excluded.price_max, Product.price_max),
+            # HTTP-путь не запускает фоллбек рейтинга — без рейтинга в HTML сохраняем прежний
+            "rating": func.coalesce(excluded.rating, Product.rating),
+            "offers_count": func.coalesce(excluded.offers_count, Product.offers_count),
+            "static_refreshed_at": excluded.static_refreshed_at,
+            "updated_at": excluded.updated_at,
+        },
+    ).returning(Product.kaspi_id, Product.id)
+
+    # executemany с RETURNING SQLAlchemy склеивает в многострочный INSERT (insertmanyvalues)
+    ids = dict(session.execute(stmt, rows).all())
+    unknown_counts = [ids[row["kaspi_id"]] for row in rows if row["offers_count"] is None]
+    if unknown_counts:
+        # Новым продуктам без загруженных офферов — 0 вместо NULL
+        session.execute(
+            update(Product)
+            .where(Product.id.in_(unknown_counts), Product.offers_count.is_(None))
+            .values(offers_count=0)
+            .execution_options(synchronize_session=False)
+        )
+    logger.info(f"Записано продуктов: {len(ids)}")
+    return ids
+
+
+@dataclass
+class _RowChanges:
+    """Число вставленных, изменённых и удалённых строк одной таблицы."""
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+
+    def __str__(self) -> str:
+        return f"+{self.inserted} ~{self.updated} -{self.deleted}"
+
+
+def _record_changes(table: str, changes: _RowChanges) -> None:
+    for operation in ("inserted", "updated", "deleted"):
+        count = getattr(changes, operation)
+        if count:
+            db_rows_written.inc(table, operation, amount=count)
+
+
+def _save_product_details(
+    session: Session,
+    ids: Dict[str, int],
+    items: List[Tuple[Dict[str, Any], str]],
+) -> Tuple[_RowChanges, _RowChanges]:
+    """Сохраняет изображения и атрибуты группы продуктов; возвращает изменения по таблицам."""
+    images = _save_product_images(session, {ids[product_id]: data.get("images", []) for data, product_id in items})
+    attributes = _save_product_attributes(
+        session, {ids[product_id]: data.get("attributes", {}) for data, product_id in items}
+    )
+    logger.info(f"Изображения: {images}, атрибуты: {attributes} (продуктов: {len(items)})")
+    return images, attributes
+
+
+def _save_product_images(session: Session, images_by_product: Dict[int, List[str]]) -> _RowChanges:
+    """
+    Приводит изображения продуктов к новым спискам.
+
+    Сохранённые изображения сравниваются с новыми: удаляются только пропавшие
+    (и повторы), вставляются только новые. Неизменный список не даёт записей.
+    """
+    changes = _RowChanges()
+    if not images_by_product:
+        return changes
+
+    # Пустые URL не сохраняем, повторы схлопываем с сохранением порядка
+    wanted = {
+        product_id: dict.fromkeys(image_url for image_url in images if image_url)
+        for product_id, images in images_by_product.items()
+    }
+    stored = session.execute(
+        select(ProductImage.id, ProductImage.product_id, ProductImage.image_url)
+        .where(ProductImage.product_id.in_(wanted))
+    )
+    kept = set()
+    stale_ids = []
+    for row_id, product_id, image_url in stored:
+        if image_url in wanted[product_id] and (product_id, image_url) not in kept:
+            kept.add((product_id, image_url))
+        else:
+            stale_ids.append(row_id)
+
+    rows = [
+        {"product_id": product_id, "image_url": image_url}
+        for product_id, images in wanted.items()
+        for image_url in images
+        if (product_id, image_url) not in kept
+    ]
+    if stale_ids:
+        session.execute(delete(ProductImage).where(ProductImage.id.in_(stale_ids)))
+    if rows:
+        session.execute(insert(ProductImage), rows)
+
+    changes.inserted, changes.deleted = len(rows), len(stale_ids)
+    _record_changes("product_images", changes)
+    return changes
+
+
+def _save_product_attributes(session: Session, attributes_by_product: Dict[int, dict]) -> _RowChanges:
+    """
+    Приводит атрибуты продуктов к новым значениям.
+
+    Сохранённые атрибуты сравниваются с новыми по имени: вставляются новые,
+    обновляются изменившиеся значения, удаляются пропавшие (и повторы имён).
+    """
+    changes = _RowChanges()
+    if not attributes_by_product:
+        return changes
+
+    wanted = {
+        product_id: dict(_flatten_attributes(attributes))
+        for product_id, attributes in attributes_by_product.items()
+    }
+    stored = session.execute(
+        select(
+            ProductAttribute.id,
+            ProductAttribute.product_id,
+            ProductAttribute.attribute_name,
+            ProductAttribute.attribute_value,
+        ).where(ProductAttribute.product_id.in_(wanted))
+    )
+    kept = set()
+    stale_ids = []
+    updates = []
+    for row_id, product_id, name, value in stored:
+        attributes = wanted[product_id]
+        if name not in attributes or (product_id, name) in kept:
+            stale_ids.append(row_id)
+            continue
+        kept.add((product_id, name))
+        if attributes[name] != value:
+            updates.append({"id": row_id, "attribute_value": attributes[name]})
+
+    rows = [
+        {"product_id": product_id, "attribute_name": name, "attribute_value": value}
+        for product_id, attributes in wanted.items()
+        for name, value in attributes.items()
+        if (product_id, name) not in kept
+    ]
+    if stale_ids:
+        session.execute(delete(ProductAttribute).where(ProductAttribute.id.in_(stale_ids)))
+    if updates:
+        # ORM bulk UPDATE по первичному ключу — один executemany
+        session.execute(update(ProductAttribute), updates)
+    if rows:
+        session.execute(insert(ProductAttribute), rows)
+
+    changes.inserted, changes.updated, changes.deleted = len(rows), len(updates), len(stale_ids)
+    _record_changes("product_attributes", changes)
+    return changes
+
+
+def _flatten_attributes(attrs: dict, prefix: str = "") -> Iterator[Tuple[str, str]]:
+    """Разворачивает вложенные атрибуты в пары ("группа.ключ", значение)."""
+    for key, value in attrs.items():
+        if isinstance(value, dict):
+            # Если значение - словарь, добавляем атрибуты рекурсивно
+            yield from _flatten_attributes(value, f"{prefix}{key}.")
+        else:
+            # Обычный атрибут
+            yield f"{prefix}{key}", str(value) if value is not None else ""
+
+
+def _offers_city_id(scraped_data: Dict[str, Any]) -> str:
+    """Город, для которого собраны офферы (из ?c= ссылки товара)."""
+    return extract_city_id_from_url(scraped_data.get("url"))
+
+
+def _build_pg_reconcile_offers():
+    """
+    Сверка страницы предложений для PostgreSQL одним запросом.
+
+    Страница передаётся массивами seller_names/prices и разворачивается через
+    unnest, поэтому текст запроса не зависит от числа предложений и кэшируется.
+    Все CTE видят один снимок, и old_offers содержит цены до upsert.
+    """
+    offers_table = ProductOffer.__table__
+    seller_names = cast(bindparam("seller_names"), postgresql.ARRAY(String))
+    prices = cast(bindparam("prices"), postgresql.ARRAY(Float))
+    incoming = func.unnest(seller_names, prices).table_valued(
+        column("seller_name", String), column("price", Float)
+    ).render_derived(name="incoming")
+
+    old = select(offers_table.c.id, offers_table.c.price).where(
+        offers_table.c.product_id == bindparam("offer_product_id", type_=Integer),
+        offers_table.c.city_id == bindparam("offer_city_id", type_=String),
+        offers_table.c.seller_name == any_(seller_names),
+    ).cte("old_offers")
+
+    upsert = postgresql.insert(offers_table).from_select(
+        ["product_id", "city_id", "seller_name", "price", "last_seen"],
+        select(
+            bindparam("offer_product_id", type_=Integer),
+            bindparam("offer_city_id", type_=String),
+            incoming.c.seller_name,
+            incoming.c.price,
+            bindparam("seen_at", type_=DateTime(timezone=True)),
+        ),
+    )
+    upserted = upsert.on_conflict_do_update(
+        index_elements=[offers_table.c.product_id, offers_table.c.city_id, offers_table.c.seller_name],
+        # Без цены в данных сохраняем прежнюю
+        set_={"price": func.coalesce(upsert.excluded.price, offers_table.c.price), "last_seen": upsert.excluded.last_seen},
+    ).returning(offers_table.c.id, offers_table.c.price).cte("upserted_offers")
+
+    return insert(ProductOfferHistory.__table__).from_select(
+        ["offer_id", "old_price", "new_price"],
+        select(upserted.c.id, old.c.price, upserted.c.price)
+        .join(old, old.c.id == upserted.c.id)
+        .where(old.c.price.is_distinct_from(upserted.c.price)),
+    ).add_cte(old, upserted)
+
+
+_PG_RECONCILE_OFFERS = _build_pg_reconcile_offers()
+_OFFERS_CHUNK_SIZE = 1000
+
+
+def _save_product_offers(session, product_id: int, offers: Optional[list], city_id: str = DEFAULT_CITY_ID) -> None:
+    """
+    Сохраняет предложения продукта в городе и историю изменений цен.
+
+    offers=None — предложения не загружались (скрап без офферов или ошибка
+    загрузки): сохранённые предложения не трогаются.
+    """
+    if offers is None:
+        return
+    upsert = _OffersUpsert(session, product_id, city_id)
+    # Частями, чтобы не упереться в лимит параметров одного запроса
+    for start in range(0, len(offers), _OFFERS_CHUNK_SIZE):
+        upsert.add(offers[start:start + _OFFERS_CHUNK_SIZE])
+    upsert.finish()
+
+
+class _OffersUpsert:
+    """
+    Постраничная сверка предложений продукта в одном городе.
+
+    Каждая страница записывается одним INSERT ... ON CONFLICT по уникальному
+    ключу (product_id, city_id, seller_name), который возвращает новые цены;
+    по ним и по снимку прежних цен тем же запросом пишется история изменений.
+    Все встреченные предложения получают одну отметку last_seen, и после
+    последней страницы предложения без неё удаляются одним запросом.
+    """
+
+    def __init__(self, session: Session, product_id: int, city_id: str, seen_at: Optional[datetime] = None):
+        self.session = session
+        self.product_id = product_id
+        self.city_id = city_id
+        # Общий seen_at позволяет писать страницы в разных транзакциях
+        self.seen_at = seen_at or datetime.utcnow()
+
+    def add(self, offers: Iterable[Dict[str, Any]]) -> None:
+        # Продавец -> цена; повтор продавца на странице перезаписывает цену
+        page: Dict[str, Any] = {}
+        for offer_data in offers:
+            if isinstance(offer_data, dict):
+                page[offer_data.get("merchant_name", "Unknown")] = offer_data.get("price")
+        if not page:
+            return
+
+        self.session.execute(_PG_RECONCILE_OFFERS, {
+            "offer_product_id": self.product_id,
+            "offer_city_id": self.city_id,
+            "seller_names": list(page),
+            "prices": list(page.values()),
+            "seen_at": self.seen_at,
+        })
+
+    def finish(self) -> None:
+        """Удаляет предложения, которых больше нет в данных."""
+        stmt = (
+            delete(ProductOffer)
+            .filter_by(product_id=self.product_id, city_id=self.city_id)
+            .where(or_(ProductOffer.last_seen.is_(None), ProductOffer.last_seen != self.seen_at))
+            .execution_options(synchronize_session=False)
         )
-        session.add(price_history)
\ No newline at end of file
+        self.session.execute(stmt)
+
+
+def _save_product_price_history(session: Session, items: List[Tuple[int, Dict[str, Any]]]) -> None:
+    """Сохраняет историю цен продуктов одним INSERT; items — пары (id продукта, данные)."""
+    rows = [
+        {"product_id": product_id, "price_min": data.get("price_min"), "price_max": data.get("price_max")}
+        for product_id, data in items
+        if data.get("price_min") is not None or data.get("price_max") is not None
+    ]
+    if rows:
+        session.execute(insert(ProductPriceHistory), rows)
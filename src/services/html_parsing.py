@@ -0,0 +1,59 @@
+"""
+Бэкенды разбора HTML страницы товара.
+
+- "html.parser" — полный документ встроенным парсером Python (прежнее поведение);
+- "lxml" — полный документ парсером lxml;
+- "lxml-targeted" — lxml, но в дерево попадают только поддеревья, которые читают
+  экстракторы: заголовок, галерея, характеристики, рейтинг и хлебные крошки.
+"""
+from typing import Dict, Optional
+
+from bs4 import BeautifulSoup
+from bs4.filter import ElementFilter
+
+from src.core.config import settings
+
+# Теги, которые читают экстракторы независимо от классов
+_TARGET_TAGS = frozenset({"h1", "img", "dl"})
+
+# Фрагменты классов блоков, из которых извлекаются данные
+_TARGET_CLASS_PARTS = ("specifications", "item__rating", "breadcrumb")
+
+
+class _ProductSubtreeFilter(ElementFilter):
+    """Пропускает в дерево только нужные поддеревья (всё внутри них сохраняется)."""
+
+    def allow_tag_creation(self, nsprefix: Optional[str], name: str, attrs: Optional[Dict[str, str]]) -> bool:
+        if name in _TARGET_TAGS:
+            return True
+        classes = (attrs or {}).get("class")
+        if not classes:
+            return False
+        if not isinstance(classes, str):
+            classes = " ".join(classes)
+        return any(part in classes for part in _TARGET_CLASS_PARTS)
+
+    def allow_string_creation(self, string: str) -> bool:
+        # Текст вне целевых поддеревьев не нужен (внутри них фильтр не вызывается)
+        return False
+
+
+HTML_BACKENDS = ("html.parser", "lxml", "lxml-targeted")
+
+
+def parse_product_html(html: str, backend: Optional[str] = None) -> BeautifulSoup:
+    """
+    Разбирает HTML страницы товара выбранным бэкендом.
+
+    Args:
+        html: HTML страницы
+        backend: Один из HTML_BACKENDS; по умолчанию settings.html_parser_backend
+    """
+    backend = backend or settings.html_parser_backend
+    if backend == "html.parser":
+        return BeautifulSoup(html, "html.parser")
+    if backend == "lxml":
+        return BeautifulSoup(html, "lxml")
+    if backend == "lxml-targeted":
+        return BeautifulSoup(html, "lxml", parse_only=_ProductSubtreeFilter())
+    raise ValueError(f"Unknown HTML parser backend: {backend}")
@@ -0,0 +1,147 @@
+"""
+Дисковый кэш ответов Kaspi.kz.
+
+Ключ — метод, URL и тело запроса; записи хранятся сжатыми (gzip JSON) в
+HTTP_CACHE_DIR, у каждого класса эндпоинтов свой TTL. Режимы HTTP_CACHE_MODE:
+
+- "off"    — кэш не используется;
+- "cache"  — свежая запись отдаётся из кэша, иначе запрос в сеть и запись;
+- "record" — всегда сеть, каждый успешный ответ записывается;
+- "replay" — только кэш (без учёта TTL), промах — CacheMissError.
+  В этом режиме весь пайплайн parse_kaspi_product_with_bs работает офлайн.
+"""
+import gzip
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from src.core.config import settings
+
+from logs.config_logs import setup_logging
+import logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Классы эндпоинтов (у каждого свой TTL)
+CACHE_PAGE = "page"        # серверный HTML страницы товара
+CACHE_RENDER = "render"    # HTML после рендера в браузере
+CACHE_OFFERS = "offers"    # страницы API офферов
+
+CACHE_MODES = ("off", "cache", "record", "replay")
+
+
+class CacheMissError(LookupError):
+    """В режиме replay нужного ответа нет в кэше."""
+
+
+@dataclass
+class CachedResponse:
+    """Минимальный ответ, общий для requests, httpx и рендера браузером."""
+    status_code: int
+    text: str
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+
+class HttpCache:
+    """Кэш ответов на диске с TTL по классам эндпоинтов."""
+
+    def __init__(self, directory: str, mode: str, ttls: Dict[str, int]):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown HTTP cache mode: {mode}")
+        self.directory = directory
+        self.mode = mode
+        self.ttls = ttls
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def lookup(self, endpoint: str, method: str, url: str, body: Optional[str] = None) -> Optional[CachedResponse]:
+        """
+        Ищет ответ в кэше.
+
+        Returns:
+            Ответ из кэша или None, если нужно идти в сеть
+
+        Raises:
+            CacheMissError: в режиме replay, если записи нет
+        """
+        if self.mode in ("off", "record"):
+            return None
+
+        entry = self._read(self._path(method, url, body))
+        if entry is None:
+            if self.replaying:
+                raise CacheMissError(f"{method} {url} отсутствует в кэше ({endpoint})")
+            return None
+
+        if not self.replaying:
+            ttl = self.ttls.get(endpoint, 0)
+            if time.time() - entry["stored_at"] > ttl:
+                return None
+
+        return CachedResponse(
+            status_code=entry["status_code"],
+            text=entry["text"],
+            headers=entry.get("headers", {}),
+        )
+
+    def store(
+        self,
+        endpoint: str,
+        method: str,
+        url: str,
+        body: Optional[str],
+        response: CachedResponse,
+    ) -> None:
+        """Сохраняет успешный ответ (в режимах cache и record)."""
+        if self.mode not in ("cache", "record") or response.status_code != 200:
+            return
+
+        path = self._path(method, url, body)
+        entry = {
+            "endpoint": endpoint,
+            "method": method,
+            "url": url,
+            "body": body,
+            "status_code": response.status_code,
+            "headers": {k: v for k, v in response.headers.items() if k.lower() == "content-type"},
+            "text": response.text,
+            "stored_at": time.time(),
+        }
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Не удалось записать ответ {method} {url} в кэш: {e}")
+
+    def _path(self, method: str, url: str, body: Optional[str]) -> str:
+        key = hashlib.sha256(f"{method}\n{url}\n{body or ''}".encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, key[:2], f"{key}.json.gz")
+
+    def _read(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Повреждённая запись кэша {path}: {e}")
+            return None
+
+
+http_cache = HttpCache(
+    directory=settings.http_cache_dir,
+    mode=settings.http_cache_mode,
+    ttls=settings.http_cache_ttl,
+)
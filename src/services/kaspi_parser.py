@@ -3,7 +3,8 @@ from src.utils import (
     parse_price,
     extract_product_id_from_url,
     extract_city_id_from_url,
-    PRICE_RE
+    stage_timer,
+    OfferStats,
     )
 from logs.config_logs import setup_logging
 import logging
@@ -11,17 +12,49 @@ import logging
 setup_logging()
 logger = logging.getLogger(__name__)
 
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 from bs4 import BeautifulSoup
-from typing import Dict, Any, List, Optional
+from typing import AsyncIterator, Deque, Dict, Any, Iterator, List, Optional, Tuple
+from collections import deque
+from contextlib import asynccontextmanager
 
+import asyncio
+import httpx
+import json
 import requests
 import time
 import re
 
-
-
-def parse_kaspi_product_with_bs(url: str, headless: bool = True, wait_seconds: int = 5) -> Dict[str, Any]:
+from src.core.config import settings
+from src.core.metrics import scrape_fallbacks, scrape_retries
+from src.services.browser_pool import browser_pool, apply_request_profile
+from src.services.http_client import get_http_session, USER_AGENT
+from src.services.cookie_jar import offers_cookie_jar
+from src.services.html_parsing import parse_product_html
+from src.services.http_cache import (
+    http_cache,
+    CachedResponse,
+    CacheMissError,
+    CACHE_PAGE,
+    CACHE_RENDER,
+    CACHE_OFFERS,
+)
+from src.services.rate_limiter import (
+    get_rate_limiter,
+    AdaptiveRateLimiter,
+    KASPI_PAGES,
+    KASPI_OFFERS,
+    THROTTLE_STATUSES,
+)
+
+
+
+def parse_kaspi_product_with_bs(
+    url: str,
+    wait_seconds: int = 5,
+    timings: Optional[Dict[str, float]] = None,
+    with_offers: bool = True,
+) -> Dict[str, Any]:
     
     result: Dict[str, Any] = {
         "url": url,
@@ -36,54 +69,262 @@ def parse_kaspi_product_with_bs(url: str, headless: bool = True, wait_seconds: i
         "fetched_at": None,
     }
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=headless)
-        page = browser.new_page()
-        # можно установить UA если нужно:
-        page.set_extra_http_headers({"Accept-Language": "ru-RU,ru;q=0.9"})
+    fields: Optional[Dict[str, Any]] = None
+    source = "browser"
+
+    # Быстрый путь: серверный HTML и встроенный JSON без браузера
+    if settings.extraction_mode == "http_first":
+        with stage_timer(timings, "http_fetch"):
+            html = fetch_product_page_html(url)
+        if html:
+            with stage_timer(timings, "extract"):
+                fields = _extract_from_html(html)
+            missing = [name for name in settings.http_required_fields if not fields.get(name)]
+            if missing:
+                logger.info(f"HTTP-извлечение неполное (нет полей: {missing}), переходим к браузеру")
+                scrape_fallbacks.inc("http_to_browser")
+                fields = None
+            else:
+                source = "http"
+
+    if fields is None:
+        with stage_timer(timings, "render"):
+            html, result["render_stats"] = _render_product_page(url, wait_seconds)
+        with stage_timer(timings, "extract"):
+            fields = _extract_from_html(html)
+
+    result["fetched_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    result.update(fields)
+    result["source"] = source
+    logger.info(f"Карточка товара извлечена через {source}: {url}")
+
+    # Повторные загрузки страницы — только если в отрисованном HTML чего-то не хватило
+    if source == "browser" and result["rating"] is None and result["reviews_count"] is None:
+        logger.info("Рейтинг не найден в основном рендере, пробуем отдельную загрузку")
+        scrape_fallbacks.inc("rating")
+        with stage_timer(timings, "rating_fallback"):
+            rating_data = parse_kaspi_rating_playwright(url)
+        result["rating"] = rating_data.get("rating")
+        result["reviews_count"] = rating_data.get("reviews_count")
+
+    if source == "browser" and not result["category"]:
+        logger.info("Хлебные крошки не найдены в основном рендере, пробуем HTTP-запрос")
+        scrape_fallbacks.inc("category")
+        with stage_timer(timings, "category_fallback"):
+            result["category"] = get_category_path(url=url)
+
+    # Без офферов карточку сохраняют потоково (scrape_service.run_scrape_job)
+    if not with_offers:
+        return result
+
+    with stage_timer(timings, "offers"):
+        offers_data = fetch_offers(url=url)
+    
+    if offers_data:
+        stats = OfferStats()
+        stats.add(offers_data)
+        result.update(stats.as_fields())
+        result["offers"] = offers_data
+    
+    return result
+
+
+def fetch_product_page_html(url: str, timeout: int = 10) -> Optional[str]:
+    """
+    Загружает серверный HTML страницы товара через общий HTTP-клиент.
+
+    Returns:
+        HTML страницы или None при ошибке / не-200 ответе
+    """
+    try:
+        response = get_page(url, timeout)
+    except CacheMissError as e:
+        logger.info(f"Страницы нет в кэше: {e}")
+        return None
+    except requests.RequestException as e:
+        logger.info(f"Ошибка HTTP-загрузки страницы {url}: {type(e).__name__}: {e}")
+        return None
+
+    if response.status_code != 200:
+        logger.info(f"HTTP {response.status_code} при загрузке страницы {url}")
+        return None
+    return response.text
+
+
+def get_page(url: str, timeout: int) -> CachedResponse:
+    """GET страницы через дисковый кэш, общий лимитер и общий HTTP-клиент."""
+    cached = http_cache.lookup(CACHE_PAGE, "GET", url)
+    if cached is not None:
+        return cached
+
+    limiter = get_rate_limiter(KASPI_PAGES)
+    limiter.acquire()
+    response = get_http_session().get(url, timeout=timeout)
+    limiter.record(response.status_code, response.headers.get("Retry-After"))
+
+    result = CachedResponse(response.status_code, response.text, dict(response.headers))
+    http_cache.store(CACHE_PAGE, "GET", url, None, result)
+    return result
+
 
+def _render_product_page(url: str, wait_seconds: int) -> Tuple[str, Dict[str, Any]]:
+    """
+    Рендерит страницу товара в браузере из пула.
+
+    Returns:
+        Пара (итоговый HTML, сетевая статистика рендера)
+    """
+
+    # Страница берётся из общего пула браузеров (headless задаётся настройками пула)
+    async def _render(page) -> Tuple[str, Dict[str, Any]]:
+        stats = await apply_request_profile(page)
+        with stage_timer(None, "browser_goto"):
+            await page.goto(url, wait_until="domcontentloaded", timeout=30000)
+        with stage_timer(None, "browser_ready_wait"):
+            await _wait_until_ready(page)
+
+        stats.mark_ready()
+        return await page.content(), stats.as_dict()
+
+    async def _wait_until_ready(page) -> None:
         try:
-            page.goto(url, wait_until="domcontentloaded", timeout=30000)
+            await page.wait_for_selector("h1", timeout=10000)
+        except PlaywrightTimeoutError:
+            # fallback: подождём небольшую паузу, чтобы JS успел отрисоваться
+            await page.wait_for_timeout(2000)
+
+        if settings.browser_lean_profile:
+            # Готовность — появление блоков, которые читают экстракторы, в пределах общего бюджета
+            deadline = time.monotonic() + wait_seconds
+            for selector in settings.browser_ready_selectors:
+                remaining_ms = int((deadline - time.monotonic()) * 1000)
+                if remaining_ms <= 0:
+                    break
+                try:
+                    await page.wait_for_selector(selector, state="attached", timeout=remaining_ms)
+                except PlaywrightTimeoutError:
+                    logger.info(f"Селектор {selector} не появился за отведённое время")
+        else:
+            # Рейтинг дорисовывается JS — ждём его в том же рендере, а не отдельной загрузкой
             try:
-                page.wait_for_selector("h1", timeout=10000)
+                await page.wait_for_selector(".item__rating", timeout=wait_seconds * 1000)
             except PlaywrightTimeoutError:
-                # fallback: подождём небольшую паузу, чтобы JS успел отрисоваться
-                page.wait_for_timeout(2000)
+                pass
 
             # Дополнительное ожидание networkidle для более сложных страниц
             try:
-                page.wait_for_load_state("networkidle", timeout=8000)
+                await page.wait_for_load_state("networkidle", timeout=8000)
             except PlaywrightTimeoutError:
                 # если networkidle не наступил — продолжаем: у нас уже есть HTML
                 pass
 
-            html = page.content()
-            result["fetched_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
-        finally:
-            browser.close()
+    cached = http_cache.lookup(CACHE_RENDER, "RENDER", url)
+    if cached is not None:
+        logger.info(f"Рендер {url} взят из кэша")
+        return cached.text, {"cached": True}
+
+    get_rate_limiter(KASPI_PAGES).acquire()
+    html, render_stats = browser_pool.run(_render)
+    http_cache.store(CACHE_RENDER, "RENDER", url, None, CachedResponse(200, html))
+    logger.info(
+        f"Рендер {url}: готов за {render_stats['ready_seconds']} с, "
+        f"загружено {render_stats['loaded_kb']} КБ в {render_stats['loaded_requests']} ответах, "
+        f"заблокировано запросов: {render_stats['blocked_requests']} {render_stats['blocked_by_reason']} "
+        f"(~{render_stats['blocked_kb']} КБ, без известного размера: {render_stats['blocked_unsized']})"
+    )
+    return html, render_stats
 
-    # Парсим с помощью BeautifulSoup
-    soup = BeautifulSoup(html, "html.parser")
 
-    # NAME: обычно в h1
-    h1 = soup.find("h1")
-    if h1:
-        result["name"] = h1.get_text(strip=True)
+def _extract_from_html(html: str) -> Dict[str, Any]:
+    """Извлекает поля карточки из HTML, дополняя пропуски встроенным JSON состоянием."""
+    soup = parse_product_html(html)
+    fields = _extract_product_fields(soup)
 
+    state = _extract_embedded_state(html)
+    if state:
+        for name, value in _fields_from_embedded_state(state).items():
+            if not fields.get(name) and value:
+                fields[name] = value
+    return fields
 
-    # PRICE: ищем элементы, содержащие символ валюты (₸) или классы с price
-    price_candidates = []
-    for sel in ["span[itemprop='price']", ".price", ".item__price", ".product-price", ".product__price", ".price__main"]:
-        for t in soup.select(sel):
-            txt = t.get_text(" ", strip=True)
-            if "₸" in txt or re.search(PRICE_RE, txt):
-                price_candidates.append(txt)
-    # fallback: любой текст страницы с ₸
-    if not price_candidates:
-        text_all = soup.get_text(" ")
-        for m in re.finditer(r"[\d\s]{2,}\s*₸", text_all):
-            price_candidates.append(m.group(0))
 
+# Скрипты, в которых Kaspi отдаёт состояние карточки товара
+_EMBEDDED_STATE_RE = re.compile(r"(?:BACKEND\.components\.item|digitalData\.product)\s*=\s*")
+
+
+def _extract_embedded_state(html: str) -> Dict[str, Any]:
+    """Находит и объединяет JSON объекты состояния, встроенные в <script> страницы."""
+    decoder = json.JSONDecoder()
+    state: Dict[str, Any] = {}
+    for match in _EMBEDDED_STATE_RE.finditer(html):
+        try:
+            value, _ = decoder.raw_decode(html, match.end())
+        except ValueError:
+            continue
+        if isinstance(value, dict):
+            for key, item in value.items():
+                state.setdefault(key, item)
+    return state
+
+
+def _fields_from_embedded_state(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Переводит встроенное состояние страницы в поля карточки товара."""
+    card = state.get("card") if isinstance(state.get("card"), dict) else {}
+    fields: Dict[str, Any] = {}
+
+    fields["name"] = card.get("title") or state.get("title") or state.get("name")
+
+    images = []
+    for image in state.get("galleryImages") or card.get("galleryImages") or []:
+        if isinstance(image, dict):
+            src = image.get("large") or image.get("medium") or image.get("small")
+        else:
+            src = image
+        if isinstance(src, str) and src.startswith("http"):
+            images.append(src.split("?")[0])
+    fields["images"] = list(dict.fromkeys(images))
+
+    rating = state.get("rating", card.get("rating"))
+    if isinstance(rating, (int, float)):
+        fields["rating"] = float(rating)
+
+    reviews = state.get("reviewsQuantity", card.get("reviewsQuantity"))
+    if isinstance(reviews, int):
+        fields["reviews_count"] = reviews
+
+    category = state.get("category") or card.get("category")
+    if isinstance(category, list):
+        names = [c.get("title") if isinstance(c, dict) else c for c in category]
+        category = " > ".join(n for n in names if isinstance(n, str) and n)
+    if isinstance(category, str) and category:
+        fields["category"] = category
+
+    return fields
+
+
+def _extract_product_fields(soup: BeautifulSoup) -> Dict[str, Any]:
+    """
+    Извлекает все поля карточки товара из одного разобранного документа.
+
+    Args:
+        soup: Разобранный HTML страницы товара
+
+    Returns:
+        Словарь с name, images, attributes, rating, reviews_count и category
+    """
+    fields: Dict[str, Any] = {
+        "name": None,
+        "images": [],
+        "attributes": {},
+        "rating": None,
+        "reviews_count": None,
+        "category": None,
+    }
+
+    # NAME: обычно в h1
+    h1 = soup.find("h1")
+    if h1:
+        fields["name"] = h1.get_text(strip=True)
 
     # IMAGES: ищем теги <img> внутри галереи, фильтруем по http
     imgs = set()
@@ -91,7 +332,7 @@ def parse_kaspi_product_with_bs(url: str, headless: bool = True, wait_seconds: i
         src = img.get("src") or img.get("data-src") or img.get("data-lazy")
         if src and src.startswith("http"):
             imgs.add(src.split("?")[0])
-    result["images"] = list(imgs)
+    fields["images"] = list(imgs)
 
     attributes = {}
 
@@ -145,49 +386,159 @@ def parse_kaspi_product_with_bs(url: str, headless: bool = True, wait_seconds: i
                 continue
             attributes.setdefault("Другие", {})[k] = v
 
-    result["attributes"] = attributes
-
-    rating_data = parse_kaspi_rating_playwright(url)
+    cleaned_attributes = remove_general_if_duplicate(attributes)
+    fields["attributes"] = cleaned_attributes if cleaned_attributes else attributes
 
+    # RATING / REVIEWS: из того же документа
+    rating_data = _extract_rating(soup)
     if rating_data:
-        result["rating"] = rating_data.get("rating")
-        result["reviews_count"] = rating_data.get("reviews_count")
-        
-    offers_data = fetch_offers(url=url)
-    
-    if offers_data:
-        result["price_min"] = min(offer["price"] for offer in offers_data if offer["price"] is not None)
-        result["price_max"] = max(offer["price"] for offer in offers_data if offer["price"] is not None)
-        result["offers_amount"] = len(offers_data)
-        result["offers"] = offers_data
-        
-    category_path = get_category_path(url=url)
-    
-    if category_path:
-        result["category"] = category_path
-    
-    attributes = remove_general_if_duplicate(attributes)
-    
-    if attributes:
-        result["attributes"] = attributes
-        
-    
-    return result
+        fields["rating"] = rating_data.get("rating")
+        fields["reviews_count"] = rating_data.get("reviews_count")
+
+    # CATEGORY: хлебные крошки
+    fields["category"] = _extract_category(soup)
+
+    return fields
         
         
 def fetch_offers(url: str, max_retries: int = 3) -> List[Dict[str, Any]]:
-    product_id = extract_product_id_from_url(url)
+    """Синхронная обёртка над fetch_offers_async для кода без event loop."""
+    return asyncio.run(fetch_offers_async(url, max_retries=max_retries))
+
+
+def iter_offer_pages(url: str, max_retries: int = 3) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Синхронный генератор страниц офферов для кода без event loop.
+
+    Страницы загружаются по мере потребления в собственном event loop,
+    поэтому в памяти одновременно находится не больше окна загрузки.
+    """
+    loop = asyncio.new_event_loop()
+    pages = iter_offer_pages_async(url, max_retries=max_retries)
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(pages.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        loop.run_until_complete(pages.aclose())
+        loop.close()
+
+
+async def fetch_offers_async(
+    url: str,
+    max_retries: int = 3,
+    concurrency: Optional[int] = None,
+    limit: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Собирает все офферы товара в список (см. iter_offer_pages_async).
+
+    Returns:
+        Список офферов вида {"merchant_name": ..., "price": ...}
+    """
+    return [
+        offer
+        async for page in iter_offer_pages_async(url, max_retries, concurrency, limit)
+        for offer in page
+    ]
+
+
+async def iter_offer_pages_async(
+    url: str,
+    max_retries: int = 3,
+    concurrency: Optional[int] = None,
+    limit: Optional[int] = None,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Отдаёт офферы товара постранично, загружая страницы API параллельно.
+
+    Сначала читается первая страница, затем следующие загружаются скользящим
+    окном (не больше `concurrency` одновременно) и отдаются в порядке номеров.
+    Собранные офферы не накапливаются: потребитель обрабатывает страницу,
+    пока загружаются следующие.
+
+    Args:
+        url: Ссылка на товар (с параметром ?c=)
+        max_retries: Количество попыток на одну страницу
+        concurrency: Максимум одновременных запросов к API
+        limit: Размер страницы API
+
+    Yields:
+        Страницы офферов вида [{"merchant_name": ..., "price": ...}, ...]
+    """
     city_id = extract_city_id_from_url(url)
+    concurrency = concurrency or settings.offers_concurrency
+    limit = limit or settings.offers_page_limit
+
+    async with _offers_client(url) as (client, api_url):
+        pages = _iter_city_offer_pages(
+            client, get_rate_limiter(KASPI_OFFERS), asyncio.Semaphore(concurrency),
+            api_url, city_id, limit, concurrency, max_retries,
+        )
+        try:
+            async for page in pages:
+                yield page
+        finally:
+            await pages.aclose()
+
+
+def fetch_offers_multi_city(url: str, city_ids: List[str], max_retries: int = 3) -> Dict[str, List[Dict[str, Any]]]:
+    """Синхронная обёртка над fetch_offers_multi_city_async."""
+    return asyncio.run(fetch_offers_multi_city_async(url, city_ids, max_retries=max_retries))
+
+
+async def fetch_offers_multi_city_async(
+    url: str,
+    city_ids: List[str],
+    max_retries: int = 3,
+    concurrency: Optional[int] = None,
+    limit: Optional[int] = None,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Собирает офферы одного товара сразу по нескольким городам.
+
+    Города загружаются конкурентно через один HTTP-клиент, общие cookies и общий
+    лимитер API офферов; `concurrency` ограничивает число одновременных запросов
+    на все города вместе.
+
+    Args:
+        url: Ссылка на товар
+        city_ids: Идентификаторы городов Kaspi
+        max_retries: Количество попыток на одну страницу
+        concurrency: Максимум одновременных запросов к API
+        limit: Размер страницы API
+
+    Returns:
+        Словарь city_id -> список офферов
+    """
+    concurrency = concurrency or settings.offers_concurrency
+    limit = limit or settings.offers_page_limit
+    city_ids = list(dict.fromkeys(city_ids))
+
+    async with _offers_client(url) as (client, api_url):
+        limiter = get_rate_limiter(KASPI_OFFERS)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def _collect(city_id: str) -> List[Dict[str, Any]]:
+            pages = _iter_city_offer_pages(client, limiter, semaphore, api_url, city_id, limit, concurrency, max_retries)
+            return [offer async for page in pages for offer in page]
+
+        results = await asyncio.gather(*(_collect(city_id) for city_id in city_ids))
 
+    return dict(zip(city_ids, results))
+
+
+@asynccontextmanager
+async def _offers_client(url: str) -> AsyncIterator[Tuple[httpx.AsyncClient, str]]:
+    """HTTP-клиент API офферов с заголовками и cookies товара; отдаёт (client, api_url)."""
+    product_id = extract_product_id_from_url(url)
     api_url = f"https://kaspi.kz/yml/offer-view/offers/{product_id}"
     product_url = url
 
     headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/118.0.0.0 Safari/537.36"
-        ),
+        "User-Agent": USER_AGENT,
         "Accept": "application/json, text/plain, */*",
         "Referer": product_url,
         "Origin": "https://kaspi.kz",
@@ -196,282 +547,311 @@ def fetch_offers(url: str, max_retries: int = 3) -> List[Dict[str, Any]]:
         "Content-Type": "application/json",
     }
 
-    session = requests.Session()
-    session.headers.update(headers)
-
-    # Получаем cookies для обхода 403
+    # Cookies для обхода 403 общие для всех товаров (в офлайн-режиме сеть не нужна)
+    cookies = {} if http_cache.replaying else await asyncio.to_thread(offers_cookie_jar.get, product_url)
+
+    async with httpx.AsyncClient(headers=headers, cookies=cookies, timeout=15, follow_redirects=True) as client:
+        yield client, api_url
+
+
+async def _iter_city_offer_pages(
+    client: httpx.AsyncClient,
+    limiter: AdaptiveRateLimiter,
+    semaphore: asyncio.Semaphore,
+    api_url: str,
+    city_id: str,
+    limit: int,
+    concurrency: int,
+    max_retries: int,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Постранично отдаёт офферы одного города до первой неудачной или пустой страницы."""
+
+    async def _load(page: int) -> Optional[List[Dict[str, Any]]]:
+        async with semaphore:
+            data = await _fetch_offers_page(client, limiter, api_url, city_id, page, limit, max_retries)
+        return None if data is None else data.get("offers", [])
+
+    async with semaphore:
+        first = await _fetch_offers_page(client, limiter, api_url, city_id, 0, limit, max_retries)
+    if first is None:
+        return
+
+    total = first.get("offersCount") or first.get("total")
+    page_count = -(-total // limit) if isinstance(total, int) and total > 0 else None
+    first_offers = first.get("offers", [])
+    if len(first_offers) < limit:
+        logger.info(f"Город {city_id}: получено офферов меньше лимита ({len(first_offers)} < {limit}), это последняя страница")
+        page_count = 1
+    elif page_count is not None:
+        logger.info(f"Город {city_id}: всего офферов по данным API: {total}, страниц: {page_count}")
+
+    # Страницы после первой грузятся окном из `concurrency` задач; без общего
+    # количества последней считается первая короткая страница
+    pending: Deque[asyncio.Task] = deque()
+    next_page = 1
+    collected = 0
     try:
-        session.get(product_url, timeout=10)
-    except requests.RequestException as e:
-        logger.error(f"Ошибка при получении cookies: {e}")
-        return []
-
-    all_offers = []
-    page = 0
-    limit = 50
-    
-    while True:
-        payload = {
-            "cityId": city_id,  # Алматы
-            "limit": limit,
-            "page": page,
-            "sort": True
-        }
-
-        # Retry логика для каждого запроса
-        response = None
-        for attempt in range(max_retries):
-            try:
-                response = session.post(api_url, json=payload, timeout=15)
-                if response.status_code == 200:
-                    break
-                elif response.status_code == 429:  # Too Many Requests
-                    wait_time = 2 ** attempt  # Exponential backoff
-                    logger.info(f"Rate limit, ждем {wait_time} секунд...")
-                    time.sleep(wait_time)
+        page, offers = 0, first_offers
+        while True:
+            if not offers:
+                if offers is None:
+                    logger.info(f"Город {city_id}: не удалось получить данные для страницы {page}, останавливаемся на ней")
                 else:
-                    logger.info(f"HTTP {response.status_code} на странице {page}, попытка {attempt + 1}")
-                    time.sleep(1)
-            except requests.RequestException as e:
-                logger.info(f"Ошибка запроса на странице {page}, попытка {attempt + 1}: {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(1)
+                    logger.info(f"Город {city_id}: страница {page}: офферы не найдены, завершаем")
+                return
+            logger.info(f"Город {city_id}: страница {page}: найдено {len(offers)} офферов")
+            collected += len(offers)
+            yield [_process_offer(offer) for offer in offers]
+
+            if page_count is None and len(offers) < limit:
+                return
+            while len(pending) < concurrency and (page_count is None or next_page < page_count):
+                pending.append(asyncio.ensure_future(_load(next_page)))
+                next_page += 1
+            if not pending:
+                return
+            page, offers = page + 1, await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        logger.info(f"Город {city_id}: всего собрано {collected} офферов")
+
+
+async def _fetch_offers_page(
+    client: httpx.AsyncClient,
+    limiter: AdaptiveRateLimiter,
+    api_url: str,
+    city_id: str,
+    page: int,
+    limit: int,
+    max_retries: int,
+) -> Optional[Dict[str, Any]]:
+    """Загружает одну страницу офферов с повторами. Возвращает JSON или None."""
+    payload = {
+        "cityId": city_id,
+        "limit": limit,
+        "page": page,
+        "sort": True
+    }
 
-        if not response or response.status_code != 200:
-            logger.info(f"Не удалось получить данные для страницы {page} после {max_retries} попыток")
-            break
+    body = json.dumps(payload, sort_keys=True)
+    cached = http_cache.lookup(CACHE_OFFERS, "POST", api_url, body)
+    if cached is not None:
+        return cached.json()
 
+    # Retry логика для каждого запроса
+    response = None
+    for attempt in range(max_retries):
+        if attempt:
+            scrape_retries.inc("offers_page")
+        await limiter.acquire_async()
         try:
-            data = response.json()
-        except Exception as e:
-            logger.info(f"Ошибка при разборе JSON на странице {page}: {e}")
-            break
-
-        offers = data.get("offers", [])
-        
-        if not offers:
-            logger.info(f"Страница {page}: офферы не найдены, завершаем")
-            break
-            
-        logger.info(f"Страница {page}: найдено {len(offers)} офферов")
-        
-        # Обрабатываем офферы и добавляем в общий список
-        for offer in offers:
-            price_value = offer.get("price")
-            if isinstance(price_value, dict):
-                price = price_value.get("amount")
+            response = await client.post(api_url, json=payload)
+            limiter.record(response.status_code, response.headers.get("Retry-After"))
+            if response.status_code == 200:
+                break
+            elif response.status_code in THROTTLE_STATUSES:
+                # Паузу и снижение скорости берёт на себя общий лимитер
+                logger.info(f"HTTP {response.status_code} на странице {page}, лимитер снижает скорость")
+                if response.status_code == 403:
+                    client.cookies.update(
+                        await asyncio.to_thread(offers_cookie_jar.refresh, str(client.headers["Referer"]))
+                    )
             else:
-                price = price_value
-            
-            processed_offer = {
-                "merchant_name": offer.get("merchantName", "Unknown"),
-                "price": price
-            }
-                
-            all_offers.append(processed_offer)
+                logger.info(f"HTTP {response.status_code} на странице {page}, попытка {attempt + 1}")
+                await asyncio.sleep(1)
+        except httpx.HTTPError as e:
+            logger.info(f"Ошибка запроса на странице {page}, попытка {attempt + 1}: {e}")
+            if attempt < max_retries - 1:
+                await asyncio.sleep(1)
 
-        # Проверяем, нужно ли загружать следующую страницу
-        if len(offers) < limit:
-            logger.info(f"Получено офферов меньше лимита ({len(offers)} < {limit}), это последняя страница")
-            break
-            
-        page += 1
-        
-        # Небольшая пауза между запросами чтобы не нагружать сервер
-        time.sleep(0.5)
+    if response is None or response.status_code != 200:
+        logger.info(f"Не удалось получить данные для страницы {page} после {max_retries} попыток")
+        return None
+
+    try:
+        data = response.json()
+    except Exception as e:
+        logger.info(f"Ошибка при разборе JSON на странице {page}: {e}")
+        return None
+
+    http_cache.store(CACHE_OFFERS, "POST", api_url, body, CachedResponse(response.status_code, response.text))
+    return data
 
-    logger.info(f"Всего собрано {len(all_offers)} офферов")
-    return all_offers
+
+def _process_offer(offer: Dict[str, Any]) -> Dict[str, Any]:
+    price_value = offer.get("price")
+    if isinstance(price_value, dict):
+        price = price_value.get("amount")
+    else:
+        price = price_value
+
+    return {
+        "merchant_name": offer.get("merchantName", "Unknown"),
+        "price": price
+    }
         
         
 def parse_kaspi_rating_playwright(url: str, max_retries: int = 3) -> Dict[str, Optional[float]]:
     logger.info(f"Начинаем парсинг рейтинга: {url}")
-    
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True, args=["--disable-gpu", "--no-sandbox"])
-        page = browser.new_page()
-        
+
+    # Офлайн-режим: рейтинг берём из записанного рендера страницы
+    if http_cache.replaying:
+        try:
+            cached = http_cache.lookup(CACHE_RENDER, "RENDER", url)
+        except CacheMissError as e:
+            logger.info(f"Рендера нет в кэше: {e}")
+            return {"rating": None, "reviews_count": None}
+        return _extract_rating_from_html(cached.text) or {"rating": None, "reviews_count": None}
+
+    async def _render_rating(page) -> Dict[str, Optional[float]]:
+        await apply_request_profile(page)
         try:
-            page.goto(url, timeout=60000)
+            await page.goto(url, timeout=60000)
             logger.info("Страница загружена, ищем рейтинг...")
         except Exception as e:
             logger.info(f"Ошибка при загрузке страницы: {e}")
-            browser.close()
             return {"rating": None, "reviews_count": None}
-        
+
         # Пытаемся найти рейтинг несколько раз
         for attempt in range(max_retries):
             logger.info(f"Попытка {attempt + 1}/{max_retries}")
-            
+            if attempt:
+                scrape_retries.inc("rating")
+
             try:
                 # Ждем появления блока с рейтингом
                 try:
-                    page.wait_for_selector(".item__rating", timeout=5000)
+                    await page.wait_for_selector(".item__rating", timeout=5000)
                     logger.info("  ✓ Селектор .item__rating найден")
                 except PlaywrightTimeoutError:
                     logger.info("  ✗ Селектор .item__rating не найден за 5 сек")
                     if attempt < max_retries - 1:
                         logger.info("  Пауза 2 сек перед следующей попыткой...")
-                        time.sleep(2)
+                        await page.wait_for_timeout(2000)
                         continue
                     else:
                         logger.info("  Последняя попытка - пробуем парсить имеющийся HTML")
 
-                # Получаем HTML и парсим
-                html = page.content()
-                soup = BeautifulSoup(html, "html.parser")
-                rating_block = soup.select_one(".item__rating")
-
-                if not rating_block:
-                    logger.info(f"  ✗ Блок .item__rating не найден в HTML")
-                    if attempt < max_retries - 1:
-                        logger.info(f"  Пауза 2 сек перед следующей попыткой...")
-                        time.sleep(2)
-                        continue
-                    else:
-                        break
-
-                logger.info(f"  ✓ Блок рейтинга найден, парсим данные...")
+                # Получаем HTML и парсим вне event loop пула, чтобы не блокировать другие страницы
+                html = await page.content()
+                rating_data = await asyncio.to_thread(_extract_rating_from_html, html)
 
-                # Ищем span с классом rating _X
-                span_rating = rating_block.select_one('span[class*="rating _"]')
-                rating_value = None
-                
-                if span_rating:
-                    class_list = span_rating.get('class', [])
-                    match = re.search(r'_(\d+)', ' '.join(class_list))
-                    if match:
-                        rating_value = int(match.group(1))
-                        logger.info(f"  ✓ Рейтинг найден: {rating_value}")
-                    else:
-                        logger.info(f"  ✗ Не удалось извлечь рейтинг из классов: {class_list}")
-                else:
-                    logger.info(f"  ✗ Span с рейтингом не найден")
+                if rating_data is not None:
+                    logger.info(f"  ✓ Парсинг успешен на попытке {attempt + 1}")
+                    return rating_data
 
-                # Количество отзывов
-                reviews_link = rating_block.select_one(".item__rating-link span")
-                reviews_count = None
-                
-                if reviews_link:
-                    reviews_text = reviews_link.get_text(strip=True)
-                    match = re.search(r"(\d+)", reviews_text)
-                    if match:
-                        reviews_count = int(match.group(1))
-                        logger.info(f"  ✓ Количество отзывов найдено: {reviews_count}")
-                    else:
-                        logger.info(f"  ✗ Не удалось извлечь число отзывов из текста: '{reviews_text}'")
-                else:
-                    logger.info(f"  ✗ Ссылка на отзывы не найдена")
+                if attempt < max_retries - 1:
+                    logger.info(f"  Пауза 2 сек перед следующей попыткой...")
+                    await page.wait_for_timeout(2000)
 
-                # Если хотя бы что-то нашли - возвращаем результат
-                if rating_value is not None or reviews_count is not None:
-                    logger.info(f"  ✓ Парсинг успешен на попытке {attempt + 1}")
-                    browser.close()
-                    return {"rating": rating_value/10, "reviews_count": reviews_count}
-                else:
-                    logger.info(f"  ✗ Ни рейтинг, ни отзывы не найдены")
-                    if attempt < max_retries - 1:
-                        logger.info(f"  Пауза 2 сек перед следующей попыткой...")
-                        time.sleep(2)
-                    
             except Exception as e:
                 logger.info(f"  ✗ Ошибка на попытке {attempt + 1}: {type(e).__name__}: {e}")
                 if attempt < max_retries - 1:
                     logger.info(f"  Пауза 2 сек перед следующей попыткой...")
-                    time.sleep(2)
+                    await page.wait_for_timeout(2000)
 
         logger.info(f"✗ Все {max_retries} попыток неудачны, возвращаем пустой результат")
-        browser.close()
         return {"rating": None, "reviews_count": None}
+
+    get_rate_limiter(KASPI_PAGES).acquire()
+    return browser_pool.run(_render_rating)
+
+
+def _extract_rating_from_html(html: str) -> Optional[Dict[str, Optional[float]]]:
+    return _extract_rating(parse_product_html(html))
+
+
+def _extract_rating(soup: BeautifulSoup) -> Optional[Dict[str, Optional[float]]]:
+    """
+    Извлекает рейтинг и количество отзывов из блока .item__rating.
+
+    Returns:
+        Словарь с rating и reviews_count или None, если ничего не найдено
+    """
+    rating_block = soup.select_one(".item__rating")
+
+    if not rating_block:
+        logger.info(f"  ✗ Блок .item__rating не найден в HTML")
+        return None
+
+    logger.info(f"  ✓ Блок рейтинга найден, парсим данные...")
+
+    # Ищем span с классом rating _X
+    span_rating = rating_block.select_one('span[class*="rating _"]')
+    rating_value = None
+
+    if span_rating:
+        class_list = span_rating.get('class', [])
+        match = re.search(r'_(\d+)', ' '.join(class_list))
+        if match:
+            rating_value = int(match.group(1))
+            logger.info(f"  ✓ Рейтинг найден: {rating_value}")
+        else:
+            logger.info(f"  ✗ Не удалось извлечь рейтинг из классов: {class_list}")
+    else:
+        logger.info(f"  ✗ Span с рейтингом не найден")
+
+    # Количество отзывов
+    reviews_link = rating_block.select_one(".item__rating-link span")
+    reviews_count = None
+
+    if reviews_link:
+        reviews_text = reviews_link.get_text(strip=True)
+        match = re.search(r"(\d+)", reviews_text)
+        if match:
+            reviews_count = int(match.group(1))
+            logger.info(f"  ✓ Количество отзывов найдено: {reviews_count}")
+        else:
+            logger.info(f"  ✗ Не удалось извлечь число отзывов из текста: '{reviews_text}'")
+    else:
+        logger.info(f"  ✗ Ссылка на отзывы не найдена")
+
+    # Если хотя бы что-то нашли - возвращаем результат
+    if rating_value is None and reviews_count is None:
+        logger.info(f"  ✗ Ни рейтинг, ни отзывы не найдены")
+        return None
+
+    return {
+        "rating": rating_value / 10 if rating_value is not None else None,
+        "reviews_count": reviews_count,
+    }
     
     
 def get_category_path(url: str, max_retries: int = 3, timeout: int = 10) -> Optional[str]:
     logger.info(f"Начинаем получение категории для URL: {url}")
     
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/118.0.0.0 Safari/537.36"
-        ),
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-        "Accept-Language": "ru-RU,ru;q=0.9,en;q=0.8",
-        "Accept-Encoding": "gzip, deflate, br",
-        "Connection": "keep-alive",
-        "Upgrade-Insecure-Requests": "1"
-    }
-    
     for attempt in range(max_retries):
         logger.info(f"Попытка {attempt + 1}/{max_retries} получения категории")
+        if attempt:
+            scrape_retries.inc("category")
         
         try:
-            # Делаем запрос с таймаутом
-            response = requests.get(url, headers=headers, timeout=timeout)
+            # Делаем запрос с таймаутом через кэш и общий лимитер страниц
+            response = get_page(url, timeout)
             
             if response.status_code == 200:
                 logger.info("  ✓ HTTP 200 - страница загружена")
                 
-                soup = BeautifulSoup(response.text, "html.parser")
-                
-                # Ищем хлебные крошки с различными селекторами
-                selectors_to_try = [
-                    "div.breadcrumbs a.breadcrumbs__item",
-                    ".breadcrumbs a",
-                    "nav.breadcrumbs a", 
-                    ".breadcrumbs__item",
-                    "a.breadcrumbs__link",
-                    ".breadcrumb a"
-                ]
-                
-                breadcrumbs = []
-                for selector in selectors_to_try:
-                    breadcrumbs = soup.select(selector)
-                    if breadcrumbs:
-                        logger.info(f"  ✓ Хлебные крошки найдены с селектором: {selector}")
-                        break
-                    else:
-                        logger.info(f"  - Селектор '{selector}' не дал результатов")
+                soup = parse_product_html(response.text)
                 
-                if not breadcrumbs:
-                    logger.info(f"  ✗ Хлебные крошки не найдены ни одним из селекторов")
-                    if attempt < max_retries - 1:
-                        logger.info(f"  Пауза 2 сек перед следующей попыткой...")
-                        time.sleep(2)
-                        continue
-                    else:
-                        logger.info(f"  Последняя попытка - возвращаем None")
-                        return None
-                
-                category_items = []
-                for a in breadcrumbs:
-                    text = a.get_text(strip=True)
-                    if text and text.lower() not in ['главная', 'home', 'kaspi.kz']:
-                        category_items.append(text)
-                
-                if category_items:
-                    category_path = " > ".join(category_items)
-                    logger.info(f"  ✓ Путь категории успешно извлечен: '{category_path}'")
+                category_path = _extract_category(soup)
+                if category_path:
                     return category_path
+
+                if attempt < max_retries - 1:
+                    logger.info(f"  Пауза 2 сек перед следующей попыткой...")
+                    time.sleep(2)
+                    continue
                 else:
-                    logger.info(f"  ✗ Все элементы хлебных крошек пустые или нерелевантные")
-                    if attempt < max_retries - 1:
-                        logger.info(f"  Пауза 2 сек перед следующей попыткой...")
-                        time.sleep(2)
-                        continue
+                    logger.info(f"  Последняя попытка - возвращаем None")
+                    return None
                         
-            elif response.status_code == 429:  # Rate limit
-                wait_time = 2 ** attempt  # Exponential backoff
-                logger.info(f"  ✗ HTTP 429 (Rate limit) - ждем {wait_time} секунд...")
-                time.sleep(wait_time)
+            elif response.status_code in THROTTLE_STATUSES:  # 429 / 403 / 503
+                # Пауза перед следующей попыткой — в лимитере (с учётом Retry-After)
+                logger.info(f"  ✗ HTTP {response.status_code} - лимитер снижает скорость")
                 continue
-                
-            elif response.status_code in [403, 503]:  # Forbidden или Service Unavailable
-                logger.info(f"  ✗ HTTP {response.status_code} - возможно блокировка")
-                if attempt < max_retries - 1:
-                    wait_time = 3 + attempt  # Увеличиваем задержку
-                    logger.info(f"  Пауза {wait_time} сек перед следующей попыткой...")
-                    time.sleep(wait_time)
-                    continue
                     
             else:
                 logger.info(f"  ✗ HTTP {response.status_code} - неожиданный код ответа")
@@ -480,6 +860,10 @@ def get_category_path(url: str, max_retries: int = 3, timeout: int = 10) -> Opti
                     time.sleep(2)
                     continue
                     
+        except CacheMissError as e:
+            logger.info(f"  ✗ Страницы нет в кэше: {e}")
+            return None
+
         except requests.exceptions.Timeout:
             logger.info(f"  ✗ Таймаут ({timeout}с) на попытке {attempt + 1}")
             if attempt < max_retries - 1:
@@ -506,3 +890,48 @@ def get_category_path(url: str, max_retries: int = 3, timeout: int = 10) -> Opti
     
     logger.info(f"✗ Все {max_retries} попыток неудачны, возвращаем None")
     return None
+
+
+def _extract_category(soup: BeautifulSoup) -> Optional[str]:
+    """
+    Собирает путь категории из хлебных крошек.
+
+    Returns:
+        Строка вида "Категория > Подкатегория" или None
+    """
+    # Ищем хлебные крошки с различными селекторами
+    selectors_to_try = [
+        "div.breadcrumbs a.breadcrumbs__item",
+        ".breadcrumbs a",
+        "nav.breadcrumbs a", 
+        ".breadcrumbs__item",
+        "a.breadcrumbs__link",
+        ".breadcrumb a"
+    ]
+    
+    breadcrumbs = []
+    for selector in selectors_to_try:
+        breadcrumbs = soup.select(selector)
+        if breadcrumbs:
+            logger.info(f"  ✓ Хлебные крошки найдены с селектором: {selector}")
+            break
+        else:
+            logger.info(f"  - Селектор '{selector}' не дал результатов")
+    
+    if not breadcrumbs:
+        logger.info(f"  ✗ Хлебные крошки не найдены ни одним из селекторов")
+        return None
+    
+    category_items = []
+    for a in breadcrumbs:
+        text = a.get_text(strip=True)
+        if text and text.lower() not in ['главная', 'home', 'kaspi.kz']:
+            category_items.append(text)
+    
+    if not category_items:
+        logger.info(f"  ✗ Все элементы хлебных крошек пустые или нерелевантные")
+        return None
+
+    category_path = " > ".join(category_items)
+    logger.info(f"  ✓ Путь категории успешно извлечен: '{category_path}'")
+    return category_path
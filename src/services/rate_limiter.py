@@ -0,0 +1,220 @@
+"""
+Общие для процесса ограничители частоты запросов к Kaspi.kz.
+
+Один token bucket на класс эндпоинтов (страницы товаров, API офферов),
+которым пользуются все загрузчики — и синхронные потоки, и asyncio-код.
+Скорость адаптивная: при 429/403/503 она снижается вдвое и учитывается
+Retry-After, при успешных ответах постепенно растёт до потолка.
+"""
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+from src.core.config import settings
+from src.core.metrics import kaspi_responses
+
+from logs.config_logs import setup_logging
+import logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Классы эндпоинтов
+KASPI_PAGES = "kaspi_pages"
+KASPI_OFFERS = "kaspi_offers"
+
+# Ответы, после которых нужно сбавить скорость
+THROTTLE_STATUSES = frozenset({403, 429, 503})
+
+# Бюджет вызывающего кода, с которого дополнительно списывается каждый запрос
+_request_budget: ContextVar[Optional["AdaptiveRateLimiter"]] = ContextVar("request_budget", default=None)
+
+
+class AdaptiveRateLimiter:
+    """Token bucket с резервированием токенов и адаптацией скорости (AIMD)."""
+
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: int,
+        min_rate: float,
+        max_rate: float,
+        increase_step: float,
+        decrease_factor: float = 0.5,
+    ):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._waiting = 0
+        self._requests_total = 0
+        self._throttled_total = 0
+
+    def acquire(self) -> None:
+        """
+        Блокирует текущий поток, пока не освободится токен.
+
+        Внутри charge_requests_to() запрос дополнительно списывается с бюджета вызывающего.
+        """
+        delay = self._reserve()
+        if delay > 0:
+            with self._lock:
+                self._waiting += 1
+            try:
+                time.sleep(delay)
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+
+        budget = _request_budget.get()
+        if budget is not None and budget is not self:
+            budget.acquire()
+
+    async def acquire_async(self) -> None:
+        """Асинхронный вариант acquire() — не блокирует event loop."""
+        delay = self._reserve()
+        if delay > 0:
+            with self._lock:
+                self._waiting += 1
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+
+        budget = _request_budget.get()
+        if budget is not None and budget is not self:
+            await budget.acquire_async()
+
+    def record(self, status_code: int, retry_after: Optional[str] = None) -> None:
+        """
+        Учитывает ответ сервера и подстраивает скорость.
+
+        Args:
+            status_code: HTTP статус ответа
+            retry_after: Значение заголовка Retry-After (секунды или HTTP-дата)
+        """
+        kaspi_responses.inc(self.name, status_code)
+        with self._lock:
+            self._requests_total += 1
+            if status_code in THROTTLE_STATUSES:
+                self._throttled_total += 1
+                self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                # Уводим бакет в долг: следующий токен появится не раньше паузы
+                pause = _parse_retry_after(retry_after)
+                self._refill(time.monotonic())
+                self._tokens = min(self._tokens, 0.0) - pause * self.rate
+                logger.warning(
+                    f"Лимитер {self.name}: HTTP {status_code}, скорость снижена до "
+                    f"{self.rate:.2f} rps, пауза {pause:.1f} с"
+                )
+            elif 200 <= status_code < 400:
+                self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Текущее состояние лимитера для мониторинга."""
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "name": self.name,
+                "rate": round(self.rate, 3),
+                "min_rate": self.min_rate,
+                "max_rate": self.max_rate,
+                "tokens": round(self._tokens, 3),
+                "queue_depth": self._waiting,
+                "requests_total": self._requests_total,
+                "throttled_total": self._throttled_total,
+            }
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(float(self.burst), self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def _reserve(self) -> float:
+        """Забирает токен (возможно в долг) и возвращает, сколько нужно подождать."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+@contextmanager
+def charge_requests_to(budget: AdaptiveRateLimiter) -> Iterator[None]:
+    """
+    Списывает с `budget` по токену за каждый запрос к Kaspi внутри блока.
+
+    Запросы по-прежнему ждут свой лимитер класса эндпоинтов, а затем ещё и
+    `budget`. Контекст наследуют задачи asyncio, созданные внутри блока.
+    """
+    token = _request_budget.set(budget)
+    try:
+        yield
+    finally:
+        _request_budget.reset(token)
+
+
+def _parse_retry_after(value: Optional[str]) -> float:
+    """Переводит Retry-After в секунды; без заголовка — одна секунда."""
+    if not value:
+        return 1.0
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return 1.0
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+_limiters: Dict[str, AdaptiveRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+_DEFAULT_RATES = {
+    KASPI_PAGES: lambda: settings.rate_limit_pages_rps,
+    KASPI_OFFERS: lambda: settings.rate_limit_offers_rps,
+}
+
+
+def get_rate_limiter(name: str) -> AdaptiveRateLimiter:
+    """Возвращает общий лимитер для класса эндпоинтов (создаётся при первом обращении)."""
+    limiter = _limiters.get(name)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(name)
+            if limiter is None:
+                rate = _DEFAULT_RATES[name]() if name in _DEFAULT_RATES else settings.rate_limit_pages_rps
+                limiter = AdaptiveRateLimiter(
+                    name=name,
+                    rate=rate,
+                    burst=settings.rate_limit_burst,
+                    min_rate=settings.rate_limit_min_rps,
+                    max_rate=max(rate, settings.rate_limit_max_rps),
+                    increase_step=settings.rate_limit_increase_step,
+                )
+                _limiters[name] = limiter
+    return limiter
+
+
+def rate_limiters_snapshot() -> List[Dict[str, Any]]:
+    """Состояние всех созданных лимитеров."""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return [limiter.snapshot() for limiter in limiters]
@@ -0,0 +1,324 @@
+"""
+Планировщик повторного обхода товаров по волатильности цен.
+
+Для каждого товара из БД считается, сколько раз за последние
+SCHEDULER_VOLATILITY_WINDOW_DAYS менялись цены: изменения цен офферов
+(ProductOfferHistory) плюс смены уровня цен товара (ProductPriceHistory).
+Интервал обновления — половина среднего времени между изменениями, в пределах
+[SCHEDULER_MIN_INTERVAL_HOURS, SCHEDULER_MAX_INTERVAL_HOURS]: волатильные
+товары опрашиваются часто, стабильные — редко.
+
+Сроки хранятся в куче (min-heap по времени следующего обновления). Товары
+обновляются через refresh_product (обычно только API офферов). Общий бюджет
+SCHEDULER_REQUESTS_PER_MINUTE считается по исходящим запросам к Kaspi: одно
+обновление тратит токен на каждую страницу офферов (и на страницы товара при
+полном скрапе), а не один токен на товар.
+"""
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, func
+
+from src.core.config import settings
+from src.core.dependencies import SessionLocal
+from src.models import Product, ProductOffer, ProductOfferHistory, ProductPriceHistory
+from src.services.rate_limiter import AdaptiveRateLimiter, charge_requests_to
+from src.services.scrape_service import refresh_product
+
+from logs.config_logs import setup_logging
+import logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ScheduleEntry:
+    """Расписание обновления одного товара."""
+    product_id: int
+    kaspi_id: str
+    url: str
+    price_changes: int
+    interval: float                     # секунды между обновлениями
+    next_due: float                     # time.time() следующего обновления
+    in_flight: bool = False
+    last_run_at: Optional[float] = None
+    last_status: Optional[str] = None
+
+
+def refresh_interval(price_changes: int) -> float:
+    """Интервал обновления (в секундах) по числу изменений цен за окно."""
+    window = settings.scheduler_volatility_window_days * 86400
+    interval = window / (price_changes + 1) / 2
+    low = settings.scheduler_min_interval_hours * 3600
+    high = settings.scheduler_max_interval_hours * 3600
+    return min(high, max(low, interval))
+
+
+def load_volatility() -> List[Tuple[int, str, str, Optional[datetime], int]]:
+    """
+    Читает из БД товары и число изменений их цен за окно волатильности.
+
+    Returns:
+        Список (product_id, kaspi_id, url, updated_at, price_changes)
+    """
+    since = datetime.utcnow() - timedelta(days=settings.scheduler_volatility_window_days)
+
+    offer_changes = (
+        select(ProductOffer.product_id, func.count(ProductOfferHistory.id).label("changes"))
+        .join(ProductOfferHistory, ProductOfferHistory.offer_id == ProductOffer.id)
+        .where(ProductOfferHistory.changed_at >= since)
+        .group_by(ProductOffer.product_id)
+    )
+
+    # История цен пишется при каждом обновлении — считаем только разные уровни цен
+    price_levels = (
+        select(ProductPriceHistory.product_id, ProductPriceHistory.price_min, ProductPriceHistory.price_max)
+        .where(ProductPriceHistory.recorded_at >= since)
+        .distinct()
+        .subquery()
+    )
+    level_counts = (
+        select(price_levels.c.product_id, func.count().label("levels"))
+        .group_by(price_levels.c.product_id)
+    )
+
+    with SessionLocal() as session:
+        changes: Dict[int, int] = dict(session.execute(offer_changes).all())
+        for product_id, levels in session.execute(level_counts).all():
+            changes[product_id] = changes.get(product_id, 0) + max(levels - 1, 0)
+
+        products = session.execute(
+            select(Product.id, Product.kaspi_id, Product.url, Product.updated_at)
+        ).all()
+
+    return [
+        (product_id, kaspi_id, url, updated_at, changes.get(product_id, 0))
+        for product_id, kaspi_id, url, updated_at in products
+    ]
+
+
+class RecrawlScheduler:
+    """Фоновый планировщик обновлений с кучей сроков и бюджетом запросов."""
+
+    def __init__(self, requests_per_minute: float, workers: int, reload_seconds: int):
+        self.requests_per_minute = requests_per_minute
+        self.workers = workers
+        self.reload_seconds = reload_seconds
+
+        rate = requests_per_minute / 60
+        self._budget = AdaptiveRateLimiter(
+            name="scheduler", rate=rate, burst=1, min_rate=rate, max_rate=rate, increase_step=0
+        )
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[threading.Semaphore] = None
+
+        self._entries: Dict[int, ScheduleEntry] = {}
+        self._heap: List[Tuple[float, int, int]] = []
+        self._counter = itertools.count()
+        self._loaded_at = 0.0
+        self._refreshed_total = 0
+        self._failed_total = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        """Запускает поток планировщика."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="recrawl")
+            self._slots = threading.Semaphore(self.workers)
+            self._thread = threading.Thread(target=self._loop, name="recrawl-scheduler", daemon=True)
+            self._thread.start()
+        logger.info(
+            f"Планировщик обновлений запущен: бюджет {self.requests_per_minute} запросов/мин, "
+            f"{self.workers} воркер(ов)"
+        )
+
+    def stop(self) -> None:
+        """Останавливает планировщик и дожидается текущих обновлений."""
+        with self._lock:
+            if self._thread is None:
+                return
+            self._stopping = True
+            self._wakeup.notify_all()
+            thread, executor = self._thread, self._executor
+        thread.join(timeout=10)
+        executor.shutdown(wait=True, cancel_futures=True)
+        with self._lock:
+            self._thread = None
+        logger.info("Планировщик обновлений остановлен")
+
+    def reload(self) -> None:
+        """Пересчитывает волатильность и интервалы по данным БД."""
+        rows = load_volatility()
+        now = time.time()
+        with self._lock:
+            seen = set()
+            for product_id, kaspi_id, url, updated_at, price_changes in rows:
+                seen.add(product_id)
+                interval = refresh_interval(price_changes)
+                entry = self._entries.get(product_id)
+                if entry is None:
+                    last = updated_at.timestamp() if updated_at is not None else now - interval
+                    entry = ScheduleEntry(
+                        product_id=product_id,
+                        kaspi_id=kaspi_id,
+                        url=url,
+                        price_changes=price_changes,
+                        interval=interval,
+                        next_due=last + interval,
+                    )
+                    self._entries[product_id] = entry
+                    self._push(entry)
+                else:
+                    entry.url = url
+                    entry.price_changes = price_changes
+                    if interval != entry.interval and not entry.in_flight:
+                        # Срок пересчитывается от последнего обновления с новым интервалом
+                        entry.next_due = entry.next_due - entry.interval + interval
+                        self._push(entry)
+                    entry.interval = interval
+
+            for product_id in set(self._entries) - seen:
+                del self._entries[product_id]
+
+            self._loaded_at = now
+            self._wakeup.notify_all()
+        logger.info(f"Планировщик: загружено расписание для {len(rows)} товаров")
+
+    def snapshot(self, limit: int = 50) -> Dict[str, Any]:
+        """Состояние очереди и ближайшие сроки обновления."""
+        with self._lock:
+            entries = sorted(self._entries.values(), key=lambda e: e.next_due)
+            in_flight = sum(1 for e in entries if e.in_flight)
+            now = time.time()
+            return {
+                "running": self.running,
+                "requests_per_minute": self.requests_per_minute,
+                "products": len(entries),
+                "due": sum(1 for e in entries if not e.in_flight and e.next_due <= now),
+                "in_flight": in_flight,
+                "refreshed_total": self._refreshed_total,
+                "failed_total": self._failed_total,
+                "loaded_at": _isoformat(self._loaded_at) if self._loaded_at else None,
+                "queue": [
+                    {
+                        "product_id": e.product_id,
+                        "kaspi_id": e.kaspi_id,
+                        "price_changes": e.price_changes,
+                        "interval_hours": round(e.interval / 3600, 2),
+                        "next_due": _isoformat(e.next_due),
+                        "in_flight": e.in_flight,
+                        "last_run_at": _isoformat(e.last_run_at) if e.last_run_at else None,
+                        "last_status": e.last_status,
+                    }
+                    for e in entries[:limit]
+                ],
+            }
+
+    def _push(self, entry: ScheduleEntry) -> None:
+        heapq.heappush(self._heap, (entry.next_due, next(self._counter), entry.product_id))
+
+    def _pop_due(self) -> Optional[ScheduleEntry]:
+        """Ждёт ближайший срок и возвращает товар к обновлению (None — пора остановиться)."""
+        with self._lock:
+            while not self._stopping:
+                now = time.time()
+                if now - self._loaded_at >= self.reload_seconds:
+                    return None
+
+                if not self._heap:
+                    self._wakeup.wait(timeout=self.reload_seconds)
+                    continue
+
+                due, _, product_id = self._heap[0]
+                entry = self._entries.get(product_id)
+                # Устаревшие записи кучи (срок перенесён или товар удалён) пропускаем
+                if entry is None or entry.in_flight or entry.next_due != due:
+                    heapq.heappop(self._heap)
+                    continue
+                if due > now:
+                    self._wakeup.wait(timeout=min(due - now, self.reload_seconds))
+                    continue
+
+                heapq.heappop(self._heap)
+                entry.in_flight = True
+                return entry
+            return None
+
+    def _loop(self) -> None:
+        executor, slots = self._executor, self._slots
+        while True:
+            with self._lock:
+                if self._stopping:
+                    return
+                reload_due = time.time() - self._loaded_at >= self.reload_seconds
+            if reload_due:
+                try:
+                    self.reload()
+                except Exception as e:
+                    logger.error(f"Планировщик: не удалось загрузить расписание: {e}")
+                    with self._lock:
+                        self._loaded_at = time.time()
+
+            entry = self._pop_due()
+            if entry is None:
+                continue
+
+            # Не больше `workers` обновлений одновременно; бюджет списывают сами запросы
+            slots.acquire()
+            try:
+                executor.submit(self._refresh, entry, slots)
+            except RuntimeError:
+                # Исполнитель уже остановлен
+                slots.release()
+                return
+
+    def _refresh(self, entry: ScheduleEntry, slots: threading.Semaphore) -> None:
+        try:
+            with charge_requests_to(self._budget):
+                status = refresh_product(entry.url)["status"]
+        except Exception as e:
+            logger.error(f"Планировщик: ошибка обновления товара {entry.kaspi_id}: {e}")
+            status = "error"
+        finally:
+            slots.release()
+
+        with self._lock:
+            entry.in_flight = False
+            entry.last_run_at = time.time()
+            entry.last_status = status
+            entry.next_due = entry.last_run_at + entry.interval
+            if status == "ok":
+                self._refreshed_total += 1
+            else:
+                self._failed_total += 1
+            if entry.product_id in self._entries:
+                self._push(entry)
+                self._wakeup.notify_all()
+
+
+def _isoformat(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+
+recrawl_scheduler = RecrawlScheduler(
+    requests_per_minute=settings.scheduler_requests_per_minute,
+    workers=settings.scheduler_workers,
+    reload_seconds=settings.scheduler_reload_seconds,
+)
@@ -0,0 +1,250 @@
+"""
+Сервис скрапа: один товар, пакет товаров с ограниченной конкурентностью
+или офферы одного товара по нескольким городам.
+"""
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, as_completed
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.core.config import settings
+from src.services.kaspi_parser import parse_kaspi_product_with_bs, iter_offer_pages, fetch_offers_multi_city
+from src.services.file_service import (
+    save_scraped_batch,
+    save_scraped_stream,
+    save_city_offers,
+    save_offers_refresh,
+    is_static_refresh_due,
+)
+from src.services.write_buffer import write_buffer
+from src.utils import is_valid_kaspi_url, extract_product_id_from_url, stage_timer, OfferStats
+
+from logs.config_logs import setup_logging
+import logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+def scrape_product(url: str, with_offers: bool = True) -> Dict[str, Any]:
+    """
+    Скрапит один товар без сохранения.
+
+    Args:
+        url: Ссылка на товар
+        with_offers: Загружать ли офферы в результат (False — для потокового сохранения)
+
+    Returns:
+        Словарь с url, product_id, status ("ok"/"error"), error, source (http/browser), timings и data
+    """
+    outcome: Dict[str, Any] = {
+        "url": url,
+        "product_id": None,
+        "status": "error",
+        "error": None,
+        "source": None,
+        "timings": {},
+        "data": None,
+    }
+
+    if not is_valid_kaspi_url(url):
+        outcome["error"] = "Invalid Kaspi URL"
+        return outcome
+
+    try:
+        outcome["product_id"] = extract_product_id_from_url(url)
+        with stage_timer(outcome["timings"], "total"):
+            outcome["data"] = parse_kaspi_product_with_bs(
+                url, timings=outcome["timings"], with_offers=with_offers
+            )
+        outcome["source"] = outcome["data"].get("source")
+        outcome["status"] = "ok"
+    except Exception as e:
+        logger.error(f"Ошибка скрапа {url}: {type(e).__name__}: {e}")
+        outcome["error"] = f"{type(e).__name__}: {e}"
+
+    return outcome
+
+
+def run_scrape_job(url: str, on_progress: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """
+    Выполняет скрап и сохранение одного товара как фоновую задачу.
+
+    С включенным буфером записи (WRITE_BUFFER_ENABLED) товар скрапится целиком
+    и сохраняется группой вместе с результатами других задач (этап "save").
+    Иначе карточка скрапится без офферов, затем страницы офферов по мере
+    загрузки пишутся в БД и файл экспорта (этап "offers" включает запись).
+
+    Args:
+        url: Ссылка на товар
+        on_progress: Колбэк, получающий название текущего этапа
+
+    Returns:
+        Результат scrape_product с сохраненными данными
+    """
+    if on_progress:
+        on_progress("scraping")
+    outcome = scrape_product(url, with_offers=settings.write_buffer_enabled)
+
+    if outcome["status"] != "ok":
+        return outcome
+    if on_progress:
+        on_progress("saving")
+
+    if settings.write_buffer_enabled:
+        with stage_timer(outcome["timings"], "save"):
+            try:
+                error = write_buffer.submit(outcome["data"], outcome["product_id"]).result(
+                    timeout=settings.write_buffer_result_timeout
+                )
+            except FutureTimeoutError:
+                error = f"not written within {settings.write_buffer_result_timeout} s"
+        if error:
+            outcome["status"] = "error"
+            outcome["error"] = f"Save failed: {error}"
+    else:
+        with stage_timer(outcome["timings"], "offers"):
+            stats = save_scraped_stream(outcome["data"], outcome["product_id"], iter_offer_pages(url))
+        if stats is None:
+            outcome["status"] = "error"
+            outcome["error"] = "Save failed"
+
+    return outcome
+
+
+def refresh_product(url: str, force_static: bool = False) -> Dict[str, Any]:
+    """
+    Обновляет товар по многоуровневой политике.
+
+    Цены (офферы и история цен) обновляются только через API офферов. Полный скрап
+    со статичными полями выполняется, если товара ещё нет в БД, если с прошлого
+    полного скрапа прошло больше STATIC_REFRESH_INTERVAL_HOURS или если он запрошен явно.
+
+    Returns:
+        Результат в формате scrape_product (без data); source == "offers" для обновления цен,
+        этап "offers" включает загрузку офферов и их запись
+    """
+    if not is_valid_kaspi_url(url):
+        return {
+            "url": url, "product_id": None, "status": "error",
+            "error": "Invalid Kaspi URL", "source": None, "timings": {},
+        }
+
+    product_id = extract_product_id_from_url(url)
+    if force_static or is_static_refresh_due(product_id):
+        logger.info(f"Полное обновление товара {product_id}")
+        outcome = run_scrape_job(url)
+        outcome.pop("data", None)
+        return outcome
+
+    outcome: Dict[str, Any] = {
+        "url": url,
+        "product_id": product_id,
+        "status": "error",
+        "error": None,
+        "source": "offers",
+        "timings": {},
+    }
+    try:
+        with stage_timer(outcome["timings"], "offers"):
+            stats = save_offers_refresh(product_id, url, iter_offer_pages(url))
+        if stats is None:
+            outcome["error"] = "Save failed"
+        elif not stats.count:
+            outcome["error"] = "No offers fetched"
+        else:
+            outcome["status"] = "ok"
+    except Exception as e:
+        logger.error(f"Ошибка обновления цен {url}: {type(e).__name__}: {e}")
+        outcome["error"] = f"{type(e).__name__}: {e}"
+
+    return outcome
+
+
+def refresh_products(
+    urls: List[str],
+    force_static: bool = False,
+    concurrency: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Обновляет список товаров через refresh_product с ограниченной конкурентностью."""
+    concurrency = min(concurrency or settings.batch_scrape_concurrency, settings.batch_scrape_max_concurrency)
+    logger.info(f"Обновление цен: {len(urls)} ссылок, конкурентность {concurrency}")
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="refresh") as executor:
+        return list(executor.map(lambda url: refresh_product(url, force_static), urls))
+
+
+def scrape_offers_multi_city(url: str, city_ids: List[str]) -> Dict[str, Any]:
+    """
+    Собирает и сохраняет офферы одного товара по списку городов без рендера страницы.
+
+    Returns:
+        Словарь с product_id, saved и cities (city_id, offers_amount, price_min, price_max, offers)
+    """
+    product_id = extract_product_id_from_url(url)
+    offers_by_city = fetch_offers_multi_city(url, city_ids)
+
+    cities = []
+    for city_id, offers in offers_by_city.items():
+        stats = OfferStats()
+        stats.add(offers)
+        cities.append({"city_id": city_id, **stats.as_fields(), "offers": offers})
+
+    saved = save_city_offers(product_id, offers_by_city)
+    return {"product_id": product_id, "saved": saved, "cities": cities}
+
+
+def scrape_batch(
+    urls: List[str],
+    concurrency: Optional[int] = None,
+    save_group_size: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Скрапит список товаров параллельно и сохраняет результаты группами.
+
+    Args:
+        urls: Ссылки на товары
+        concurrency: Количество одновременно скрапящихся товаров
+        save_group_size: Сколько успешных результатов писать в БД одной транзакцией
+
+    Returns:
+        Результаты по каждой ссылке в порядке входного списка (без поля data)
+    """
+    concurrency = min(concurrency or settings.batch_scrape_concurrency, settings.batch_scrape_max_concurrency)
+    save_group_size = save_group_size or settings.batch_save_group_size
+    logger.info(f"Пакетный скрап: {len(urls)} ссылок, конкурентность {concurrency}")
+
+    outcomes: List[Optional[Dict[str, Any]]] = [None] * len(urls)
+    pending: List[Dict[str, Any]] = []
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="scrape") as executor:
+        futures = {executor.submit(scrape_product, url): index for index, url in enumerate(urls)}
+        for future in as_completed(futures):
+            outcome = future.result()
+            outcomes[futures[future]] = outcome
+            if outcome["status"] == "ok":
+                pending.append(outcome)
+            if len(pending) >= save_group_size:
+                _save_group(pending)
+                pending = []
+
+    if pending:
+        _save_group(pending)
+
+    for outcome in outcomes:
+        outcome.pop("data", None)
+    return outcomes
+
+
+def _save_group(group: List[Dict[str, Any]]) -> None:
+    """Пишет группу успешных результатов в файлы и БД, отмечая ошибки сохранения."""
+    items: List[Tuple[Dict[str, Any], str]] = [(o["data"], o["product_id"]) for o in group]
+
+    timings: Dict[str, float] = {}
+    with stage_timer(timings, "save"):
+        errors = save_scraped_batch(items)
+
+    for outcome in group:
+        outcome["timings"]["save"] = timings["save"]
+        error = errors.get(outcome["product_id"])
+        if error:
+            outcome["status"] = "error"
+            outcome["error"] = f"Save failed: {error}"
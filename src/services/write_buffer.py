@@ -0,0 +1,164 @@
+"""
+Буфер отложенной записи результатов скрапа (write-behind).
+
+Параллельные скрапы не открывают каждый свою транзакцию: результаты кладутся
+в ограниченную очередь, а фоновый поток записывает их группами через
+save_scraped_batch (JSON файлы и одна транзакция БД на группу). Группа
+записывается, когда набралось WRITE_BUFFER_FLUSH_SIZE результатов или прошло
+WRITE_BUFFER_FLUSH_INTERVAL секунд с первого результата группы. Если очередь
+заполнена (WRITE_BUFFER_MAX_PENDING), submit ждёт места — скрап замедляется
+вместо неограниченного роста памяти. При остановке очередь дописывается.
+"""
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.core.config import settings
+from src.core.metrics import write_buffer_batch_size, write_buffer_flush_duration
+from src.services.file_service import save_scraped_batch
+
+from logs.config_logs import setup_logging
+import logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# (scraped_data, product_id, future с текстом ошибки или None)
+_Item = Tuple[Dict[str, Any], str, Future]
+_STOP = object()
+
+
+class WriteBehindBuffer:
+    """Очередь результатов скрапа с групповой записью в фоновом потоке."""
+
+    def __init__(
+        self,
+        flush_size: int,
+        flush_interval: float,
+        max_pending: int,
+        save_batch: Callable[[List[Tuple[Dict[str, Any], str]]], Dict[str, Optional[str]]] = save_scraped_batch,
+    ):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.save_batch = save_batch
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def start(self) -> None:
+        """Запускает поток записи (вызывается и автоматически при первом submit)."""
+        with self._lock:
+            self._start_locked()
+
+    def _start_locked(self) -> None:
+        # После stop поток не перезапускается: поздние результаты пишутся сразу
+        if self._thread is not None or self._stopped:
+            return
+        self._thread = threading.Thread(target=self._loop, name="write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+        logger.info(
+            f"Буфер записи запущен: группы по {self.flush_size}, "
+            f"не реже раза в {self.flush_interval} с, очередь {self._queue.maxsize}"
+        )
+
+    def submit(self, scraped_data: Dict[str, Any], product_id: str) -> Future:
+        """
+        Ставит результат скрапа в очередь записи.
+
+        Блокируется, пока в очереди нет места. Возвращает Future, который
+        завершается после записи группы: None или текст ошибки сохранения.
+        """
+        future: Future = Future()
+        with self._lock:
+            # Проверка и постановка в очередь под одной блокировкой: stop() не может
+            # вклиниться между ними, и результат не окажется в очереди после _drain()
+            if not self._stopped:
+                self._start_locked()
+                self._queue.put((scraped_data, product_id, future))
+                return future
+
+        # После остановки (завершение приложения) пишем сразу, чтобы не потерять результат
+        self._save([(scraped_data, product_id, future)])
+        return future
+
+    def stop(self) -> None:
+        """Дописывает очередь и останавливает поток записи; повторно не запускается."""
+        with self._lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            thread = self._thread
+            if thread is not None:
+                self._queue.put(_STOP)
+        if thread is not None:
+            thread.join()
+        logger.info("Буфер записи остановлен, очередь записана")
+
+    def _loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._drain()
+                return
+
+            # Группа копится до flush_size или до истечения интервала с первого результата
+            batch: List[_Item] = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stopping = False
+            while len(batch) < self.flush_size:
+                try:
+                    next_item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if next_item is _STOP:
+                    stopping = True
+                    break
+                batch.append(next_item)
+
+            self._save(batch)
+            if stopping:
+                self._drain()
+                return
+
+    def _drain(self) -> None:
+        """Записывает всё, что осталось в очереди после сигнала остановки."""
+        batch: List[_Item] = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                batch.append(item)
+            if len(batch) >= self.flush_size:
+                self._save(batch)
+                batch = []
+        if batch:
+            self._save(batch)
+
+    def _save(self, batch: List[_Item]) -> None:
+        started = time.perf_counter()
+        try:
+            errors = self.save_batch([(scraped_data, product_id) for scraped_data, product_id, _ in batch])
+        except Exception as e:
+            logger.error(f"Буфер записи: не удалось записать группу из {len(batch)}: {e}")
+            errors = {product_id: str(e) for _, product_id, _ in batch}
+        elapsed = time.perf_counter() - started
+        write_buffer_flush_duration.observe(elapsed)
+        write_buffer_batch_size.observe(len(batch))
+        logger.info(f"Буфер записи: группа из {len(batch)} записана за {elapsed:.3f} с")
+
+        for _, product_id, future in batch:
+            future.set_result(errors.get(product_id))
+
+
+write_buffer = WriteBehindBuffer(
+    flush_size=settings.write_buffer_flush_size,
+    flush_interval=settings.write_buffer_flush_interval,
+    max_pending=settings.write_buffer_max_pending,
+)
@@ -0,0 +1,171 @@
+"""
+Фоновые задачи скрапа.
+
+Если задан CELERY_BROKER_URL, задачи уходят в Celery через Redis и выполняются
+воркерами (`celery -A src.tasks:celery_app worker`). Иначе используется
+локальный пул потоков внутри процесса приложения — для разработки и тестов.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from src.core.config import settings
+from src.services.scrape_service import run_scrape_job
+
+from logs.config_logs import setup_logging
+import logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Статусы задач, общие для Celery и локального исполнителя
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+celery_app = None
+
+if settings.celery_broker_url:
+    from celery import Celery
+    from celery.result import AsyncResult
+
+    celery_app = Celery(
+        "tzvr",
+        broker=settings.celery_broker_url,
+        backend=settings.celery_result_backend or settings.celery_broker_url,
+    )
+    celery_app.conf.update(
+        task_track_started=True,
+        result_expires=settings.job_result_ttl,
+        worker_prefetch_multiplier=1,
+    )
+
+    @celery_app.task(bind=True, name="tzvr.scrape_product")
+    def scrape_product_task(self, url: str) -> Dict[str, Any]:
+        def _progress(stage: str) -> None:
+            self.update_state(state="PROGRESS", meta={"stage": stage})
+
+        outcome = run_scrape_job(url, on_progress=_progress)
+        # Данные товара уже в БД — в бэкенде результатов храним только статус, тайминги и ошибку
+        outcome.pop("data", None)
+        return outcome
+
+
+class LocalJobQueue:
+    """Исполнитель задач в процессе приложения с хранением статусов в памяти."""
+
+    def __init__(self, workers: int, result_ttl: int):
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, url: str) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._evict_expired()
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "url": url,
+                "status": JOB_QUEUED,
+                "stage": None,
+                "result": None,
+                "error": None,
+                "finished_at": None,
+            }
+            self._executor.submit(self._run, job_id, url)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _update(self, job_id: str, **fields: Any) -> None:
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _run(self, job_id: str, url: str) -> None:
+        self._update(job_id, status=JOB_RUNNING)
+        try:
+            outcome = run_scrape_job(url, on_progress=lambda stage: self._update(job_id, stage=stage))
+        except Exception as e:
+            logger.error(f"Задача {job_id} упала: {type(e).__name__}: {e}")
+            self._update(job_id, status=JOB_FAILED, error=f"{type(e).__name__}: {e}", finished_at=time.time())
+            return
+
+        # Данные товара со всеми офферами уже в БД и в памяти не держатся
+        outcome.pop("data", None)
+        status = JOB_SUCCEEDED if outcome["status"] == "ok" else JOB_FAILED
+        self._update(job_id, status=status, stage=None, result=outcome, error=outcome["error"], finished_at=time.time())
+
+    def _evict_expired(self) -> None:
+        deadline = time.time() - self.result_ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["finished_at"] is not None and job["finished_at"] < deadline
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+local_jobs = LocalJobQueue(workers=settings.job_workers, result_ttl=settings.job_result_ttl)
+
+
+def submit_scrape_job(url: str) -> str:
+    """Ставит скрап товара в очередь и возвращает id задачи."""
+    if celery_app is not None:
+        return scrape_product_task.delay(url).id
+    return local_jobs.submit(url)
+
+
+def get_job_status(job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Возвращает статус задачи.
+
+    Returns:
+        Словарь с job_id, status, stage, result и error или None, если задача неизвестна
+    """
+    if celery_app is None:
+        job = local_jobs.get(job_id)
+        if job is not None:
+            job.pop("finished_at", None)
+        return job
+
+    # Celery не отличает неизвестную задачу от ожидающей — обе в состоянии PENDING
+    async_result = AsyncResult(job_id, app=celery_app)
+    job: Dict[str, Any] = {"job_id": job_id, "url": None, "status": JOB_QUEUED, "stage": None, "result": None, "error": None}
+
+    if async_result.state in ("STARTED", "PROGRESS"):
+        job["status"] = JOB_RUNNING
+        if isinstance(async_result.info, dict):
+            job["stage"] = async_result.info.get("stage")
+    elif async_result.state == "SUCCESS":
+        outcome = async_result.result
+        job["url"] = outcome.get("url")
+        job["result"] = outcome
+        job["error"] = outcome.get("error")
+        job["status"] = JOB_SUCCEEDED if outcome.get("status") == "ok" else JOB_FAILED
+    elif async_result.state == "FAILURE":
+        job["status"] = JOB_FAILED
+        job["error"] = str(async_result.info)
+
+    return job
+
+
+def shutdown_jobs() -> None:
+    """Останавливает локальный исполнитель задач при завершении приложения."""
+    local_jobs.shutdown()
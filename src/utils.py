@@ -1,11 +1,17 @@
-from typing import Optional
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, Optional
 from urllib.parse import urlparse, parse_qs
 import re
+import time
 import logging
 
+from src.core.metrics import scrape_stage_duration
+
 logger = logging.getLogger(__name__)
 
 PRICE_RE = re.compile(r"[\d\s]+")  # для извлечения чисел из текста цены
+DEFAULT_CITY_ID = "750000000"  # Алматы
 
 
 def remove_general_if_duplicate(attributes: dict) -> dict:
@@ -14,6 +20,9 @@ def remove_general_if_duplicate(attributes: dict) -> dict:
     
     Удаляет ключи-группы (например, "Фотокамера и мультимедиа"), если их содержимое
     дублируется в отдельных детализированных ключах.
+
+    Все отдельные ключи ищутся в тексте группы за один проход автоматом
+    Ахо-Корасик, текст каждой группы приводится к нижнему регистру один раз.
     
     Args:
         attributes: Словарь атрибутов товара
@@ -44,87 +53,110 @@ def remove_general_if_duplicate(attributes: dict) -> dict:
             # Обычные отдельные ключи
             individual_keys.add(key)
     
-    logger.info(f"Найдено отдельных ключей: {len(individual_keys)}")
-    logger.info(f"Найдено групповых ключей: {len(group_keys)}")
+    logger.debug(f"Найдено отдельных ключей: {len(individual_keys)}")
+    logger.debug(f"Найдено групповых ключей: {len(group_keys)}")
     
     # Проверяем каждую группу на дубликаты
     keys_to_remove = set()
+    matcher = _KeyMatcher(individual_keys) if group_keys else None
     
     for group_key in group_keys:
-        group_value = str(attributes[group_key])
-        logger.info(f"\nАнализируем группу: '{group_key}'")
-        
         # Подсчитываем сколько отдельных ключей содержится в тексте группы
-        found_keys = []
-        
-        for individual_key in individual_keys:
-            if not individual_key or individual_key == group_key:
-                continue
-                
-            # Очищаем ключ от лишних символов для поиска
-            clean_key = individual_key.strip().rstrip(':')
-            
-            # Ищем ключ в тексте группы различными способами
-            if _key_found_in_text(clean_key, group_value):
-                found_keys.append(individual_key)
+        found_keys = matcher.find(str(attributes[group_key]))
+        found_keys.discard(group_key)
         
         # Если в группе найдено много отдельных ключей - это дубликат
         if len(found_keys) >= 3:  # Порог: если 3+ ключа найдены в тексте группы
-            logger.info(f"  ✗ Группа '{group_key}' содержит {len(found_keys)} отдельных ключей: {found_keys[:5]}...")
+            logger.debug(f"Группа '{group_key}' содержит {len(found_keys)} отдельных ключей")
             keys_to_remove.add(group_key)
         else:
-            logger.info(f"  ✓ Группа '{group_key}' уникальна (найдено ключей: {len(found_keys)})")
+            logger.debug(f"Группа '{group_key}' уникальна (найдено ключей: {len(found_keys)})")
     
     # Также удаляем ключи "Общие" и похожие
     general_keys = [k for k in attributes.keys() if k and 'общ' in k.lower()]
     keys_to_remove.update(general_keys)
     
-    if general_keys:
-        logger.info(f"\nУдаляем общие ключи: {general_keys}")
-    
     # Удаляем найденные дубликаты
     for key in keys_to_remove:
         cleaned_attributes.pop(key, None)
     
-    logger.info(f"\nРезультат: удалено {len(keys_to_remove)} ключей, осталось {len(cleaned_attributes)}")
+    logger.info(f"Результат: удалено {len(keys_to_remove)} ключей, осталось {len(cleaned_attributes)}")
     if keys_to_remove:
         logger.info(f"Удаленные ключи: {list(keys_to_remove)}")
     
     return cleaned_attributes
 
 
-def _key_found_in_text(key: str, text: str) -> bool:
+class _KeyMatcher:
     """
-    Проверяет, содержится ли ключ в тексте различными способами.
-    
-    Args:
-        key: Ключ для поиска
-        text: Текст для поиска
-        
-    Returns:
-        True если ключ найден
+    Автомат Ахо-Корасик по отдельным ключам атрибутов.
+
+    Ключ считается найденным в тексте, если в
+    тексте в нижнем регистре встречается сам ключ в нижнем регистре или — для
+    ключей из нескольких слов — ключ с пробелами, схлопнутыми до одного.
     """
-    if not key or not text:
-        return False
-    
-    key_lower = key.lower()
-    text_lower = text.lower()
-    
-    # Точное совпадение
-    if key_lower in text_lower:
-        return True
-    
-    # Поиск как отдельное слово
-    words_in_text = text_lower.split()
-    key_words = key_lower.split()
-    
-    # Если ключ состоит из одного слова
-    if len(key_words) == 1:
-        return key_lower in words_in_text
-    
-    # Если ключ состоит из нескольких слов - ищем последовательность
-    key_phrase = ' '.join(key_words)
-    return key_phrase in text_lower
+
+    def __init__(self, keys) -> None:
+        self._goto: list = [{}]
+        self._outputs: list = [set()]
+
+        for key in keys:
+            if not key:
+                continue
+            # Ключ очищается от лишних символов для поиска
+            key_lower = key.strip().rstrip(':').lower()
+            if not key_lower:
+                continue
+            key_words = key_lower.split()
+            patterns = {key_lower}
+            if len(key_words) > 1:
+                patterns.add(' '.join(key_words))
+            for pattern in patterns:
+                self._add(pattern, key)
+
+        self._build_failure_links()
+
+    def _add(self, pattern: str, key: str) -> None:
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._outputs.append(set())
+            state = next_state
+        self._outputs[state].add(key)
+
+    def _build_failure_links(self) -> None:
+        self._fail = [0] * len(self._goto)
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fallback = self._goto[fail].get(char, 0)
+                self._fail[next_state] = fallback if fallback != next_state else 0
+                # Выходы суффиксных состояний наследуются — при поиске хватает посещённых состояний
+                self._outputs[next_state] |= self._outputs[self._fail[next_state]]
+
+    def find(self, text: str) -> set:
+        """Возвращает множество ключей, найденных в тексте."""
+        goto, fail = self._goto, self._fail
+        visited = set()
+        state = 0
+        for char in text.lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            visited.add(state)
+
+        found = set()
+        for state in visited:
+            found |= self._outputs[state]
+        return found
 
 
 def parse_price(text: Optional[str]) -> Optional[float]:
@@ -145,9 +177,9 @@ def extract_product_id_from_url(url: str):
     
     return product_id
     
-def extract_city_id_from_url(url: str):
-    match_city = re.search(r'[?&]c=(\d+)', url)
-    city_id = match_city.group(1) # if match_city else "750000000"  # Алматы по умолчанию
+def extract_city_id_from_url(url: str) -> str:
+    match_city = re.search(r'[?&]c=(\d+)', url or "")
+    city_id = match_city.group(1) if match_city else DEFAULT_CITY_ID
     return city_id
 
 
@@ -179,3 +211,46 @@ def is_valid_kaspi_url(url: str) -> bool:
         return True
     except Exception:
         return False
+
+
+@dataclass
+class OfferStats:
+    """Число офферов и диапазон цен, накапливаемые по мере поступления страниц."""
+    count: int = 0
+    price_min: Optional[float] = None
+    price_max: Optional[float] = None
+
+    def add(self, offers: Iterable[Dict[str, Any]]) -> None:
+        for offer in offers:
+            self.count += 1
+            price = offer.get("price")
+            if not isinstance(price, (int, float)):
+                continue
+            if self.price_min is None or price < self.price_min:
+                self.price_min = price
+            if self.price_max is None or price > self.price_max:
+                self.price_max = price
+
+    def as_fields(self) -> Dict[str, Any]:
+        """Поля результата скрапа: price_min, price_max, offers_amount."""
+        return {"price_min": self.price_min, "price_max": self.price_max, "offers_amount": self.count}
+
+
+@contextmanager
+def stage_timer(timings: Optional[Dict[str, float]], stage: str) -> Iterator[None]:
+    """
+    Замеряет длительность этапа скрапа и записывает её в словарь timings
+    и в гистограмму scrape_stage_duration_seconds.
+
+    Args:
+        timings: Словарь "этап -> секунды"; если None, замер не сохраняется
+        stage: Название этапа
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        scrape_stage_duration.observe(elapsed, stage)
+        if timings is not None:
+            timings[stage] = round(elapsed, 3)
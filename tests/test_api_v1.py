@@ -0,0 +1,53 @@
+"""Ответы /parser/scrape-props в зависимости от записи через буфер."""
+from concurrent.futures import Future
+
+import pytest
+from fastapi import HTTPException
+
+from src.core.config import settings
+from src.routers import api_v1
+from src.schemas import SeedRequest
+from src.services.write_buffer import WriteBehindBuffer
+
+URL = "https://kaspi.kz/shop/p/test-product-100200300/?c=750000000"
+
+
+@pytest.fixture
+def save_errors(monkeypatch):
+    """Подменяет парсер и буфер записи; возвращает ошибки сохранения по товарам."""
+    errors = {}
+
+    def save_batch(items):
+        return {product_id: errors.get(product_id) for _, product_id in items}
+
+    buffer = WriteBehindBuffer(flush_size=1, flush_interval=60, max_pending=10, save_batch=save_batch)
+    monkeypatch.setattr(api_v1, "parse_kaspi_product_with_bs", lambda url, **kwargs: {"url": url, "name": "Тест"})
+    monkeypatch.setattr(api_v1, "write_buffer", buffer)
+    yield errors
+    buffer.stop()
+
+
+def test_scrape_props_returns_data_after_write(save_errors):
+    assert api_v1.scrape_props(SeedRequest(product_url=URL)) == {"url": URL, "name": "Тест"}
+
+
+def test_scrape_props_reports_save_failure(save_errors):
+    save_errors["100200300"] = "db down"
+
+    with pytest.raises(HTTPException) as exc:
+        api_v1.scrape_props(SeedRequest(product_url=URL))
+
+    assert exc.value.status_code == 500
+    assert exc.value.detail == "Save failed: db down"
+
+
+def test_scrape_props_reports_write_timeout(save_errors, monkeypatch):
+    never = Future()
+    monkeypatch.setattr(api_v1.write_buffer, "submit", lambda scraped_data, product_id: never)
+    monkeypatch.setattr(settings, "write_buffer_result_timeout", 0.01)
+
+    with pytest.raises(HTTPException) as exc:
+        api_v1.scrape_props(SeedRequest(product_url=URL))
+
+    assert exc.value.status_code == 500
+    assert exc.value.detail == "Save failed: not written within 0.01 s"
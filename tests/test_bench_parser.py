@@ -0,0 +1,26 @@
+"""Проверка регрессий в офлайн-бенчмарке парсера."""
+import json
+import os
+
+from benchmarks import bench_parser
+from benchmarks.bench_parser import STAGES, build_stages, find_regressions
+
+
+def test_stage_names_match_stages_and_committed_baseline():
+    with open(os.path.join(bench_parser.BENCH_DIR, "baseline.json"), encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    assert tuple(build_stages([], [], [])) == STAGES
+    assert set(baseline) == set(STAGES)
+
+
+def test_regressions_above_threshold_and_noise_floor():
+    baseline = {"extract": {"ms_per_item": 10.0, "peak_alloc_mib": 1.0}, "dedupe": {"ms_per_item": 0.01, "peak_alloc_mib": 0.005}}
+    results = {
+        "extract": {"ms_per_item": 13.0, "peak_alloc_mib": 1.1},
+        # Рост в разы, но в пределах шума
+        "dedupe": {"ms_per_item": 0.04, "peak_alloc_mib": 0.006},
+        "offers": {"ms_per_item": 99.0, "peak_alloc_mib": 9.0},
+    }
+
+    assert find_regressions(results, baseline, threshold=0.25) == ["extract.ms_per_item: 10.0 -> 13.0 (+30%)"]
@@ -0,0 +1,97 @@
+"""Сетевая статистика рендера и оценка объёма заблокированных запросов."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src.core.config import settings
+from src.services import browser_pool
+from src.services.browser_pool import _ResponseSizes, apply_request_profile
+
+PAGE_URL = "https://kaspi.kz/shop/p/test-100/"
+IMAGE_URL = "https://resources.cdn-kaspi.kz/img/1.jpg"
+COUNTER_URL = "https://mc.yandex.ru/watch.js"
+
+
+class FakeRoute:
+    def __init__(self, url: str, resource_type: str):
+        self.request = SimpleNamespace(url=url, resource_type=resource_type)
+        self.outcome = None
+
+    async def continue_(self):
+        self.outcome = "continued"
+
+    async def abort(self):
+        self.outcome = "aborted"
+
+
+class FakePage:
+    """Страница, которая загружает заданные запросы через перехватчик профиля."""
+
+    def __init__(self):
+        self.handlers = {}
+        self.route_handler = None
+
+    def on(self, event, handler):
+        self.handlers[event] = handler
+
+    async def route(self, pattern, handler):
+        self.route_handler = handler
+
+    async def load(self, requests):
+        for url, resource_type, size in requests:
+            route = FakeRoute(url, resource_type)
+            if self.route_handler is not None:
+                await self.route_handler(route)
+                if route.outcome == "aborted":
+                    continue
+            self.handlers["response"](SimpleNamespace(url=url, headers={"content-length": str(size)}))
+
+
+REQUESTS = [(PAGE_URL, "document", 4096), (IMAGE_URL, "image", 20480), (COUNTER_URL, "script", 2048)]
+
+
+@pytest.fixture
+def sizes(monkeypatch):
+    sizes = _ResponseSizes()
+    monkeypatch.setattr(browser_pool, "response_sizes", sizes)
+    return sizes
+
+
+def _render(lean: bool, monkeypatch) -> dict:
+    monkeypatch.setattr(settings, "browser_lean_profile", lean)
+
+    async def run():
+        page = FakePage()
+        stats = await apply_request_profile(page)
+        await page.load(REQUESTS)
+        stats.mark_ready()
+        return stats.as_dict()
+
+    return asyncio.run(run())
+
+
+def test_full_profile_loads_everything_and_records_sizes(sizes, monkeypatch):
+    stats = _render(False, monkeypatch)
+
+    assert (stats["lean_profile"], stats["loaded_requests"], stats["loaded_kb"]) == (False, 3, 26.0)
+    assert stats["blocked_requests"] == 0
+    assert sizes.get(IMAGE_URL) == 20480
+
+
+def test_lean_profile_estimates_blocked_bytes_from_earlier_renders(sizes, monkeypatch):
+    unknown = _render(True, monkeypatch)
+    _render(False, monkeypatch)
+    estimated = _render(True, monkeypatch)
+
+    assert unknown["blocked_by_reason"] == {"image": 1, "third-party": 1}
+    assert (unknown["blocked_kb"], unknown["blocked_unsized"]) == (0, 2)
+    assert (estimated["loaded_kb"], estimated["blocked_kb"], estimated["blocked_unsized"]) == (4.0, 22.0, 0)
+
+
+def test_response_sizes_keep_latest_urls():
+    sizes = _ResponseSizes(max_entries=2)
+    for url, size in (("a", 1), ("b", 2), ("a", 3), ("c", 4)):
+        sizes.record(url, size)
+
+    assert (sizes.get("a"), sizes.get("b"), sizes.get("c")) == (3, None, 4)
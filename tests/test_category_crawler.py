@@ -0,0 +1,68 @@
+"""Обход листинга категории и пропуск товаров, уже сохранённых в БД."""
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from src.models import Product
+from src.services import category_crawler
+from src.services.category_crawler import discover_category_products, known_product_ids
+
+CATEGORY_URL = "https://kaspi.kz/shop/c/smartphones/?c=750000000"
+
+
+def _listing(*product_ids: int) -> str:
+    return "".join(f'<a href="/shop/p/phone-{product_id}/">x</a>' for product_id in product_ids)
+
+
+@pytest.fixture
+def listing(monkeypatch):
+    """Подменяет загрузку страниц листинга; возвращает список загруженных номеров страниц."""
+    pages = {1: _listing(1, 2, 2, 3), 2: _listing(3, 4), 3: _listing(3, 4)}
+    loaded = []
+
+    def fake_get_page(url, timeout=None):
+        page = int(url.rsplit("page=", 1)[1])
+        loaded.append(page)
+        return SimpleNamespace(status_code=200, text=pages.get(page, ""))
+
+    monkeypatch.setattr(category_crawler, "get_page", fake_get_page)
+    return loaded
+
+
+@pytest.fixture
+def stored(pg_session, monkeypatch):
+    """Товары 2 и 4 уже в БД; запросы crawler идут в тестовую БД."""
+    for kaspi_id in ("2", "4"):
+        pg_session.add(Product(kaspi_id=kaspi_id, url=f"https://kaspi.kz/shop/p/phone-{kaspi_id}/", name="Тест"))
+    pg_session.commit()
+    monkeypatch.setattr(category_crawler, "SessionLocal", sessionmaker(bind=pg_session.get_bind()))
+    return pg_session
+
+
+def test_discovery_yields_each_product_once_and_stops_on_repeated_page(listing):
+    urls = list(discover_category_products(CATEGORY_URL, max_pages=10))
+
+    assert urls == [f"https://kaspi.kz/shop/p/phone-{product_id}/?c=750000000" for product_id in (1, 2, 3, 4)]
+    assert listing == [1, 2, 3]
+
+
+def test_known_product_ids_checks_only_given_ids(stored):
+    assert known_product_ids({1, 2, 3, 4}) == {2, 4}
+    assert known_product_ids(set()) == set()
+
+
+def test_discovery_skips_stored_products_page_by_page(stored, listing, monkeypatch):
+    queried = []
+
+    def spy(product_ids):
+        queried.append(set(product_ids))
+        return known_product_ids(product_ids)
+
+    monkeypatch.setattr(category_crawler, "known_product_ids", spy)
+
+    urls = list(discover_category_products(CATEGORY_URL, max_pages=10, skip_known=True))
+
+    assert urls == [f"https://kaspi.kz/shop/p/phone-{product_id}/?c=750000000" for product_id in (1, 3)]
+    # Каждая страница проверяется одним запросом и только по ещё не встреченным id
+    assert queried == [{1, 2, 3}, {4}]
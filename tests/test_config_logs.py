@@ -0,0 +1,46 @@
+"""Ограничение частоты логов CallSiteRateLimitFilter."""
+import logging
+from types import SimpleNamespace
+
+from logs import config_logs
+from logs.config_logs import CallSiteRateLimitFilter
+
+
+def _record(name: str, level: int = logging.INFO, lineno: int = 10) -> logging.LogRecord:
+    return logging.LogRecord(name, level, "/src/module.py", lineno, "сообщение", None, None)
+
+
+def test_only_listed_loggers_and_their_children_are_limited():
+    log_filter = CallSiteRateLimitFilter(limit=1, window=60, loggers=["src.services.kaspi_parser"])
+
+    assert [log_filter.filter(_record("src.services.kaspi_parser")) for _ in range(3)] == [True, False, False]
+    assert log_filter.filter(_record("src.services.kaspi_parser.offers", lineno=11))
+    assert not log_filter.filter(_record("src.services.kaspi_parser.offers", lineno=11))
+    # Соседние логгеры с тем же префиксом и остальные сервисы не ограничиваются
+    assert all(log_filter.filter(_record("src.services.kaspi_parser_v2", lineno=12)) for _ in range(3))
+    assert all(log_filter.filter(_record("src.services.write_buffer", lineno=13)) for _ in range(3))
+
+
+def test_warnings_are_never_dropped():
+    log_filter = CallSiteRateLimitFilter(limit=1, window=60, loggers=["src"])
+
+    assert all(log_filter.filter(_record("src", logging.WARNING)) for _ in range(3))
+
+
+def test_next_window_reports_suppressed_records(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(config_logs, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    log_filter = CallSiteRateLimitFilter(limit=2, window=60, loggers=["src"])
+
+    assert [log_filter.filter(_record("src")) for _ in range(5)] == [True, True, False, False, False]
+
+    now[0] += 60
+    record = _record("src")
+    assert log_filter.filter(record)
+    assert record.msg == "сообщение [пропущено похожих записей: 3]"
+
+
+def test_zero_limit_disables_filtering():
+    log_filter = CallSiteRateLimitFilter(limit=0, window=60, loggers=["src"])
+
+    assert all(log_filter.filter(_record("src")) for _ in range(50))
@@ -0,0 +1,51 @@
+"""Чтение предложений в crud через асинхронный движок (нужен TEST_DATABASE_URL)."""
+import asyncio
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from src import crud
+from src.core.dependencies import async_database_url
+from src.models import Product, ProductOffer
+
+
+def _run_crud(pg_session, query):
+    """Выполняет корутину query(db) в асинхронной сессии на той же тестовой БД."""
+    url = pg_session.get_bind().url.render_as_string(hide_password=False)
+
+    async def go():
+        engine = create_async_engine(async_database_url(url))
+        try:
+            async with AsyncSession(engine) as db:
+                return await query(db)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(go())
+
+
+def test_cheapest_and_most_expensive_offers_are_per_city(pg_session):
+    product = Product(kaspi_id="100", url="u", name="Тест")
+    pg_session.add(product)
+    pg_session.flush()
+    pg_session.add_all([
+        ProductOffer(product_id=product.id, seller_name="A", price=100, city_id="750000000"),
+        ProductOffer(product_id=product.id, seller_name="B", price=300, city_id="750000000"),
+        ProductOffer(product_id=product.id, seller_name="C", price=10, city_id="710000000"),
+        ProductOffer(product_id=product.id, seller_name="D", price=900, city_id="710000000"),
+    ])
+    pg_session.commit()
+
+    async def query(db):
+        return (
+            await crud.get_cheapest_offer_for_product(db, product.id),
+            await crud.get_most_expensive_offer_for_product(db, product.id),
+            await crud.get_cheapest_offer_for_product(db, product.id, city_id="710000000"),
+            await crud.get_product_offers(db, product.id, city_id="710000000"),
+        )
+
+    cheapest, most_expensive, cheapest_astana, astana = _run_crud(pg_session, query)
+
+    # По умолчанию — офферы Алматы
+    assert (cheapest.seller_name, most_expensive.seller_name) == ("A", "B")
+    assert cheapest_astana.seller_name == "C"
+    assert [offer.seller_name for offer in astana] == ["C", "D"]
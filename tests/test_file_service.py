@@ -0,0 +1,341 @@
+"""
+Запись продуктов и постраничное обновление предложений в file_service.
+
+Сверка предложений пишется запросами PostgreSQL (unnest, ON CONFLICT в CTE) и
+проверяется только с TEST_DATABASE_URL.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+
+from src.models import Product, ProductAttribute, ProductImage, ProductOffer, ProductOfferHistory
+from src.services import file_service
+from src.services.file_service import (
+    _OffersUpsert,
+    _save_product_attributes,
+    _save_product_images,
+    _save_product_offers,
+    _upsert_products,
+)
+
+CITY = "750000000"
+OTHER_CITY = "710000000"
+
+
+def _product(session) -> int:
+    product = Product(kaspi_id="100", url="https://kaspi.kz/shop/p/test-100/", name="Тест")
+    session.add(product)
+    session.flush()
+    return product.id
+
+
+def _offers(session, product_id: int, city_id: str = CITY) -> dict:
+    rows = session.execute(
+        select(ProductOffer.seller_name, ProductOffer.price)
+        .where(ProductOffer.product_id == product_id, ProductOffer.city_id == city_id)
+    ).all()
+    return dict(rows)
+
+
+def _history(session) -> list:
+    return sorted(session.execute(
+        select(ProductOfferHistory.old_price, ProductOfferHistory.new_price)
+    ).all())
+
+
+def test_upsert_inserts_updates_and_records_history(pg_session):
+    product_id = _product(pg_session)
+    _save_product_offers(pg_session, product_id, [
+        {"merchant_name": "A", "price": 100},
+        {"merchant_name": "B", "price": 200},
+    ], CITY)
+    assert _offers(pg_session, product_id) == {"A": 100, "B": 200}
+    assert _history(pg_session) == []
+
+    _save_product_offers(pg_session, product_id, [
+        {"merchant_name": "A", "price": 90},
+        {"merchant_name": "B", "price": 200},
+    ], CITY)
+    assert _offers(pg_session, product_id) == {"A": 90, "B": 200}
+    assert _history(pg_session) == [(100, 90)]
+
+
+def test_upsert_pages_keep_offers_and_finish_deletes_missing(pg_session):
+    product_id = _product(pg_session)
+    _save_product_offers(pg_session, product_id, [
+        {"merchant_name": "A", "price": 100},
+        {"merchant_name": "B", "price": 200},
+        {"merchant_name": "C", "price": 300},
+    ], CITY)
+
+    upsert = _OffersUpsert(pg_session, product_id, CITY, seen_at=datetime.utcnow() + timedelta(seconds=1))
+    upsert.add([{"merchant_name": "A", "price": 110}])
+    upsert.add([{"merchant_name": "C", "price": 300}, {"merchant_name": "D", "price": 400}])
+    # До finish предложения, не встреченные на страницах, ещё на месте
+    assert set(_offers(pg_session, product_id)) == {"A", "B", "C", "D"}
+
+    upsert.finish()
+    assert _offers(pg_session, product_id) == {"A": 110, "C": 300, "D": 400}
+
+
+def test_upsert_keeps_price_when_missing_in_data(pg_session):
+    product_id = _product(pg_session)
+    _save_product_offers(pg_session, product_id, [{"merchant_name": "A", "price": 100}], CITY)
+    _save_product_offers(pg_session, product_id, [{"merchant_name": "A", "price": None}], CITY)
+
+    assert _offers(pg_session, product_id) == {"A": 100}
+    assert _history(pg_session) == []
+
+
+def test_upsert_is_scoped_to_city(pg_session):
+    product_id = _product(pg_session)
+    _save_product_offers(pg_session, product_id, [{"merchant_name": "A", "price": 100}], CITY)
+    _save_product_offers(pg_session, product_id, [{"merchant_name": "B", "price": 50}], OTHER_CITY)
+
+    assert _offers(pg_session, product_id) == {"A": 100}
+    assert _offers(pg_session, product_id, OTHER_CITY) == {"B": 50}
+
+
+def test_empty_page_writes_nothing(pg_session):
+    product_id = _product(pg_session)
+    _save_product_offers(pg_session, product_id, [{"merchant_name": "A", "price": 100}], CITY)
+
+    upsert = _OffersUpsert(pg_session, product_id, CITY)
+    upsert.add([])
+    upsert.add(["не словарь"])
+    assert _offers(pg_session, product_id) == {"A": 100}
+
+
+def test_not_fetched_offers_are_left_untouched(pg_session):
+    product_id = _product(pg_session)
+    _save_product_offers(pg_session, product_id, [{"merchant_name": "A", "price": 100}], CITY)
+
+    _save_product_offers(pg_session, product_id, None, CITY)
+    assert _offers(pg_session, product_id) == {"A": 100}
+
+
+def test_empty_offers_list_removes_stale_offers(pg_session):
+    product_id = _product(pg_session)
+    _save_product_offers(pg_session, product_id, [{"merchant_name": "A", "price": 100}], CITY)
+
+    # Пустой список — офферы загружены, и продавцов больше нет
+    _save_product_offers(pg_session, product_id, [], CITY)
+    assert _offers(pg_session, product_id) == {}
+
+
+def _stored_product(session, kaspi_id: str) -> Product:
+    session.expire_all()
+    return session.execute(select(Product).where(Product.kaspi_id == kaspi_id)).scalar_one()
+
+
+def test_upsert_products_inserts_and_updates_in_one_statement(db_session):
+    ids = _upsert_products(db_session, [
+        ({"url": "u1", "name": "Первый", "category": "Телефоны", "price_min": 100, "offers_amount": 2}, "1"),
+        ({"url": "u2", "name": "Второй", "category": "Ноутбуки", "price_min": 300, "offers_amount": 1}, "2"),
+    ])
+    assert set(ids) == {"1", "2"}
+
+    again = _upsert_products(db_session, [
+        ({"url": "u1", "name": "Первый v2", "category": None, "price_min": 90, "offers_amount": 3}, "1"),
+    ])
+
+    assert again == {"1": ids["1"]}
+    product = _stored_product(db_session, "1")
+    assert (product.name, product.price_min, product.offers_count) == ("Первый v2", 90, 3)
+    # Не извлечённая категория не затирает сохранённую
+    assert product.category == "Телефоны"
+
+
+def _images(session, product_id: int) -> list:
+    return sorted(session.execute(
+        select(ProductImage.image_url).where(ProductImage.product_id == product_id)
+    ).scalars())
+
+
+def _attributes(session, product_id: int) -> dict:
+    return dict(session.execute(
+        select(ProductAttribute.attribute_name, ProductAttribute.attribute_value)
+        .where(ProductAttribute.product_id == product_id)
+    ).all())
+
+
+def test_images_diff_inserts_new_and_deletes_missing(db_session):
+    product_id = _product(db_session)
+    first = _save_product_images(db_session, {product_id: ["a.jpg", "b.jpg", "", "b.jpg"]})
+    assert (first.inserted, first.updated, first.deleted) == (2, 0, 0)
+
+    unchanged = _save_product_images(db_session, {product_id: ["a.jpg", "b.jpg"]})
+    assert str(unchanged) == "+0 ~0 -0"
+
+    changed = _save_product_images(db_session, {product_id: ["b.jpg", "c.jpg"]})
+    assert (changed.inserted, changed.deleted) == (1, 1)
+    assert _images(db_session, product_id) == ["b.jpg", "c.jpg"]
+
+
+def test_images_diff_removes_stored_duplicates(db_session):
+    product_id = _product(db_session)
+    db_session.add_all([ProductImage(product_id=product_id, image_url="a.jpg") for _ in range(3)])
+    db_session.flush()
+
+    changes = _save_product_images(db_session, {product_id: ["a.jpg"]})
+
+    assert (changes.inserted, changes.deleted) == (0, 2)
+    assert _images(db_session, product_id) == ["a.jpg"]
+
+
+def test_attributes_diff_updates_changed_values_only(db_session):
+    product_id = _product(db_session)
+    first = _save_product_attributes(db_session, {product_id: {"Цвет": "чёрный", "Экран": {"Тип": "OLED", "Диагональ": "6.1"}}})
+    assert (first.inserted, first.updated, first.deleted) == (3, 0, 0)
+
+    changes = _save_product_attributes(db_session, {product_id: {"Цвет": "белый", "Экран": {"Тип": "OLED"}, "Вес": None}})
+
+    assert (changes.inserted, changes.updated, changes.deleted) == (1, 1, 1)
+    assert _attributes(db_session, product_id) == {"Цвет": "белый", "Экран.Тип": "OLED", "Вес": ""}
+
+
+def test_attributes_diff_removes_duplicate_names(db_session):
+    product_id = _product(db_session)
+    db_session.add_all([
+        ProductAttribute(product_id=product_id, attribute_name="Цвет", attribute_value="чёрный"),
+        ProductAttribute(product_id=product_id, attribute_name="Цвет", attribute_value="белый"),
+    ])
+    db_session.flush()
+
+    changes = _save_product_attributes(db_session, {product_id: {"Цвет": "чёрный"}})
+
+    assert changes.deleted == 1
+    assert _attributes(db_session, product_id) == {"Цвет": "чёрный"}
+
+
+def test_product_without_offers_keeps_stored_offer_count(db_session):
+    ids = _upsert_products(db_session, [({"url": "u1", "name": "Первый", "offers_amount": 4}, "1")])
+    _upsert_products(db_session, [({"url": "u1", "name": "Первый"}, "1")])
+    _upsert_products(db_session, [({"url": "u2", "name": "Второй"}, "2")])
+
+    assert _stored_product(db_session, "1").offers_count == 4
+    assert _stored_product(db_session, "2").offers_count == 0
+    assert ids["1"] == _stored_product(db_session, "1").id
+
+
+def test_missing_rating_keeps_stored_rating(db_session):
+    _upsert_products(db_session, [({"url": "u1", "name": "Первый", "rating": 4.8, "reviews_count": 120}, "1")])
+    # HTTP-скрап без рендера не знает рейтинга
+    _upsert_products(db_session, [({"url": "u1", "name": "Первый", "rating": None, "reviews_count": None}, "1")])
+
+    product = _stored_product(db_session, "1")
+    assert (product.rating, product.reviews_count) == (4.8, 120)
+
+    _upsert_products(db_session, [({"url": "u1", "name": "Первый", "rating": 4.5}, "1")])
+    assert _stored_product(db_session, "1").rating == 4.5
+
+
+def test_missing_prices_keep_stored_prices(db_session):
+    _upsert_products(db_session, [({"url": "u1", "name": "Первый", "price_min": 100, "price_max": 150}, "1")])
+    # Скрап без офферов не знает диапазона цен
+    _upsert_products(db_session, [({"url": "u1", "name": "Первый"}, "1")])
+
+    product = _stored_product(db_session, "1")
+    assert (product.price_min, product.price_max) == (100, 150)
+
+
+@pytest.fixture
+def stream_db(pg_session, tmp_path, monkeypatch):
+    """save_scraped_stream на тестовой БД; файлы экспорта пишутся во временный каталог."""
+    monkeypatch.setattr(file_service, "SessionLocal", sessionmaker(bind=pg_session.get_bind(), autoflush=False))
+    monkeypatch.chdir(tmp_path)
+    return pg_session
+
+
+STREAM_DATA = {"url": "https://kaspi.kz/shop/p/test-100/?c=750000000", "name": "Тест", "attributes": {"Цвет": "чёрный"}}
+
+
+def test_stream_commits_each_page_before_fetching_the_next(stream_db):
+    committed = []
+
+    def pages():
+        yield [{"merchant_name": "A", "price": 100}, {"merchant_name": "B", "price": 200}]
+        # Пока грузится следующая страница, предыдущая уже зафиксирована
+        with file_service.SessionLocal() as other:
+            committed.append(other.execute(select(ProductOffer.seller_name)).scalars().all())
+        yield [{"merchant_name": "C", "price": 50}]
+
+    stats = file_service.save_scraped_stream(dict(STREAM_DATA), "100", pages())
+
+    assert (stats.count, stats.price_min, stats.price_max) == (3, 50, 200)
+    assert sorted(committed[0]) == ["A", "B"]
+    product = _stored_product(stream_db, "100")
+    assert (product.price_min, product.price_max, product.offers_count) == (50, 200, 3)
+    assert _offers(stream_db, product.id) == {"A": 100, "B": 200, "C": 50}
+
+
+def test_stream_failure_keeps_product_and_stored_offers(stream_db):
+    file_service.save_scraped_stream(dict(STREAM_DATA), "100", iter([[{"merchant_name": "A", "price": 100}]]))
+
+    def failing_pages():
+        yield [{"merchant_name": "B", "price": 90}]
+        raise RuntimeError("offers API down")
+
+    stats = file_service.save_scraped_stream(dict(STREAM_DATA, name="Тест v2"), "100", failing_pages())
+
+    assert stats is None
+    product = _stored_product(stream_db, "100")
+    assert product.name == "Тест v2"
+    # Без последней страницы пропавшие офферы не удаляются
+    assert _offers(stream_db, product.id) == {"A": 100, "B": 90}
+
+
+def test_stream_without_pages_leaves_offers_and_prices(stream_db):
+    file_service.save_scraped_stream(dict(STREAM_DATA), "100", iter([[{"merchant_name": "A", "price": 100}]]))
+
+    stats = file_service.save_scraped_stream(dict(STREAM_DATA), "100", iter([]))
+
+    assert stats.count == 0
+    product = _stored_product(stream_db, "100")
+    assert (product.price_min, product.offers_count) == (100, 1)
+    assert _offers(stream_db, product.id) == {"A": 100}
+
+
+def test_refresh_commits_each_page_and_updates_prices(stream_db):
+    file_service.save_scraped_stream(dict(STREAM_DATA), "100", iter([[{"merchant_name": "A", "price": 100}]]))
+    committed = []
+
+    def pages():
+        yield [{"merchant_name": "B", "price": 80}]
+        with file_service.SessionLocal() as other:
+            committed.append(other.execute(select(ProductOffer.seller_name)).scalars().all())
+        yield [{"merchant_name": "C", "price": 120}]
+
+    stats = file_service.save_offers_refresh("100", STREAM_DATA["url"], pages())
+
+    assert (stats.count, stats.price_min, stats.price_max) == (2, 80, 120)
+    assert sorted(committed[0]) == ["A", "B"]
+    stream_db.expire_all()
+    product = _stored_product(stream_db, "100")
+    assert (product.price_min, product.price_max, product.offers_count) == (80, 120, 2)
+    # Пропавший оффер A удаляется в финальной транзакции
+    assert _offers(stream_db, product.id) == {"B": 80, "C": 120}
+
+
+def test_refresh_failure_keeps_stored_offers_and_prices(stream_db):
+    file_service.save_scraped_stream(dict(STREAM_DATA), "100", iter([[{"merchant_name": "A", "price": 100}]]))
+
+    def failing_pages():
+        yield [{"merchant_name": "B", "price": 90}]
+        raise RuntimeError("offers API down")
+
+    assert file_service.save_offers_refresh("100", STREAM_DATA["url"], failing_pages()) is None
+
+    stream_db.expire_all()
+    product = _stored_product(stream_db, "100")
+    assert (product.price_min, product.offers_count) == (100, 1)
+    assert _offers(stream_db, product.id) == {"A": 100, "B": 90}
+
+
+def test_refresh_unknown_product_returns_none(stream_db):
+    pages = iter([[{"merchant_name": "A", "price": 100}]])
+
+    assert file_service.save_offers_refresh("404", STREAM_DATA["url"], pages) is None
+    assert stream_db.execute(select(ProductOffer)).first() is None
@@ -0,0 +1,94 @@
+"""Дисковый кэш ответов HttpCache в режимах off / cache / record / replay."""
+from types import SimpleNamespace
+
+import pytest
+
+from src.services import http_cache as http_cache_module
+from src.services.http_cache import CACHE_OFFERS, CACHE_PAGE, CachedResponse, CacheMissError, HttpCache
+
+URL = "https://kaspi.kz/shop/p/test-100/"
+TTLS = {CACHE_PAGE: 60, CACHE_OFFERS: 5}
+
+
+def _cache(tmp_path, mode: str) -> HttpCache:
+    return HttpCache(directory=str(tmp_path), mode=mode, ttls=TTLS)
+
+
+def test_unknown_mode_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        _cache(tmp_path, "sometimes")
+
+
+def test_off_mode_neither_stores_nor_returns(tmp_path):
+    cache = _cache(tmp_path, "off")
+
+    cache.store(CACHE_PAGE, "GET", URL, None, CachedResponse(200, "<html>"))
+
+    assert cache.lookup(CACHE_PAGE, "GET", URL) is None
+    assert not any(tmp_path.iterdir())
+
+
+def test_cache_mode_returns_fresh_entry_by_method_url_and_body(tmp_path):
+    cache = _cache(tmp_path, "cache")
+    cache.store(CACHE_OFFERS, "POST", URL, '{"page": 0}', CachedResponse(200, '{"offers": []}', {"Content-Type": "application/json", "Set-Cookie": "x"}))
+
+    cached = cache.lookup(CACHE_OFFERS, "POST", URL, '{"page": 0}')
+    assert cached.json() == {"offers": []}
+    assert cached.headers == {"Content-Type": "application/json"}
+    assert cache.lookup(CACHE_OFFERS, "POST", URL, '{"page": 1}') is None
+    assert cache.lookup(CACHE_OFFERS, "GET", URL, '{"page": 0}') is None
+
+
+def test_cache_mode_expires_entries_by_endpoint_ttl(tmp_path, monkeypatch):
+    cache = _cache(tmp_path, "cache")
+    now = [1000.0]
+    monkeypatch.setattr(http_cache_module, "time", SimpleNamespace(time=lambda: now[0]))
+    cache.store(CACHE_PAGE, "GET", URL, None, CachedResponse(200, "<html>"))
+    cache.store(CACHE_OFFERS, "GET", URL + "offers", None, CachedResponse(200, "[]"))
+
+    now[0] += 30
+    assert cache.lookup(CACHE_PAGE, "GET", URL) is not None
+    assert cache.lookup(CACHE_OFFERS, "GET", URL + "offers") is None
+
+
+def test_error_responses_are_not_stored(tmp_path):
+    cache = _cache(tmp_path, "record")
+
+    cache.store(CACHE_PAGE, "GET", URL, None, CachedResponse(429, "slow down"))
+
+    assert not any(tmp_path.iterdir())
+
+
+def test_record_mode_always_goes_to_network(tmp_path):
+    cache = _cache(tmp_path, "record")
+    cache.store(CACHE_PAGE, "GET", URL, None, CachedResponse(200, "<html>"))
+
+    assert cache.lookup(CACHE_PAGE, "GET", URL) is None
+    assert _cache(tmp_path, "cache").lookup(CACHE_PAGE, "GET", URL).text == "<html>"
+
+
+def test_replay_ignores_ttl_and_raises_on_miss(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(http_cache_module, "time", SimpleNamespace(time=lambda: now[0]))
+    _cache(tmp_path, "record").store(CACHE_OFFERS, "GET", URL, None, CachedResponse(200, "[]"))
+    replay = _cache(tmp_path, "replay")
+
+    now[0] += 3600
+    assert replay.replaying
+    assert replay.lookup(CACHE_OFFERS, "GET", URL).text == "[]"
+    with pytest.raises(CacheMissError):
+        replay.lookup(CACHE_PAGE, "GET", URL + "missing")
+    # В replay ничего не дописывается
+    replay.store(CACHE_PAGE, "GET", URL + "missing", None, CachedResponse(200, "<html>"))
+    with pytest.raises(CacheMissError):
+        replay.lookup(CACHE_PAGE, "GET", URL + "missing")
+
+
+def test_corrupted_entry_is_a_miss(tmp_path):
+    cache = _cache(tmp_path, "cache")
+    cache.store(CACHE_PAGE, "GET", URL, None, CachedResponse(200, "<html>"))
+    path = cache._path("GET", URL, None)
+    with open(path, "wb") as f:
+        f.write(b"not gzip")
+
+    assert cache.lookup(CACHE_PAGE, "GET", URL) is None
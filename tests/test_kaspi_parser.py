@@ -0,0 +1,138 @@
+"""Загрузка офферов _iter_city_offer_pages и рейтинг в офлайн-режиме."""
+import asyncio
+
+import pytest
+
+from src.services import kaspi_parser
+from src.services.http_cache import CACHE_RENDER, CachedResponse, HttpCache
+
+LIMIT = 2
+
+
+def _offer(n: int) -> dict:
+    return {"merchantName": f"m{n}", "price": {"amount": n}}
+
+
+class FakeApi:
+    """Подмена _fetch_offers_page: страницы по номеру, задержки и учёт одновременных запросов."""
+
+    def __init__(self, pages: dict, total=None, delays: dict = None):
+        self.pages = pages
+        self.total = total
+        self.delays = delays or {}
+        self.requested = []
+        self.active = 0
+        self.max_active = 0
+
+    async def __call__(self, client, limiter, api_url, city_id, page, limit, max_retries):
+        self.requested.append(page)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delays.get(page, 0))
+        finally:
+            self.active -= 1
+        offers = self.pages.get(page, [])
+        if offers is None:
+            return None
+        data = {"offers": offers}
+        if page == 0 and self.total is not None:
+            data["offersCount"] = self.total
+        return data
+
+
+def _collect(monkeypatch, api: FakeApi, concurrency: int = 3, stop_after: int = None) -> list:
+    monkeypatch.setattr(kaspi_parser, "_fetch_offers_page", api)
+
+    async def go():
+        pages = kaspi_parser._iter_city_offer_pages(
+            None, None, asyncio.Semaphore(concurrency), "api", "750000000", LIMIT, concurrency, 1
+        )
+        result = []
+        try:
+            async for page in pages:
+                result.append([offer["price"] for offer in page])
+                if stop_after is not None and len(result) == stop_after:
+                    break
+        finally:
+            await pages.aclose()
+        return result
+
+    return asyncio.run(go())
+
+
+def test_pages_are_yielded_in_order_despite_completion_order(monkeypatch):
+    pages = {n: [_offer(2 * n), _offer(2 * n + 1)] for n in range(5)}
+    api = FakeApi(pages, total=10, delays={1: 0.05, 2: 0.01, 3: 0.03})
+
+    result = _collect(monkeypatch, api)
+
+    assert result == [[0, 1], [2, 3], [4, 5], [6, 7], [8, 9]]
+    # Общее количество известно — лишних страниц не запрашиваем
+    assert sorted(api.requested) == [0, 1, 2, 3, 4]
+    assert api.max_active <= 3
+
+
+def test_short_first_page_is_the_only_page(monkeypatch):
+    api = FakeApi({0: [_offer(1)], 1: [_offer(2)]}, total=50)
+
+    assert _collect(monkeypatch, api) == [[1]]
+    assert api.requested == [0]
+
+
+def test_failed_first_page_yields_nothing(monkeypatch):
+    api = FakeApi({0: None})
+
+    assert _collect(monkeypatch, api) == []
+
+
+def test_without_total_stops_at_first_short_page(monkeypatch):
+    pages = {0: [_offer(0), _offer(1)], 1: [_offer(2), _offer(3)], 2: [_offer(4)], 3: [_offer(5), _offer(6)]}
+    api = FakeApi(pages)
+
+    result = _collect(monkeypatch, api, concurrency=2)
+
+    assert result == [[0, 1], [2, 3], [4]]
+
+
+def test_failed_or_empty_page_stops_iteration(monkeypatch):
+    full = [_offer(0), _offer(1)]
+    failed = FakeApi({0: full, 1: full, 2: None, 3: full}, total=8)
+    empty = FakeApi({0: full, 1: [], 2: full}, total=6)
+
+    assert _collect(monkeypatch, failed) == [[0, 1], [0, 1]]
+    assert _collect(monkeypatch, empty) == [[0, 1]]
+
+
+def test_closing_early_cancels_pending_pages(monkeypatch):
+    pages = {n: [_offer(2 * n), _offer(2 * n + 1)] for n in range(10)}
+    api = FakeApi(pages, total=20, delays={n: 0.05 for n in range(2, 10)})
+
+    result = _collect(monkeypatch, api, concurrency=3, stop_after=2)
+
+    assert result == [[0, 1], [2, 3]]
+    assert api.active == 0
+    assert len(api.requested) < 10
+
+
+PRODUCT_URL = "https://kaspi.kz/shop/p/test-100/?c=750000000"
+
+
+@pytest.fixture
+def replay_cache(tmp_path, monkeypatch):
+    """Кэш в режиме replay; запись в него — через тот же каталог в режиме record."""
+    monkeypatch.setattr(kaspi_parser, "http_cache", HttpCache(str(tmp_path), "replay", {}))
+    return HttpCache(str(tmp_path), "record", {})
+
+
+def test_replayed_rating_without_render_is_empty(replay_cache):
+    assert kaspi_parser.parse_kaspi_rating_playwright(PRODUCT_URL) == {"rating": None, "reviews_count": None}
+
+
+def test_replayed_rating_is_read_from_recorded_render(replay_cache):
+    html = '<div class="item__rating"><span class="rating _45"></span><a>(120 отзывов)</a></div>'
+    replay_cache.store(CACHE_RENDER, "RENDER", PRODUCT_URL, None, CachedResponse(200, html))
+
+    rating = kaspi_parser.parse_kaspi_rating_playwright(PRODUCT_URL)
+
+    assert rating["rating"] == 4.5
@@ -0,0 +1,164 @@
+"""Token bucket AdaptiveRateLimiter и разбор Retry-After."""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from types import SimpleNamespace
+
+import pytest
+
+from src.services import rate_limiter
+from src.services.rate_limiter import AdaptiveRateLimiter, _parse_retry_after, charge_requests_to, get_rate_limiter
+
+
+class FakeClock:
+    """Подмена модуля time: monotonic без реального времени, sleep двигает часы."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", SimpleNamespace(monotonic=fake.monotonic, sleep=fake.sleep))
+    return fake
+
+
+def _limiter(rate: float = 2.0, burst: int = 2) -> AdaptiveRateLimiter:
+    return AdaptiveRateLimiter(
+        name="test", rate=rate, burst=burst, min_rate=0.5, max_rate=4.0, increase_step=0.5
+    )
+
+
+def test_burst_is_free_then_tokens_are_reserved_in_order(clock):
+    limiter = _limiter(rate=2.0, burst=2)
+
+    delays = [limiter._reserve() for _ in range(4)]
+
+    # Два токена из запаса, дальше каждый следующий на 1/rate позже
+    assert delays == [0.0, 0.0, 0.5, 1.0]
+
+
+def test_tokens_refill_with_time_up_to_burst(clock):
+    limiter = _limiter(rate=2.0, burst=2)
+    limiter._reserve()
+    limiter._reserve()
+
+    clock.now += 10
+    assert limiter.snapshot()["tokens"] == 2
+
+
+def test_acquire_sleeps_for_reserved_delay(clock):
+    limiter = _limiter(rate=2.0, burst=1)
+
+    limiter.acquire()
+    limiter.acquire()
+
+    assert clock.slept == [0.5]
+    assert limiter.snapshot()["queue_depth"] == 0
+
+
+def test_acquire_async_waits_without_blocking(clock, monkeypatch):
+    limiter = _limiter(rate=2.0, burst=1)
+    waits = []
+
+    async def fake_sleep(seconds):
+        waits.append(seconds)
+
+    monkeypatch.setattr(rate_limiter.asyncio, "sleep", fake_sleep)
+
+    async def go():
+        await limiter.acquire_async()
+        await limiter.acquire_async()
+
+    asyncio.run(go())
+    assert waits == [0.5]
+
+
+def test_success_raises_rate_up_to_ceiling(clock):
+    limiter = _limiter(rate=3.0)
+
+    for _ in range(5):
+        limiter.record(200)
+
+    assert limiter.rate == 4.0
+
+
+def test_throttle_halves_rate_and_honours_retry_after(clock):
+    limiter = _limiter(rate=2.0, burst=2)
+
+    limiter.record(429, "3")
+
+    assert limiter.rate == 1.0
+    # Бакет уходит в долг на паузу Retry-After
+    assert limiter._reserve() == pytest.approx(4.0)
+    snapshot = limiter.snapshot()
+    assert snapshot["throttled_total"] == 1 and snapshot["requests_total"] == 1
+
+
+def test_throttle_does_not_go_below_min_rate(clock):
+    limiter = _limiter(rate=0.6)
+
+    limiter.record(503)
+    limiter.record(503)
+
+    assert limiter.rate == 0.5
+
+
+def test_parse_retry_after():
+    assert _parse_retry_after(None) == 1.0
+    assert _parse_retry_after(" 7 ") == 7.0
+    assert _parse_retry_after("not a date") == 1.0
+
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert 25 <= _parse_retry_after(format_datetime(retry_at, usegmt=True)) <= 30
+
+    past = datetime.now(timezone.utc) - timedelta(seconds=30)
+    assert _parse_retry_after(format_datetime(past, usegmt=True)) == 0.0
+
+
+def test_limiters_are_shared_per_endpoint_class():
+    pages = get_rate_limiter(rate_limiter.KASPI_PAGES)
+
+    assert get_rate_limiter(rate_limiter.KASPI_PAGES) is pages
+    assert get_rate_limiter(rate_limiter.KASPI_OFFERS) is not pages
+
+
+def test_requests_inside_charge_block_also_take_budget_tokens(clock):
+    endpoint = _limiter(rate=100.0, burst=100)
+    budget = AdaptiveRateLimiter(name="budget", rate=1.0, burst=1, min_rate=1.0, max_rate=1.0, increase_step=0)
+
+    with charge_requests_to(budget):
+        for _ in range(3):
+            endpoint.acquire()
+    endpoint.acquire()
+
+    # Своему лимитеру хватает запаса, ждать пришлось только бюджета
+    assert clock.slept == [1.0, 1.0]
+
+
+def test_budget_is_inherited_by_asyncio_tasks(clock, monkeypatch):
+    waits = []
+
+    async def fake_sleep(seconds):
+        waits.append(seconds)
+
+    monkeypatch.setattr(rate_limiter.asyncio, "sleep", fake_sleep)
+    endpoint = _limiter(rate=100.0, burst=100)
+    budget = AdaptiveRateLimiter(name="budget", rate=2.0, burst=1, min_rate=2.0, max_rate=2.0, increase_step=0)
+
+    async def go():
+        await asyncio.gather(*(endpoint.acquire_async() for _ in range(3)))
+
+    with charge_requests_to(budget):
+        asyncio.run(go())
+
+    assert sorted(waits) == [0.5, 1.0]
@@ -0,0 +1,60 @@
+"""Планировщик обновлений: интервалы по волатильности и бюджет запросов."""
+import threading
+
+import pytest
+from pydantic import ValidationError
+
+from src.core.config import Settings, settings
+from src.services import scheduler
+from src.services.rate_limiter import AdaptiveRateLimiter
+from src.services.scheduler import RecrawlScheduler, ScheduleEntry, refresh_interval
+
+
+def test_refresh_interval_shrinks_with_volatility_within_bounds(monkeypatch):
+    monkeypatch.setattr(settings, "scheduler_volatility_window_days", 14)
+    monkeypatch.setattr(settings, "scheduler_min_interval_hours", 0.5)
+    monkeypatch.setattr(settings, "scheduler_max_interval_hours", 72.0)
+
+    assert refresh_interval(0) == 72 * 3600
+    assert refresh_interval(13) == 14 * 86400 / 14 / 2
+    assert refresh_interval(10_000) == 0.5 * 3600
+
+
+class CountingBudget(AdaptiveRateLimiter):
+    """Бюджет без ожидания, считающий списанные токены."""
+
+    def __init__(self):
+        super().__init__(name="budget", rate=1.0, burst=1, min_rate=1.0, max_rate=1.0, increase_step=0)
+        self.charged = 0
+
+    def acquire(self) -> None:
+        self.charged += 1
+
+
+def test_refresh_charges_budget_per_outgoing_request(monkeypatch):
+    endpoint = AdaptiveRateLimiter(name="offers", rate=1000.0, burst=100, min_rate=1.0, max_rate=1000.0, increase_step=0)
+
+    def fake_refresh(url):
+        for _ in range(3):
+            endpoint.acquire()
+        return {"status": "ok"}
+
+    monkeypatch.setattr(scheduler, "refresh_product", fake_refresh)
+    recrawl = RecrawlScheduler(requests_per_minute=60, workers=1, reload_seconds=600)
+    recrawl._budget = CountingBudget()
+    entry = ScheduleEntry(product_id=1, kaspi_id="1", url="u", price_changes=0, interval=60, next_due=0, in_flight=True)
+
+    recrawl._refresh(entry, threading.Semaphore(0))
+    endpoint.acquire()
+
+    assert entry.last_status == "ok" and not entry.in_flight
+    # Токен бюджета на каждый запрос обновления, а не один на товар; вне обновления — без бюджета
+    assert recrawl._budget.charged == 3
+
+
+@pytest.mark.parametrize("value", ["0", "-5"])
+def test_request_budget_must_be_positive(value, monkeypatch):
+    monkeypatch.setenv("SCHEDULER_REQUESTS_PER_MINUTE", value)
+
+    with pytest.raises(ValidationError):
+        Settings()
@@ -0,0 +1,158 @@
+"""run_scrape_job в режимах с буфером записи и с потоковым сохранением."""
+from concurrent.futures import Future
+
+import pytest
+
+from src.core.config import settings
+from src.services import scrape_service
+from src.services.write_buffer import WriteBehindBuffer
+from src.utils import OfferStats
+
+URL = "https://kaspi.kz/shop/p/test-product-100200300/?c=750000000"
+OFFERS = [{"merchant_name": "A", "price": 100}, {"merchant_name": "B", "price": 150}]
+
+
+@pytest.fixture
+def parser_calls(monkeypatch):
+    """Подменяет парсер карточки; возвращает список переданных with_offers."""
+    calls = []
+
+    def fake_parse(url, timings=None, with_offers=True):
+        calls.append(with_offers)
+        data = {"url": url, "name": "Тест", "source": "http"}
+        if with_offers:
+            data["offers"] = list(OFFERS)
+        return data
+
+    monkeypatch.setattr(scrape_service, "parse_kaspi_product_with_bs", fake_parse)
+    return calls
+
+
+@pytest.fixture
+def buffered(monkeypatch):
+    """Режим с буфером записи: возвращает записанные группы и ошибки по товарам."""
+    batches = []
+    errors = {}
+
+    def save_batch(items):
+        batches.append(items)
+        return {product_id: errors.get(product_id) for _, product_id in items}
+
+    buffer = WriteBehindBuffer(flush_size=1, flush_interval=60, max_pending=10, save_batch=save_batch)
+    monkeypatch.setattr(settings, "write_buffer_enabled", True)
+    monkeypatch.setattr(scrape_service, "write_buffer", buffer)
+    yield batches, errors
+    buffer.stop()
+
+
+class StreamRecorder:
+    """Подмена save_scraped_stream: запоминает вызовы, может вернуть ошибку записи."""
+
+    def __init__(self):
+        self.calls = []
+        self.failing = False
+
+    def __call__(self, scraped_data, product_id, offer_pages):
+        pages = list(offer_pages)
+        self.calls.append((scraped_data, product_id, pages))
+        if self.failing:
+            return None
+        stats = OfferStats()
+        for page in pages:
+            stats.add(page)
+        return stats
+
+
+@pytest.fixture
+def streamed(monkeypatch):
+    """Режим без буфера: подменяет загрузку и потоковое сохранение офферов."""
+    recorder = StreamRecorder()
+
+    def fake_pages(url):
+        yield OFFERS
+
+    monkeypatch.setattr(settings, "write_buffer_enabled", False)
+    monkeypatch.setattr(scrape_service, "iter_offer_pages", fake_pages)
+    monkeypatch.setattr(scrape_service, "save_scraped_stream", recorder)
+    return recorder
+
+
+def test_buffered_job_scrapes_offers_and_waits_for_write(parser_calls, buffered):
+    batches, _ = buffered
+
+    outcome = scrape_service.run_scrape_job(URL)
+
+    assert outcome["status"] == "ok", outcome["error"]
+    # Группой пишется товар целиком, вместе с офферами
+    assert parser_calls == [True]
+    assert len(batches) == 1
+    (scraped_data, product_id), = batches[0]
+    assert product_id == "100200300"
+    assert scraped_data["offers"] == OFFERS
+    assert "save" in outcome["timings"]
+
+
+def test_buffered_job_reports_save_error(parser_calls, buffered):
+    _, errors = buffered
+    errors["100200300"] = "constraint violation"
+
+    outcome = scrape_service.run_scrape_job(URL)
+
+    assert outcome["status"] == "error"
+    assert outcome["error"] == "Save failed: constraint violation"
+
+
+def test_buffered_job_times_out_waiting_for_write(parser_calls, buffered, monkeypatch):
+    never = Future()
+    monkeypatch.setattr(scrape_service.write_buffer, "submit", lambda scraped_data, product_id: never)
+    monkeypatch.setattr(settings, "write_buffer_result_timeout", 0.01)
+
+    outcome = scrape_service.run_scrape_job(URL)
+
+    assert outcome["status"] == "error"
+    assert outcome["error"] == "Save failed: not written within 0.01 s"
+
+
+def test_streamed_job_saves_offer_pages(parser_calls, streamed):
+    stages = []
+
+    outcome = scrape_service.run_scrape_job(URL, on_progress=stages.append)
+
+    assert outcome["status"] == "ok", outcome["error"]
+    assert stages == ["scraping", "saving"]
+    # Офферы не загружаются в карточку — их страницы пишутся потоком
+    assert parser_calls == [False]
+    (scraped_data, product_id, pages), = streamed.calls
+    assert product_id == "100200300"
+    assert "offers" not in scraped_data
+    assert pages == [OFFERS]
+    assert "offers" in outcome["timings"]
+
+
+def test_streamed_job_reports_save_failure(parser_calls, streamed):
+    streamed.failing = True
+
+    outcome = scrape_service.run_scrape_job(URL)
+
+    assert outcome["status"] == "error"
+    assert outcome["error"] == "Save failed"
+
+
+def test_scrape_error_is_not_saved(parser_calls, streamed, monkeypatch):
+    def broken_parse(url, timings=None, with_offers=True):
+        raise RuntimeError("timeout")
+
+    monkeypatch.setattr(scrape_service, "parse_kaspi_product_with_bs", broken_parse)
+
+    outcome = scrape_service.run_scrape_job(URL)
+
+    assert outcome["status"] == "error"
+    assert outcome["error"] == "RuntimeError: timeout"
+    assert streamed.calls == []
+
+
+def test_invalid_url_is_not_scraped(parser_calls, streamed):
+    outcome = scrape_service.run_scrape_job("https://example.com/")
+
+    assert outcome["error"] == "Invalid Kaspi URL"
+    assert parser_calls == [] and streamed.calls == []
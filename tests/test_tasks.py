@@ -0,0 +1,71 @@
+"""Локальный исполнитель фоновых задач LocalJobQueue."""
+import threading
+
+import pytest
+
+from src import tasks
+from src.tasks import JOB_FAILED, JOB_SUCCEEDED, LocalJobQueue
+
+
+@pytest.fixture
+def queue():
+    jobs = LocalJobQueue(workers=2, result_ttl=60)
+    yield jobs
+    jobs.shutdown()
+
+
+def _wait(jobs: LocalJobQueue, job_id: str) -> dict:
+    for _ in range(200):
+        job = jobs.get(job_id)
+        if job["finished_at"] is not None:
+            return job
+        threading.Event().wait(0.01)
+    raise AssertionError("задача не завершилась")
+
+
+def test_job_runs_and_stores_outcome(queue, monkeypatch):
+    def fake_job(url, on_progress=None):
+        on_progress("scraping")
+        return {"url": url, "status": "ok", "error": None, "data": {"offers": [{"price": 100}]}}
+
+    monkeypatch.setattr(tasks, "run_scrape_job", fake_job)
+
+    job = _wait(queue, queue.submit("u"))
+
+    assert job["status"] == JOB_SUCCEEDED
+    assert job["result"]["url"] == "u"
+    # Данные товара с офферами не хранятся в результате задачи
+    assert "data" not in job["result"]
+    assert job["error"] is None
+
+
+def test_failed_outcome_and_exception_fail_the_job(queue, monkeypatch):
+    def failed_job(url, on_progress=None):
+        if url == "raise":
+            raise ValueError("boom")
+        return {"url": url, "status": "error", "error": "Invalid Kaspi URL"}
+
+    monkeypatch.setattr(tasks, "run_scrape_job", failed_job)
+
+    failed = _wait(queue, queue.submit("bad"))
+    crashed = _wait(queue, queue.submit("raise"))
+
+    assert (failed["status"], failed["error"]) == (JOB_FAILED, "Invalid Kaspi URL")
+    assert (crashed["status"], crashed["error"]) == (JOB_FAILED, "ValueError: boom")
+
+
+def test_finished_jobs_expire(monkeypatch):
+    monkeypatch.setattr(tasks, "run_scrape_job", lambda url, on_progress=None: {"status": "ok", "error": None})
+    jobs = LocalJobQueue(workers=1, result_ttl=0)
+    try:
+        job_id = jobs.submit("u")
+        _wait(jobs, job_id)
+        threading.Event().wait(0.01)
+        jobs.submit("v")
+        assert jobs.get(job_id) is None
+    finally:
+        jobs.shutdown()
+
+
+def test_unknown_job_is_none(queue):
+    assert queue.get("missing") is None
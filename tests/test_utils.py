@@ -0,0 +1,66 @@
+"""Поиск ключей атрибутов, очистка дублей и разбор ссылок в src.utils."""
+from src.utils import DEFAULT_CITY_ID, _KeyMatcher, extract_city_id_from_url, remove_general_if_duplicate
+
+
+def test_matcher_finds_overlapping_keys_case_insensitively():
+    matcher = _KeyMatcher(["Цвет", "цвет корпуса", "Вес", "Вес нетто"])
+
+    found = matcher.find("ЦВЕТ КОРПУСА: чёрный; вес нетто 200 г")
+
+    assert found == {"Цвет", "цвет корпуса", "Вес", "Вес нетто"}
+
+
+def test_matcher_strips_colons_and_collapses_spaces():
+    matcher = _KeyMatcher(["Тип  экрана:", "Диагональ:", "", ":"])
+
+    assert matcher.find("тип экрана OLED, диагональ 6.1") == {"Тип  экрана:", "Диагональ:"}
+    assert matcher.find("ничего общего") == set()
+
+
+def test_matcher_reports_each_key_once():
+    matcher = _KeyMatcher(["ОЗУ"])
+
+    assert matcher.find("озу 8 ГБ, озу расширяемая, ОЗУ") == {"ОЗУ"}
+
+
+def _group_text(keys):
+    return " ".join(f"{key}: значение" for key in keys) + " " + "x" * 100
+
+
+def test_group_repeating_three_keys_is_removed():
+    attributes = {
+        "Цвет": "чёрный",
+        "Вес": "200 г",
+        "Материал:": "металл",
+        "Экран": "OLED",
+        "Характеристики": _group_text(["Цвет", "Вес", "Материал"]),
+    }
+
+    cleaned = remove_general_if_duplicate(attributes)
+
+    assert "Характеристики" not in cleaned
+    assert set(cleaned) == {"Цвет", "Вес", "Материал:", "Экран"}
+
+
+def test_group_with_few_known_keys_is_kept():
+    attributes = {
+        "Цвет": "чёрный",
+        "Вес": "200 г",
+        "Описание": _group_text(["Цвет", "Вес"]),
+    }
+
+    assert remove_general_if_duplicate(attributes) == attributes
+
+
+def test_general_keys_are_removed():
+    attributes = {"Общие характеристики": "да", "Цвет": "чёрный"}
+
+    assert remove_general_if_duplicate(attributes) == {"Цвет": "чёрный"}
+    assert remove_general_if_duplicate({}) == {}
+
+
+def test_city_id_defaults_to_almaty():
+    assert extract_city_id_from_url("https://kaspi.kz/shop/p/x-1/?c=710000000") == "710000000"
+    assert extract_city_id_from_url("https://kaspi.kz/shop/p/x-1/?ref=a&c=710000000") == "710000000"
+    assert extract_city_id_from_url("https://kaspi.kz/shop/p/x-1/") == DEFAULT_CITY_ID
+    assert extract_city_id_from_url(None) == DEFAULT_CITY_ID
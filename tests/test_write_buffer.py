@@ -0,0 +1,119 @@
+"""Буфер отложенной записи WriteBehindBuffer с подменённой функцией записи."""
+import threading
+
+from src.services.write_buffer import WriteBehindBuffer
+
+
+class RecordingSaver:
+    """save_batch, запоминающий группы; может ждать события перед записью."""
+
+    def __init__(self, release: threading.Event = None, errors: dict = None):
+        self.batches = []
+        self.release = release
+        self.errors = errors or {}
+
+    def __call__(self, items):
+        if self.release is not None:
+            self.release.wait(timeout=5)
+        self.batches.append([product_id for _, product_id in items])
+        return {product_id: self.errors.get(product_id) for _, product_id in items}
+
+
+def test_stop_drains_pending_items():
+    release = threading.Event()
+    saver = RecordingSaver(release=release)
+    buffer = WriteBehindBuffer(flush_size=3, flush_interval=60, max_pending=100, save_batch=saver)
+
+    futures = [buffer.submit({"name": str(i)}, str(i)) for i in range(7)]
+    release.set()
+    buffer.stop()
+
+    assert all(future.done() for future in futures)
+    assert [future.result() for future in futures] == [None] * 7
+    assert sorted(product_id for batch in saver.batches for product_id in batch) == [str(i) for i in range(7)]
+    assert all(len(batch) <= 3 for batch in saver.batches)
+
+
+def test_stop_without_submit_does_not_save():
+    saver = RecordingSaver()
+    buffer = WriteBehindBuffer(flush_size=3, flush_interval=60, max_pending=10, save_batch=saver)
+
+    buffer.stop()
+    assert saver.batches == []
+
+
+def test_submit_after_stop_saves_immediately():
+    saver = RecordingSaver()
+    buffer = WriteBehindBuffer(flush_size=3, flush_interval=60, max_pending=10, save_batch=saver)
+    buffer.submit({"name": "first"}, "first")
+    buffer.stop()
+
+    future = buffer.submit({"name": "late"}, "late")
+    assert future.done()
+    assert future.result() is None
+    assert saver.batches == [["first"], ["late"]]
+
+
+def test_flush_interval_writes_incomplete_batch():
+    saver = RecordingSaver()
+    buffer = WriteBehindBuffer(flush_size=10, flush_interval=0.05, max_pending=10, save_batch=saver)
+    try:
+        assert buffer.submit({"name": "1"}, "1").result(timeout=5) is None
+        assert saver.batches == [["1"]]
+    finally:
+        buffer.stop()
+
+
+def test_save_errors_are_returned_per_item():
+    def failing(items):
+        raise RuntimeError("db down")
+
+    saver = RecordingSaver(errors={"2": "bad row"})
+    buffer = WriteBehindBuffer(flush_size=2, flush_interval=60, max_pending=10, save_batch=saver)
+    first, second = buffer.submit({}, "1"), buffer.submit({}, "2")
+    buffer.stop()
+    assert first.result() is None
+    assert second.result() == "bad row"
+
+    broken = WriteBehindBuffer(flush_size=2, flush_interval=60, max_pending=10, save_batch=failing)
+    future = broken.submit({}, "1")
+    broken.stop()
+    assert future.result() == "db down"
+
+
+def test_stopped_buffer_is_not_restarted():
+    saver = RecordingSaver()
+    buffer = WriteBehindBuffer(flush_size=3, flush_interval=60, max_pending=10, save_batch=saver)
+    buffer.stop()
+
+    future = buffer.submit({"name": "late"}, "late")
+    buffer.start()
+
+    assert future.done()
+    assert saver.batches == [["late"]]
+    assert buffer._thread is None
+
+
+def test_submits_racing_stop_are_all_written():
+    for _ in range(20):
+        saver = RecordingSaver()
+        buffer = WriteBehindBuffer(flush_size=4, flush_interval=0.01, max_pending=100, save_batch=saver)
+        futures = []
+        start = threading.Barrier(5)
+
+        def producer(n):
+            start.wait()
+            for i in range(10):
+                futures.append(buffer.submit({}, f"{n}-{i}"))
+
+        threads = [threading.Thread(target=producer, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        start.wait()
+        buffer.stop()
+        for thread in threads:
+            thread.join()
+
+        # Ни один результат не остался в очереди после остановки
+        assert all(future.result(timeout=5) is None for future in futures)
+        assert sum(len(batch) for batch in saver.batches) == 40